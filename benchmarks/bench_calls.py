@@ -0,0 +1,45 @@
+import sys
+import time
+
+from pylarklispy import bif, compile_code, compile_closures, jit, run_ast, run_compiled
+from pylarklispy.entities import Runtime
+
+"""
+Measure the calls per second of small user functions (with the JIT
+off, so every call goes through `create_function`):
+
+    python -m benchmarks.bench_calls [calls]
+"""
+
+DEFINITIONS = """
+(defun id [x] x)
+(defun add [a b] (+ a b))
+(defun calls [n] (loop [0] (fun [i]
+    (if (= i n) [:return i] [:next (+ (id i) (add 0 1))]))))
+"""
+
+
+def measure(n: int, compiled: bool) -> float:
+    statements = compile_code(DEFINITIONS + f"(calls {n})")
+    runtime = Runtime(bif.index)
+    start = time.perf_counter()
+    if compiled:
+        run_compiled(compile_closures(statements, runtime=runtime), runtime=runtime)
+    else:
+        run_ast(statements, runtime=runtime)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    jit.enabled = False
+    # each iteration calls the loop function, `id` and `add`
+    total = 3 * n
+    for compiled in (False, True):
+        elapsed = min(measure(n, compiled) for _ in range(3))
+        mode = "compiled" if compiled else "interpreted"
+        print(f"{mode}: {total / elapsed:,.0f} calls/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from pylarklispy import bif, compile_code, run_ast
+from pylarklispy.entities import Runtime
+
+"""
+Measure repeated imports of an interop module in the same runtime, like
+a script or a request handler importing what it uses every time:
+
+    python -m benchmarks.bench_import [imports]
+"""
+
+IMPORTS = {
+    "all": '(import "$.functools" :all)',
+    "only": '(import "$.functools" [:only :map :emp])',
+}
+
+
+def measure(n: int, code: str) -> float:
+    statements = compile_code(f"""
+        (loop [0] (fun [i]
+            (if (= i {n}) [:return i] (do {code} [:next (+ i 1)]))))
+    """)
+    runtime = Runtime(bif.index)
+    start = time.perf_counter()
+    run_ast(statements, runtime=runtime)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, code in IMPORTS.items():
+        elapsed = min(measure(n, code) for _ in range(3))
+        print(f"{name:>4}: {elapsed / n * 1e6:7.2f} us/import")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import sys
+import time
+
+from pylarklispy import bif, compile_code, compile_closures, jit, run_ast, run_compiled
+from pylarklispy.entities import Runtime
+
+"""
+Compare numeric functions with and without the JIT (which only kicks
+in for functions called many times):
+
+    python -m benchmarks.bench_jit [n]
+"""
+
+DEFINITIONS = """
+(defun fib [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+(defun sum-to [n acc] (if (= n 0) acc (sum-to (- n 1) (+ acc n))))
+(defun sum-squares [n] (loop [0 n] (fun [acc x]
+    (if (= x 0) [:return acc] [:next (+ acc (* x x)) (- x 1)]))))
+(defun repeat [f times] (loop [0] (fun [i]
+    (if (< i times) (do (f) [:next (+ i 1)]) [:return i]))))
+"""
+
+
+def measure(call: str, compiled: bool) -> float:
+    statements = compile_code(DEFINITIONS + call)
+    runtime = Runtime(bif.index)
+    start = time.perf_counter()
+    if compiled:
+        run_compiled(compile_closures(statements, runtime=runtime), runtime=runtime)
+    else:
+        run_ast(statements, runtime=runtime)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    calls = [
+        f"(fib {n})",
+        f"(sum-to {n * 5000} 0)",
+        f"(repeat (fun [] (sum-squares 100)) {n * 50})",
+    ]
+    for call in calls:
+        for compiled in (False, True):
+            jit.enabled = False
+            slow = measure(call, compiled)
+            jit.enabled = True
+            fast = measure(call, compiled)
+            mode = "compiled" if compiled else "interpreted"
+            print(f"{call} {mode}: {slow:.3f}s, jit: {fast:.3f}s ({slow / fast:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import random
+import sys
+import time
+
+from pylarklispy import compile_code
+
+"""
+Compare the Lark parser with the hand-written reader on a big generated
+program:
+
+    python -m benchmarks.bench_reader [number of forms]
+"""
+
+
+def generate(n: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    forms = []
+    for i in range(n):
+        forms.append(
+            f'(define item-{i} {{:id {i} :name "item \\"{i}\\"" '
+            f':tags [:a :b &c] :score {rng.randrange(-1000, 1000)} '
+            f':path ~r"/items/{i}"}}) ; generated'
+        )
+    return "\n".join(forms)
+
+
+def measure(code: str, fast: bool) -> float:
+    start = time.perf_counter()
+    compile_code(code, fast=fast)
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    code = generate(n)
+    compile_code("()")  # build the Lark parser outside of the measurement
+    assert compile_code(code) == compile_code(code, fast=True)
+    lark_time = min(measure(code, fast=False) for _ in range(3))
+    fast_time = min(measure(code, fast=True) for _ in range(3))
+    print(f"{n} forms, {len(code) / 1e6:.1f} MB")
+    print(f"lark: {lark_time:.3f}s")
+    print(f"fast: {fast_time:.3f}s ({lark_time / fast_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
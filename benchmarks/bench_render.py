@@ -0,0 +1,56 @@
+import sys
+import time
+import tracemalloc
+
+from pylarklispy import bif, compile_code, run_ast
+from pylarklispy.entities import Function, Integer, Runtime, Vector
+from pylarklispy.webserver import markup
+
+"""
+Measure `render` (from `$.webserver`) on pages of a growing number of
+table rows, nested a few levels deep, and the peak memory used to write
+them out in chunks, like a route does.
+
+    python -m benchmarks.bench_render [rows...]
+"""
+
+PAGE = """
+(import "$.webserver" [:only :render])
+(import "$.functools" [:only :map])
+(defun row [i] [[:tr [:class "row"]] [[:td (format i)] [:td [[:b "bold"] " text"]]]])
+(defun page [n] [:html [[:body [[:div [[:table (map row (range n))]]]]]]])
+"""
+
+
+def range_(runtime, n):
+    return Vector(*(Integer(i) for i in range(n.n)))
+
+
+def measure(rows: int):
+    runtime = Runtime(bif.index)
+    runtime.global_names["range"] = Function("range", range_)
+    page, _ = run_ast(compile_code(PAGE + f"(page {rows})"), runtime=runtime)
+    render = compile_code("(render page)")
+    runtime.global_names["page"] = page
+    start = time.perf_counter()
+    html, _ = run_ast(render, runtime=runtime)
+    elapsed = time.perf_counter() - start
+    # the memory used to write it to a response; measured separately,
+    # tracing slows everything down
+    tracemalloc.start()
+    for chunk in markup.iter_chunks(page):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(html.s)
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000]
+    for rows in sizes:
+        elapsed, peak, size = measure(rows)
+        print(f"{rows:>6} rows, {size:>8} bytes: {elapsed * 1000:8.1f} ms, streamed in {peak / 1024:6.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import sys
+import time
+
+from pylarklispy import compile_code, jit, run_ast
+from pylarklispy.webserver import make_app
+
+"""
+Measure the throughput of concurrent requests to a slow page, and the
+latency of a fast page requested meanwhile, with the views evaluated in
+the event loop or on a pool of workers (see `pylarklispy.webserver.pool`):
+
+    python -m benchmarks.bench_server [requests] [concurrency]
+"""
+
+ROUTES = """
+(defun count [n] (loop [0] (fun [i] (if (= i n) [:return i] [:next (+ i 1)]))))
+(defun slow [request] [:p (format (count 2000))])
+(defun fast [request] [:p "fast"])
+[[:get "/slow" slow]
+ [:get "/fast" fast]]
+"""
+
+MODES = [(None, None), ("threads", 4), ("processes", 4)]
+
+
+async def measure(app, n: int, concurrency: int):
+    from aiohttp import ClientSession
+    from aiohttp.test_utils import TestServer
+
+    async with TestServer(app) as server:
+        async with ClientSession() as session:
+            # start the workers
+            async with session.get(server.make_url("/slow")) as response:
+                await response.read()
+            queue = list(range(n))
+
+            async def client():
+                while queue:
+                    queue.pop()
+                    async with session.get(server.make_url("/slow")) as response:
+                        await response.read()
+
+            start = time.perf_counter()
+            clients = asyncio.gather(*(client() for _ in range(concurrency)))
+            await asyncio.sleep(0.05)
+            fast_start = time.perf_counter()
+            async with session.get(server.make_url("/fast")) as response:
+                await response.read()
+            fast = time.perf_counter() - fast_start
+            await clients
+            elapsed = time.perf_counter() - start
+    return n / elapsed, fast
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    # the loop would be compiled to Python, making the page not so slow
+    jit.enabled = False
+    for pool, size in MODES:
+        route_table, runtime = run_ast(compile_code(ROUTES))
+        app = make_app(runtime, route_table, pool=pool, pool_size=size)
+        throughput, fast = asyncio.run(measure(app, n, concurrency))
+        mode = f"{pool} ({size})" if pool else "event loop"
+        print(f"{mode:>14}: {throughput:7.1f} requests/s, fast page in {fast * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import sys
+import time
+
+from pylarklispy import compile_code, run_ast
+from pylarklispy.entities import Function, SExpr, String
+from pylarklispy.webserver import markup, templates
+
+"""
+Measure a request of a mostly static page, with and without a template
+(see `pylarklispy.webserver.templates`):
+
+    python -m benchmarks.bench_templates [requests]
+"""
+
+VIEW = """
+(defun catalogue [request]
+    [:html [[:head [[:title "Catalogue"] [[:link [:rel "stylesheet" :href "/style.css"]] ""]]]
+            [:body [[:h1 (join "Hello, " (request :name))]
+                    [:ul [%s]]
+                    [:footer "Static footer"]]]]])
+catalogue
+"""
+
+REQUEST = Function("<Request wrapper>", lambda runtime, key: String("world"))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    items = " ".join(
+        f'[[:li [:class "item"]] [[:h2 "Item {i}"] [:p "A static description."]]]'
+        for i in range(50)
+    )
+    view, runtime = run_ast(compile_code(VIEW % items))
+    template = templates.compile_view(view)
+
+    start = time.perf_counter()
+    for _ in range(n):
+        page = b"".join(markup.iter_chunks(SExpr(view, REQUEST).evaluate(runtime)))
+    plain = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(n):
+        templated = b"".join(markup.coalesce(template.iter_bytes(template.fill(runtime, REQUEST))))
+    compiled = time.perf_counter() - start
+
+    assert page == templated
+    print(f"{len(page)} bytes per page")
+    print(f"   no template: {plain / n * 1e6:8.1f} us/request")
+    print(f"with template: {compiled / n * 1e6:8.1f} us/request")
+
+
+if __name__ == "__main__":
+    main()
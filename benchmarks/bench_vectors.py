@@ -0,0 +1,53 @@
+import sys
+import timeit
+
+from pylarklispy.persistent import PersistentVector
+
+"""
+Measure the bulk operations of vectors (`concat`, `append` of many
+elements, `slice` and `slice=`) on a PersistentVector, against the same
+operations on a tuple, which is what vectors were stored in before:
+
+    python -m benchmarks.bench_vectors [size]
+"""
+
+
+def operations(n: int):
+    half = n // 2
+    middle = tuple(range(100))
+    return {
+        "concat": (lambda v, w: v + w, lambda v, w: v.extend(w)),
+        # the leaves of the second one don't fit as they are
+        "concat [1:]": (lambda v, w: v + w[1:], lambda v, w: v.extend(w[1:])),
+        "append 1000": (lambda v, w: v + middle * 10, lambda v, w: v.extend(middle * 10)),
+        "slice": (lambda v, w: v[half // 2:half], lambda v, w: v[half // 2:half]),
+        "slice=": (
+            lambda v, w: v[:half] + middle + v[half + 10:],
+            lambda v, w: v.splice(half, half + 10, middle),
+        ),
+        "slice= front": (
+            lambda v, w: v[:10] + middle + v[20:],
+            lambda v, w: v.splice(10, 20, middle),
+        ),
+    }
+
+
+def measure(f, *args) -> float:
+    # with the garbage collector on, as it is when a program runs
+    number = 20
+    times = timeit.repeat(lambda: f(*args), "gc.enable()", number=number, repeat=5)
+    return min(times) / number
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    items = tuple(range(n))
+    pvec = PersistentVector(items)
+    for name, (on_tuple, on_vector) in operations(n).items():
+        baseline = measure(on_tuple, items, items)
+        elapsed = measure(on_vector, pvec, pvec)
+        print(f"{name:>12}: tuple {baseline * 1e3:8.3f} ms, vector {elapsed * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,76 @@
-import lark
 from typing import Iterable, List, Optional, Tuple
-from . import parser, entities, bif
+from . import entities, bif, compiler, resolver, reader, macros, folding, machine
 
-def compile_code(code: str) -> List[entities.Entity]:
-    tree = parser.parser.parse(code)
-    return parser.Transformer().transform(tree)
+# `parser` (and so Lark) is imported on first use, to keep
+# `import pylarklispy` cheap for code that never parses anything.
+
+def compile_code(code: str, fast: bool = False) -> List[entities.Entity]:
+    """Parse a program. `fast=True` uses the hand-written reader
+    (`fast_reader`) instead of Lark; the result is the same, and both
+    raise a `lark.LarkError` on bad input."""
+    if fast:
+        from . import fast_reader
+        return fast_reader.read(code)
+    from . import parser
+    return parser.parse(code)
+
+def compile_closures(
+        statements: Iterable[entities.Entity], *,
+        runtime: Optional[entities.Runtime]=None
+        ) -> List[compiler.Code]:
+    """Compile statements into closures. Macros are expanded in `runtime`
+    (a fresh one by default), which doesn't have to be the one running
+    the code."""
+    runtime = runtime or entities.Runtime(bif.index)
+    return [
+        compiler.compile_entity(prepare(statement, runtime))
+        for statement in statements
+    ]
+
+def prepare(statement: entities.Entity, runtime: entities.Runtime) -> entities.Entity:
+    """Expand the macros, resolve the names and fold the constants
+    of a statement about to be run in `runtime`"""
+    expanded = macros.expand_statement(statement, runtime)
+    return folding.fold(resolver.resolve(expanded), runtime)
 
 def run_ast(
         statements: Iterable[entities.Entity], *,
         runtime: Optional[entities.Runtime]=None
         ) -> Tuple[entities.Entity, entities.Runtime]:
     runtime = runtime or entities.Runtime(bif.index)
-    result = entities.Atom("Nil")
+    result = entities.NIL
+    for statement in statements:
+        result = prepare(statement, runtime).evaluate(runtime)
+    return (result, runtime)
+
+def run_machine(
+        statements: Iterable[entities.Entity], *,
+        runtime: Optional[entities.Runtime]=None
+        ) -> Tuple[entities.Entity, entities.Runtime]:
+    """Like `run_ast`, but evaluate with `machine`, which doesn't
+    use the Python stack for nested expressions and calls"""
+    runtime = runtime or entities.Runtime(bif.index)
+    result = entities.NIL
     for statement in statements:
-        result = statement.evaluate(runtime)
+        result = machine.evaluate(prepare(statement, runtime), runtime)
+    return (result, runtime)
+
+def run_stream(
+        source: reader.Source, *,
+        runtime: Optional[entities.Runtime]=None,
+        fast: bool=False
+        ) -> Tuple[entities.Entity, entities.Runtime]:
+    """Read and run one top-level form at a time from a file-like `source`"""
+    return run_ast(reader.read_forms(source, fast=fast), runtime=runtime)
+
+def run_compiled(
+        codes: Iterable[compiler.Code], *,
+        runtime: Optional[entities.Runtime]=None
+        ) -> Tuple[entities.Entity, entities.Runtime]:
+    runtime = runtime or entities.Runtime(bif.index)
+    result = entities.NIL
+    for code in codes:
+        result = code(runtime)
     return (result, runtime)
 
 def compile_and_run(
@@ -23,6 +80,7 @@ def compile_and_run(
     return run_ast(compile_code(code), runtime=runtime)
 
 def repl(runtime=None):
+    import lark
     print("[REPL]")
     runtime = runtime or entities.Runtime(bif.index)
     while True:
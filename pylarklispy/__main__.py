@@ -1,5 +1,6 @@
-from sys import argv, exit
-from . import repl, compile_and_run
+import time
+from sys import argv, exit, stderr
+from . import repl, run_ast, run_stream, ast_cache, image
 
 def ellipsify(s: str):
     parts = s.split("/")
@@ -13,24 +14,47 @@ def ellipsify(s: str):
         return first + "/" + body_s[:6] + "..." + body_s[-6:] + "/" + last
 
 
+def load_program(filename: str):
+    with open(filename) as file:
+        program = file.read()
+    statements, hit = ast_cache.compile_code_cached(program)
+    print(f"[AST cache {'hit' if hit else 'miss'}: {ellipsify(filename)}]", file=stderr)
+    return statements
+
+
 EXECUTABLE = ellipsify(argv[0])
-USAGE_STR = f"Usage: {EXECUTABLE} repl | run <filename> | runrepl <filename>"
+USAGE_STR = (
+    f"Usage: {EXECUTABLE} repl | run <filename> | runrepl <filename> | stream <filename>"
+    " | image <filename> <image> | boot <image>"
+)
 
-if len(argv) not in (2, 3):
+if len(argv) not in (2, 3, 4):
     print(USAGE_STR)
     exit(1)
 
 if argv[1] == "repl":
     repl()
 elif argv[1] == "run":
-    with open(argv[2]) as file:
-        program = file.read()
-    compile_and_run(program)
+    run_ast(load_program(argv[2]))
 elif argv[1] == "runrepl":
-    with open(argv[2]) as file:
-        program = file.read()
-    _, runtime = compile_and_run(program)
+    _, runtime = run_ast(load_program(argv[2]))
+    repl(runtime=runtime)
+elif argv[1] == "image" and len(argv) == 4:
+    # run a prelude once, then `boot` from the saved runtime
+    _, runtime = run_ast(load_program(argv[2]))
+    with open(argv[3], "wb") as file:
+        image.save(runtime, file)
+elif argv[1] == "boot":
+    start = time.perf_counter()
+    with open(argv[2], "rb") as file:
+        runtime = image.load(file)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"[image loaded in {elapsed:.1f} ms: {ellipsify(argv[2])}]", file=stderr)
     repl(runtime=runtime)
+elif argv[1] == "stream":
+    # for huge (generated) programs: don't load the whole file or cache it
+    with open(argv[2], "rb") as file:
+        run_stream(file)
 else:
     print(USAGE_STR)
     exit(1)
\ No newline at end of file
@@ -0,0 +1,170 @@
+import hashlib
+import marshal
+import os
+import re
+from os.path import dirname, expanduser, join, realpath
+from typing import List, Optional, Sequence, Tuple
+
+from . import entities as e
+
+"""
+This module contains an on-disk cache of parsed programs.
+
+A program is stored under the hash of its source and of the grammar,
+so editing the file (or the grammar) simply misses the cache. The AST
+is flattened into nested tuples of small integer tags and strings and
+written with `marshal`, which is compact and much faster to load than
+running Lark and `parser.Transformer` again.
+
+The cache directory is `$PYLARKLISPY_CACHE_DIR`, or
+`~/.cache/pylarklispy` by default. Old entries are never valid again,
+so only the `MAX_ENTRIES` most recently stored programs are kept.
+"""
+
+# bump when the serialized form changes
+FORMAT_VERSION = 1
+
+MAX_ENTRIES = 256
+
+# the name of an entry, see `cache_key`
+_KEY = re.compile(r"[0-9a-f]{64}")
+
+# not taken from `parser`, so that a cache hit doesn't import Lark
+GRAMMAR_FILENAME = join(dirname(realpath(__file__)), "grammar.lark")
+
+_INTEGER, _STRING, _ATOM, _NAME, _SIGIL_STRING, _QUOTED, _S_EXPR, _VECTOR, _MAP = range(9)
+
+
+def cache_dir() -> str:
+    return os.environ.get("PYLARKLISPY_CACHE_DIR") or join(expanduser("~"), ".cache", "pylarklispy")
+
+
+_grammar_version: Optional[str] = None
+
+def grammar_version() -> str:
+    """A digest of the grammar and the serialization format"""
+    global _grammar_version
+    if _grammar_version is None:
+        with open(GRAMMAR_FILENAME, "rb") as grammar_file:
+            digest = hashlib.sha256(grammar_file.read())
+        digest.update(str(FORMAT_VERSION).encode())
+        _grammar_version = digest.hexdigest()
+    return _grammar_version
+
+
+def cache_key(code: str) -> str:
+    digest = hashlib.sha256(grammar_version().encode())
+    digest.update(code.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def encode(entity: e.Entity):
+    """Turn a parsed entity into marshal-friendly tuples"""
+    t = type(entity)
+    if t is e.Integer:
+        return (_INTEGER, entity.n)
+    elif t is e.String:
+        return (_STRING, entity.s)
+    elif t is e.Atom:
+        return (_ATOM, entity.s)
+    elif t is e.Name:
+        return (_NAME, entity.identifier)
+    elif t is e.SigilString:
+        return (_SIGIL_STRING, entity.sigil, entity.string)
+    elif t is e.Quoted:
+        return (_QUOTED, encode(entity.e))
+    elif t is e.SExpr:
+        return (_S_EXPR, tuple(map(encode, entity.es)))
+    elif t is e.Vector:
+        return (_VECTOR, tuple(map(encode, entity.es)))
+    elif t is e.Map and entity.literal is not None:
+        return (_MAP, tuple(map(encode, entity.literal)))
+    raise TypeError(f"Cannot serialize {entity!r}")
+
+
+def decode(data) -> e.Entity:
+    """Inverse of `encode`"""
+    tag = data[0]
+    if tag == _INTEGER:
+        return e.Integer(data[1])
+    elif tag == _STRING:
+        return e.String(data[1])
+    elif tag == _ATOM:
+        return e.Atom(data[1])
+    elif tag == _NAME:
+        return e.Name(data[1])
+    elif tag == _SIGIL_STRING:
+        return e.SigilString(data[1], data[2])
+    elif tag == _QUOTED:
+        return e.Quoted(decode(data[1]))
+    elif tag == _S_EXPR:
+        return e.SExpr(*map(decode, data[1]))
+    elif tag == _VECTOR:
+        return e.Vector(*map(decode, data[1]))
+    elif tag == _MAP:
+        return e.Map(*map(decode, data[1]))
+    raise ValueError(f"Unknown tag: {tag}")
+
+
+def load(key: str) -> Optional[List[e.Entity]]:
+    """Load the statements stored under `key`, or None"""
+    try:
+        with open(join(cache_dir(), key), "rb") as file:
+            data = marshal.load(file)
+        return [decode(statement) for statement in data]
+    except (OSError, EOFError, ValueError, TypeError, IndexError, RecursionError):
+        # missing, corrupt or too deep, treat as a miss
+        return None
+
+
+def store(key: str, statements: Sequence[e.Entity]):
+    """Store the statements under `key`, ignoring any I/O errors and
+    the programs too deeply nested to be serialized"""
+    directory = cache_dir()
+    path = join(directory, key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        data = tuple(encode(statement) for statement in statements)
+        os.makedirs(directory, exist_ok=True)
+        with open(tmp_path, "wb") as file:
+            marshal.dump(data, file)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError, RecursionError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return
+    _prune(directory)
+
+
+def _prune(directory: str):
+    """Remove the oldest entries beyond `MAX_ENTRIES`"""
+    try:
+        entries = [entry for entry in os.scandir(directory) if _KEY.fullmatch(entry.name)]
+        if len(entries) <= MAX_ENTRIES:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+    except OSError:
+        return
+    for entry in entries[:-MAX_ENTRIES]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            # e.g. already removed by another process
+            pass
+
+
+def compile_code_cached(code: str) -> Tuple[List[e.Entity], bool]:
+    """Like `pylarklispy.compile_code`, but uses the on-disk cache.
+
+    Returns the statements and whether it was a cache hit.
+    """
+    from . import compile_code
+    key = cache_key(code)
+    statements = load(key)
+    if statements is not None:
+        return (statements, True)
+    statements = list(compile_code(code))
+    store(key, statements)
+    return (statements, False)
@@ -1,11 +1,14 @@
 import importlib.util
 import importlib
+import os
 from os.path import realpath
 import pylarklispy
 import sys
-from typing import Dict, NoReturn
+from types import ModuleType
+from typing import Dict, NoReturn, Optional, Tuple
 
 from . import entities as e
+from .interop_utils import Module
 
 
 index: Dict[str, e.Function] = {}
@@ -17,13 +20,13 @@ def _register(name):
     return _
 
 @_register("+")
-@e.Function.make("+")
+@e.Function.make("+", pure=True)
 def _(runtime: e.Runtime, *args: e.Integer) -> e.Integer:
     return e.Integer(sum(arg.n for arg in args))
 
 
 @_register("*")
-@e.Function.make("*")
+@e.Function.make("*", pure=True)
 def _(runtime: e.Runtime, *args: e.Integer) -> e.Integer:
     product = 1
     for arg in args:
@@ -32,56 +35,64 @@ def _(runtime: e.Runtime, *args: e.Integer) -> e.Integer:
 
 
 @_register("-")
-@e.Function.make("-")
+@e.Function.make("-", pure=True)
 def _(runtime: e.Runtime, a: e.Integer, b: e.Integer) -> e.Integer:
     return e.Integer(a.n - b.n)
 
 
 @_register("neg")
-@e.Function.make("neg")
+@e.Function.make("neg", pure=True)
 def _(runtime: e.Runtime, a: e.Integer) -> e.Integer:
     return e.Integer(-a.n)
 
 
 @_register("**")
-@e.Function.make("**")
+@e.Function.make("**", pure=True)
 def _(runtime: e.Runtime, a: e.Integer, b: e.Integer) -> e.Integer:
     return e.Integer(a.n ** b.n)
 
 
+# shared, so their inline caches (see `entities.GlobalNames`) are reused
+# from one call to the next
+_FORMAT = e.GlobalName("format")
+_BOOL = e.GlobalName("bool")
+
+
 @_register("join")
 @e.Function.make("join")
 def _(runtime: e.Runtime, *xs: e.Entity) -> e.String:
     pieces = []
     for x in xs:
-        string = e.SExpr(e.Name("format"), x).evaluate(runtime)
+        string = e.SExpr(_FORMAT, x).evaluate(runtime)
         assert isinstance(string, e.String)
         pieces.append(string.s)
     return e.String("".join(pieces))
 
 
 @_register("bool")
-@e.Function.make("bool")
+@e.Function.make("bool", pure=True)
 def _(runtime: e.Runtime, x: e.Entity) -> e.Atom:
-    if x == e.String(""):
-        return e.Atom("False")
-    elif x == e.Integer(0):
-        return e.Atom("False")
-    elif x == e.Vector():
-        return e.Atom("False")
-    elif x in [e.Atom("False"), e.Atom("Nil")]:
-        return e.Atom("False")
+    if isinstance(x, e.Atom):
+        return e.boolean(x is not e.FALSE and x is not e.NIL)
+    elif isinstance(x, e.Integer):
+        return e.boolean(x.n != 0)
+    elif isinstance(x, e.String):
+        return e.boolean(x.s != "")
+    elif isinstance(x, e.Vector):
+        return e.boolean(len(x.es) != 0)
+    elif isinstance(x, e.Map):
+        return e.boolean(len(x.table) != 0)
     else:
-        return e.Atom("True")
+        return e.TRUE
 
 
 @_register("print!")
 @e.Function.make("print!")
 def _(runtime: e.Runtime, x: e.Entity) -> e.Atom:
-    st = e.SExpr(e.Name("format"), x).evaluate(runtime)
+    st = e.SExpr(_FORMAT, x).evaluate(runtime)
     assert isinstance(st, e.String)
     print(st.s)
-    return e.Atom("Nil")
+    return e.NIL
 
 
 @_register("quit!")
@@ -94,8 +105,15 @@ def _(runtime: e.Runtime, status: e.Integer = e.Integer(0)) -> NoReturn:
 @_register("define")
 @e.Function.make("define", lazy=True)
 def _(runtime: e.Runtime, name: e.Quoted[e.Name], value: e.Quoted[e.Entity]) -> e.Atom:
-    runtime.global_frame.insert(name.e.identifier, value.e.evaluate(runtime))
-    return e.Atom("Nil")
+    runtime.global_frame.insert(name.e.identifier, name_function(name.e.identifier, value.e.evaluate(runtime)))
+    return e.NIL
+
+
+def name_function(name: str, value: e.Entity) -> e.Entity:
+    """`(define f (fun ...))` names the anonymous function `f`"""
+    if isinstance(value, e.Function) and value.name == "~fun~":
+        return value.with_name(name)
+    return value
 
 
 @_register("fun")
@@ -103,13 +121,20 @@ def _(runtime: e.Runtime, name: e.Quoted[e.Name], value: e.Quoted[e.Entity]) ->
 def _(
         runtime: e.Runtime,
         arg_names: e.Quoted[e.Vector[e.Name]],
-        body: e.Quoted[e.Entity]
+        body: e.Quoted[e.Entity],
+        captures: Optional[e.Quoted[e.Vector[e.LocalName]]] = None
     ) -> e.Function:
+    closure = None
+    if captures is not None:
+        # only what the body uses, see `pylarklispy.resolver`
+        values = captures.e.evaluate(runtime).es
+        closure = e.capture_frame(runtime, captures.e.es, values)
     return e.create_function(
         outer_runtime=runtime,
         name="~fun~",
         arg_names=[name.identifier for name in arg_names.e.es],
-        body=body.e
+        body=body.e,
+        closure=closure
     )
 
 
@@ -128,13 +153,18 @@ def _(
 
 
 @_register("if")
-@e.Function.make("if", lazy=True)
+@e.Function.make("if", lazy=True, tail=True)
 def _(runtime: e.Runtime, qcond: e.Quoted, then: e.Quoted, else_: e.Quoted) -> e.Entity:
-    condition = e.SExpr(e.Name("bool"), qcond.e).evaluate(runtime)
-    if condition == e.Atom("True"):
-        return then.e.evaluate(runtime)
+    condition = e.SExpr(_BOOL, qcond.e).evaluate(runtime)
+    # the branch is evaluated by the caller, so it stays in tail position
+    if condition is e.TRUE:
+        return then.e
     else:
-        return else_.e.evaluate(runtime)
+        return else_.e
+
+
+_RETURN = e.Atom("return")
+_NEXT = e.Atom("next")
 
 
 @_register("loop")
@@ -148,48 +178,36 @@ def _(runtime: e.Runtime, initial: e.Vector, fn: e.Function) -> e.Entity:
         if len(result.es) == 0:
             raise ValueError(f"Expected non-zero vector")
         status, *acc = result.es
-        if status not in (e.Atom("return"), e.Atom("next")):
+        if status is not _RETURN and status is not _NEXT:
             raise TypeError(f"Expected :next/:return, got {status}")
-        if status == e.Atom("return"):
+        if status is _RETURN:
             if len(acc) != 1:
                 raise TypeError(f"Expected one argument after :return, got {len(acc)}")
             return acc[0]
 
 
 @_register("<")
-@e.Function.make("<")
+@e.Function.make("<", pure=True)
 def _(runtime: e.Runtime, a: e.Integer, b: e.Integer) -> e.Atom:
-    if a.n < b.n:
-        return e.Atom("True")
-    else:
-        return e.Atom("False")
+    return e.boolean(a.n < b.n)
 
 
 @_register(">")
-@e.Function.make(">")
+@e.Function.make(">", pure=True)
 def _(runtime: e.Runtime, a: e.Integer, b: e.Integer) -> e.Atom:
-    if a.n > b.n:
-        return e.Atom("True")
-    else:
-        return e.Atom("False")
+    return e.boolean(a.n > b.n)
 
 
 @_register("=")
-@e.Function.make("=")
+@e.Function.make("=", pure=True)
 def _(runtime: e.Runtime, a: e.Entity, b: e.Entity) -> e.Atom:
-    if a == b:
-        return e.Atom("True")
-    else:
-        return e.Atom("False")
+    return e.boolean(a == b)
 
 
 @_register("/=")
-@e.Function.make("/=")
+@e.Function.make("/=", pure=True)
 def _(runtime: e.Runtime, a: e.Entity, b: e.Entity) -> e.Atom:
-    if a != b:
-        return e.Atom("True")
-    else:
-        return e.Atom("False")
+    return e.boolean(a != b)
 
 
 @_register(">=")
@@ -211,60 +229,104 @@ def _(runtime: e.Runtime, a: e.Entity, b: e.Entity):
 @_register("not")
 @e.Function.make("not")
 def _(runtime: e.Runtime, x: e.Entity):
-    return e.SExpr(e.Name("if"), x, e.Atom("False"), e.Atom("True"))
+    return e.SExpr(e.Name("if"), x, e.FALSE, e.TRUE)
 
 
 @_register("and")
 @e.Function.make("and", lazy=True)
 def _(runtime: e.Runtime, *qxs: e.Quoted[e.Entity]):
     for qx in qxs:
-        cond = e.SExpr(e.Name("bool"), qx.e).evaluate(runtime)
-        if cond == e.Atom("False"):
+        cond = e.SExpr(_BOOL, qx.e).evaluate(runtime)
+        if cond is e.FALSE:
             return cond
-    return e.Atom("True")
+    return e.TRUE
 
 
 @_register("or")
 @e.Function.make("or", lazy=True)
 def _(runtime: e.Runtime, *qxs: e.Quoted[e.Entity]):
     for qx in qxs:
-        cond = e.SExpr(e.Name("bool"), qx.e).evaluate(runtime)
-        if cond == e.Atom("True"):
+        cond = e.SExpr(_BOOL, qx.e).evaluate(runtime)
+        if cond is e.TRUE:
             return cond
-    return e.Atom("False")
+    return e.FALSE
+
+
+_python_modules: Dict[Tuple[str, str], Tuple[Optional[int], ModuleType]] = {}
+
+def _mtime(file: Optional[str]) -> Optional[int]:
+    if file is None:
+        return None
+    try:
+        return os.stat(file).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_module(runtime: e.Runtime, module_name: str, path: str = "") -> Module:
+    """The interop module `module_name` (from the file `path`, if given)
+    of `runtime`, loaded again only if its file changed since"""
+    key = (module_name, path)
+    module = runtime.modules.get(key)
+    if module is not None and _mtime(module.file) == module.mtime:
+        return module
+
+    cached = _python_modules.get(key)
+    if path == "":
+        python_module = importlib.import_module(module_name)
+        file = getattr(python_module, "__file__", None)
+        mtime = _mtime(file)
+        if cached is not None and cached[1] is python_module and cached[0] != mtime:
+            python_module = importlib.reload(python_module)
+    else:
+        file = path
+        mtime = _mtime(file)
+        if cached is not None and cached[0] == mtime:
+            python_module = cached[1]
+        else:
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            if spec is None or spec.loader is None:
+                raise ImportError(f"Cannot load {module_name} from {path}")
+            python_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(python_module)
+    _python_modules[key] = (mtime, python_module)
+
+    if not hasattr(python_module, "interop"):
+        raise LookupError(f"module {python_module} doesn't define `interop`")
+
+    members: Dict[str, e.Entity] = python_module.interop(runtime) # type: ignore
+    module = runtime.modules[key] = Module(file, mtime, members)
+    return module
 
 
 @_register("interop")
 @e.Function.make("interop")
 def _(runtime: e.Runtime, module_name: e.String, path: e.String = e.String("")) -> e.Vector:
-    if path.s == "":
-        module = importlib.import_module(module_name.s)
-    else:
-        spec = importlib.util.spec_from_file_location(module_name.s, path.s)
-        module = importlib.util.module_from_spec(spec)
-
-    if not hasattr(module, "interop"):
-        raise LookupError(f"module {module} doesn't define `interop`")
-
-    module_dict: Dict[str, e.Entity] = module.interop(runtime) # type: ignore
+    module = load_module(runtime, module_name.s, path.s)
     vector_guts = []
-    for k, v in module_dict.items():
-        vector_guts += (e.Atom(k), v)
+    for name in list(module.members):
+        vector_guts += (e.Atom(name), module.member(name))
 
     return e.Vector(*vector_guts)
 
 
 @_register("+=")
-@e.Function.make("+=")
-def _(runtime: e.Runtime, target: e.Vector, source: e.Vector) -> e.Vector:
+@e.Function.make("+=", pure=True)
+def _(runtime: e.Runtime, target: e.Entity, source: e.Entity):
+    if isinstance(target, e.Map):
+        return e.Map.from_table(target.table.update(source.pairs()))
+
+    # a vector keeps its order: replaced keys stay in place,
+    # new keys are appended
+    replacements: Dict[e.Entity, e.Entity] = {}
+    for (k2, v2) in source.pairs():
+        replacements.setdefault(k2, v2)
     es = []
-    used_keys = []
+    used_keys = set()
     for (k, v) in target.pairs():
-        for (k2, v2) in source.pairs():
-            if k2 == k:
-                es += (k2, v2)
-                used_keys.append(k2)
-                break
+        if k in replacements:
+            es += (k, replacements[k])
+            used_keys.add(k)
         else:
             es += (k, v)
     for (k2, v2) in source.pairs():
@@ -274,74 +336,122 @@ def _(runtime: e.Runtime, target: e.Vector, source: e.Vector) -> e.Vector:
 
 
 @_register("-=")
-@e.Function.make("-=")
-def _(runtime: e.Runtime, target: e.Vector, keys: e.Vector) -> e.Vector:
+@e.Function.make("-=", pure=True)
+def _(runtime: e.Runtime, target: e.Entity, keys: e.Vector):
+    if isinstance(target, e.Map):
+        table = target.table
+        for key in keys.es:
+            table = table.dissoc(key)
+        return e.Map.from_table(table)
+
+    removed = set(keys.es)
     es = []
     for (k, v) in target.pairs():
-        for k2 in keys.es:
-            if k2 == k:
-                break
-        else:
+        if k not in removed:
             es += (k, v)
     return e.Vector(*es, _computed=len(es))
 
 
 @_register("at")
-@e.Function.make("at")
+@e.Function.make("at", pure=True)
 def _(runtime: e.Runtime, vector: e.Vector, index: e.Integer):
     if index.n >= len(vector.es):
-        return e.Atom("Nil")
+        return e.NIL
     return vector.es[index.n]
 
 
 @_register("slice")
-@e.Function.make("slice")
+@e.Function.make("slice", pure=True)
 def _(runtime: e.Runtime, vector: e.Vector, a: e.Integer, b: e.Integer, c: e.Integer=e.Integer(1)):
-    return e.Vector(*vector.es[a.n:b.n:c.n])
+    es = vector.es[a.n:b.n:c.n]
+    return e.Vector.wrap(es, len(es))
 
 
 @_register("slice=")
-@e.Function.make("slice=")
+@e.Function.make("slice=", pure=True)
 def _(runtime: e.Runtime, vector: e.Vector, a: e.Integer, b: e.Integer, source: e.Vector):
-    es = list(vector.es)
-    es[a.n:b.n] = source.es
-    return e.Vector(*es)
+    es = vector.es.splice(a.n, b.n, source.es)
+    return e.Vector.wrap(es, len(es))
+
+
+@_register("append")
+@e.Function.make("append", pure=True)
+def _(runtime: e.Runtime, vector: e.Vector, *xs: e.Entity):
+    es = vector.es.extend(xs)
+    return e.Vector.wrap(es, len(es))
+
+
+@_register("concat")
+@e.Function.make("concat", pure=True)
+def _(runtime: e.Runtime, *vectors: e.Vector):
+    if not vectors:
+        return e.Vector()
+    es = vectors[0].es
+    for vector in vectors[1:]:
+        es = es.extend(vector.es)
+    return e.Vector.wrap(es, len(es))
 
 
 @_register("/>")
 @e.Function.make("/>")
-def _(runtime: e.Runtime, vector: e.Vector, path: e.Vector):
+def _(runtime: e.Runtime, vector: e.Entity, path: e.Vector):
     acc = vector
     for key in path.es:
-        acc = e.SExpr(acc, key)
+        acc = acc.call(runtime, key)
     return acc
 
 
 @_register("let")
-@e.Function.make("let", lazy=True)
+@e.Function.make("let", lazy=True, tail=True)
 def _(runtime: e.Runtime, bindings: e.Quoted[e.Vector], body: e.Quoted):
-    # this code depends on dicts being ordered
+    # the values are computed in the current frame, the body in a new one
     names = []
     values = []
     for (k, v) in bindings.e.pairs():
-        names.append(k)
-        values.append(v)
-    iife = e.SExpr(
-        e.Name("fun"),
-        e.Vector(*names), # argument names
-        body.e
-    )
-    return e.SExpr(iife, *values)
+        names.append(k.identifier)
+        values.append(v.evaluate(runtime))
+    frame = runtime.current_frame
+    runtime.push(e.SlotFrame(frame, frame.depth + 1, "<let>", e.make_layout(names), values))
+    try:
+        return e.evaluate_tail(body.e, runtime)
+    finally:
+        runtime.pop()
 
 
 @_register("do")
-@e.Function.make("do", lazy=True)
+@e.Function.make("do", lazy=True, tail=True)
 def _(runtime: e.Runtime, *qexprs: e.Quoted):
-    acc = e.Atom("Nil")
-    for qexpr in qexprs:
-        expr = qexpr.e
-        acc = expr.evaluate(runtime)
-    return acc
+    if not qexprs:
+        return e.NIL
+    *init, last = qexprs
+    for qexpr in init:
+        qexpr.e.evaluate(runtime)
+    # the last expression is in tail position
+    return last.e
+
+
+@_register("defmacro")
+@e.Function.make("defmacro", lazy=True)
+def _(
+        runtime: e.Runtime,
+        name: e.Quoted[e.Name],
+        arg_names: e.Quoted[e.Vector[e.Name]],
+        body: e.Quoted[e.Entity]
+    ) -> e.Atom:
+    runtime.macros[name.e.identifier] = e.create_function(
+        outer_runtime=runtime,
+        name=name.e.identifier,
+        arg_names=[arg.identifier for arg in arg_names.e.es],
+        body=body.e
+    )
+    return e.NIL
+
+
+@_register("form")
+@e.Function.make("form")
+def _(runtime: e.Runtime, *parts: e.Entity) -> e.Quoted:
+    """Build an s-expression out of quoted code (for macros)"""
+    return e.Quoted(e.SExpr(*(part.e if isinstance(part, e.Quoted) else part for part in parts)))
 
 
 @_register("call")
@@ -350,40 +460,46 @@ def _(runtime: e.Runtime, fn: e.Entity, argv: e.Vector):
     return e.SExpr(fn, *argv.es)
 
 
+_ALL = e.Atom("all")
+_ONLY = e.Atom("only")
+_EXCEPT = e.Atom("except")
+
 @_register("import")
 @e.Function.make("import")
-def _(runtime: e.Runtime, module_name: e.String, param: e.Entity = e.Atom("all")):
+def _(runtime: e.Runtime, module_name: e.String, param: e.Entity = _ALL):
     module_name = e.String(module_name.s.replace("$.", "pylarklispy."))
 
-    if param == e.Atom("all"):
+    if param == _ALL:
         decider = lambda name: True
     else:
-        if not isinstance(param, e.Vector):
+        if not isinstance(param, e.Vector) or not param.es:
             raise TypeError('(import "module" <:all|[:except :a :b...]|[:only :a :b...]>)')
-        names = param.es[1:]
-        if param.es[0] == e.Atom("only"):
+        kind, *rest = param.es
+        names = {name.s for name in rest if isinstance(name, e.Atom)}
+        if kind == _ONLY:
             decider = lambda name: name in names
-        elif param.es[0] == e.Atom("except"):
+        elif kind == _EXCEPT:
             decider = lambda name: name not in names
         else:
             raise TypeError('(import "module" <:all|[:except :a :b...]|[:only :a :b...]>)')
 
-    module = e.SExpr(e.Name("interop"), module_name).evaluate(runtime)
-    assert isinstance(module, e.Vector)
+    module = load_module(runtime, module_name.s)
+    # only the imported members are made, see `interop_utils.Lazy`
+    imported = {name: module.member(name) for name in list(module.members) if decider(name)}
+    global_names = runtime.global_names
+    if any(global_names.get(name) is not value for name, value in imported.items()):
+        # an import done again doesn't invalidate the caches of global names
+        global_names.update(imported)
 
     returned_map = []
-
-    for name, value in module.pairs():
-        if decider(name):
-            assert isinstance(name, e.Atom)
-            runtime.global_names[name.s] = value
-            returned_map += (name, value)
+    for name, value in imported.items():
+        returned_map += (e.Atom(name), value)
 
     return e.Vector(*returned_map)
 
 
 @_register("format")
-@e.Function.make("format")
+@e.Function.make("format", pure=True)
 def _(runtime: e.Runtime, x: e.Entity):
     if isinstance(x, e.String):
         return x
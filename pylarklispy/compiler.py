@@ -0,0 +1,352 @@
+from typing import Callable, Dict, Optional, Sequence
+
+from . import entities as e
+from . import bif
+from .resolver import param_names
+
+"""
+This module turns the AST produced by `parser.Transformer` (and
+resolved by `pylarklispy.resolver`) into a tree of pre-bound
+Python closures.
+
+A compiled entity is a `Code`: a function that takes a runtime and
+returns the fully evaluated result, so running it doesn't re-dispatch
+on the entity tree every time. Code compiled with `tail=True` (function
+bodies) returns an `entities.TailCall` for calls of user-defined
+functions in tail position instead, like `entities.evaluate_tail`.
+"""
+
+Code = Callable[[e.Runtime], e.Entity]
+
+
+def compile_entity(entity: e.Entity, tail: bool = False) -> Code:
+    """Compile an entity into a closure that evaluates it"""
+    if isinstance(entity, e.SExpr):
+        return _compile_s_expr(entity, tail)
+    compiler = _compilers.get(type(entity))
+    if compiler is not None:
+        return compiler(entity)
+    if type(entity).compute is e.Entity.compute:
+        # the entity is already final
+        return lambda runtime: entity
+    # an unknown entity with its own semantics; leave it to the evaluator
+    return entity.evaluate
+
+
+def _compile_name(name: e.Name) -> Code:
+    identifier = name.identifier
+    def run(runtime: e.Runtime) -> e.Entity:
+        return runtime[identifier]
+    return run
+
+
+def _compile_local_name(name: e.LocalName) -> Code:
+    depth = name.depth
+    slot = name.slot
+    if depth == 0:
+        def run(runtime: e.Runtime) -> e.Entity:
+            return runtime.stack[-1].values[slot]
+    elif depth == 1:
+        def run(runtime: e.Runtime) -> e.Entity:
+            return runtime.stack[-1].parent.values[slot]
+    else:
+        def run(runtime: e.Runtime) -> e.Entity:
+            frame = runtime.stack[-1]
+            for _ in range(depth):
+                frame = frame.parent
+            return frame.values[slot]
+    return run
+
+
+def _compile_global_name(name: e.GlobalName) -> Code:
+    identifier = name.identifier
+    # an inline cache, like `GlobalName.compute`: replaced as a whole,
+    # since compiled code (e.g. `_bool_code`) is shared by the runtimes
+    cache = (None, 0, None)
+    def run(runtime: e.Runtime) -> e.Entity:
+        nonlocal cache
+        global_names = runtime.global_names
+        cached_names, version, value = cache
+        if cached_names is global_names and version == global_names.version:
+            return value
+        value = global_names[identifier]
+        cache = (global_names, global_names.version, value)
+        return value
+    return run
+
+
+def _compile_vector(vector: e.Vector) -> Code:
+    if vector._computed == len(vector.es):
+        return lambda runtime: vector
+    codes = [compile_entity(x) for x in vector.es]
+    size = len(codes)
+    def run(runtime: e.Runtime) -> e.Entity:
+        return e.Vector(*[code(runtime) for code in codes], _computed=size)
+    return run
+
+
+def _compile_map(map_: e.Map) -> Code:
+    if map_.literal is None:
+        return lambda runtime: map_
+    codes = [(compile_entity(k), compile_entity(v)) for k, v in map_.pairs()]
+    def run(runtime: e.Runtime) -> e.Entity:
+        return e.Map.from_pairs(
+            (key_code(runtime), value_code(runtime))
+            for key_code, value_code in codes
+        )
+    return run
+
+
+def _compile_sigil_string(sigil: e.SigilString) -> Code:
+    return compile_entity(
+        e.SExpr(e.Name(sigil.sigil_function_name), e.String(sigil.string))
+    )
+
+
+def _compile_folded(folded: e.Folded) -> Code:
+    value = folded.value
+    assumptions = folded.assumptions
+    original_code = compile_entity(folded.original)
+    # the last version of the global names the assumptions held in
+    checked = 0
+    def run(runtime: e.Runtime) -> e.Entity:
+        nonlocal checked
+        global_names = runtime.global_names
+        if global_names.version == checked:
+            return value
+        for name, function in assumptions:
+            if global_names.get(name) is not function:
+                return original_code(runtime)
+        checked = global_names.version
+        return value
+    return run
+
+
+def _compile_s_expr(s_expr: e.SExpr, tail: bool) -> Code:
+    if not s_expr.es:
+        # let the evaluator report the error
+        return s_expr.evaluate
+
+    head, *args = s_expr.es
+    head_code = compile_entity(head)
+    arg_codes = [compile_entity(arg) for arg in args]
+
+    def call(runtime: e.Runtime, function: e.Entity) -> e.Entity:
+        try:
+            if isinstance(function, e.Function) and not function.lazy:
+                return function.apply_sequence(runtime, [code(runtime) for code in arg_codes])
+            return function.call(runtime, *args)
+        except TypeError as exc:
+            raise s_expr.type_error(exc)
+
+    def tail_call(runtime: e.Runtime, function: e.Entity) -> e.Entity:
+        if isinstance(function, e.Function):
+            if function.tail:
+                try:
+                    expr = function.fn(runtime, *[e.Quoted(arg) for arg in args])
+                except TypeError as exc:
+                    raise s_expr.type_error(exc)
+                return e.evaluate_tail(expr, runtime)
+            if function.body is not None and not function.lazy:
+                return e.TailCall(function, [code(runtime) for code in arg_codes])
+        return call(runtime, function)
+
+    generic = tail_call if tail else call
+
+    if isinstance(head, e.Function) and bif.index.get(head.name) is head:
+        # a built-in put there by a macro; no need to check it at run time
+        special_form = _special_forms.get(head.name)
+        special = special_form(args, tail) if special_form is not None else None
+        if special is not None:
+            return special
+
+    special = None
+    if isinstance(head, e.Name) and head.identifier in _special_forms:
+        special = _special_forms[head.identifier](args, tail)
+
+    if special is None:
+        def run(runtime: e.Runtime) -> e.Entity:
+            return generic(runtime, head_code(runtime))
+    else:
+        # The special form is only valid while the name still refers
+        # to the built-in function.
+        builtin = bif.index[head.identifier]
+        def run(runtime: e.Runtime) -> e.Entity:
+            function = head_code(runtime)
+            if function is builtin:
+                return special(runtime)
+            return generic(runtime, function)
+    return run
+
+
+_compilers: Dict[type, Callable[..., Code]] = {
+    e.Name: _compile_name,
+    e.LocalName: _compile_local_name,
+    e.GlobalName: _compile_global_name,
+    e.Vector: _compile_vector,
+    e.Map: _compile_map,
+    e.SigilString: _compile_sigil_string,
+    e.Folded: _compile_folded,
+}
+
+
+##### Special forms #####
+# Each of these gets the unevaluated arguments of a built-in lazy function
+# and whether it's in tail position, and returns a `Code` doing the same
+# thing, or None if the shape of the arguments isn't supported (then the
+# built-in is called as usual).
+
+_special_forms: Dict[str, Callable[[Sequence[e.Entity], bool], Optional[Code]]] = {}
+
+def _special_form(name):
+    def _(f):
+        _special_forms[name] = f
+        return f
+    return _
+
+
+_bool = bif.index["bool"]
+# whatever the global `bool` refers to, like in `bif`
+_bool_code = _compile_global_name(e.GlobalName("bool"))
+
+def _truthy(runtime: e.Runtime, x: e.Entity) -> bool:
+    function = _bool_code(runtime)
+    if function is _bool:
+        return _bool.fn(runtime, x) is e.TRUE
+    return e.SExpr(function, e.Quoted(x)).evaluate(runtime) is e.TRUE
+
+
+@_special_form("fun")
+def _(args, tail):
+    if len(args) == 3 and isinstance(args[2], e.Vector):
+        # with its captures, see `pylarklispy.resolver`
+        params, body, captures = args
+        capture_codes = [compile_entity(name) for name in captures.es]
+    elif len(args) == 2:
+        params, body = args
+        capture_codes = None
+    else:
+        return None
+    arg_names = param_names(params)
+    if arg_names is None:
+        return None
+    body_code = compile_entity(body, tail=True)
+    def run(runtime: e.Runtime) -> e.Entity:
+        closure = None
+        if capture_codes is not None:
+            values = [code(runtime) for code in capture_codes]
+            closure = e.capture_frame(runtime, captures.es, values)
+        return e.create_function(runtime, "~fun~", arg_names, body, code=body_code, closure=closure)
+    return run
+
+
+@_special_form("defun")
+def _(args, tail):
+    if len(args) != 3:
+        return None
+    name, params, body = args
+    if not isinstance(name, e.Name):
+        return None
+    make_function = _special_forms["fun"]([params, body], False)
+    if make_function is None:
+        return None
+    identifier = name.identifier
+    def run(runtime: e.Runtime) -> e.Entity:
+        fun = make_function(runtime)
+        assert isinstance(fun, e.Function)
+        runtime.global_frame.insert(identifier, fun.with_name(identifier))
+        return e.NIL
+    return run
+
+
+@_special_form("define")
+def _(args, tail):
+    if len(args) != 2:
+        return None
+    name, value = args
+    if not isinstance(name, e.Name):
+        return None
+    identifier = name.identifier
+    value_code = compile_entity(value)
+    def run(runtime: e.Runtime) -> e.Entity:
+        runtime.global_frame.insert(identifier, bif.name_function(identifier, value_code(runtime)))
+        return e.NIL
+    return run
+
+
+@_special_form("if")
+def _(args, tail):
+    if len(args) != 3:
+        return None
+    cond, then, else_ = args
+    cond_code = compile_entity(cond)
+    then_code = compile_entity(then, tail)
+    else_code = compile_entity(else_, tail)
+    def run(runtime: e.Runtime) -> e.Entity:
+        if _truthy(runtime, cond_code(runtime)):
+            return then_code(runtime)
+        else:
+            return else_code(runtime)
+    return run
+
+
+@_special_form("do")
+def _(args, tail):
+    if not args:
+        return lambda runtime: e.NIL
+    *init, last = args
+    init_codes = [compile_entity(arg) for arg in init]
+    last_code = compile_entity(last, tail)
+    def run(runtime: e.Runtime) -> e.Entity:
+        for code in init_codes:
+            code(runtime)
+        return last_code(runtime)
+    return run
+
+
+@_special_form("and")
+def _(args, tail):
+    codes = [compile_entity(arg) for arg in args]
+    def run(runtime: e.Runtime) -> e.Entity:
+        for code in codes:
+            if not _truthy(runtime, code(runtime)):
+                return e.FALSE
+        return e.TRUE
+    return run
+
+
+@_special_form("or")
+def _(args, tail):
+    codes = [compile_entity(arg) for arg in args]
+    def run(runtime: e.Runtime) -> e.Entity:
+        for code in codes:
+            if _truthy(runtime, code(runtime)):
+                return e.TRUE
+        return e.FALSE
+    return run
+
+
+@_special_form("let")
+def _(args, tail):
+    if len(args) != 2:
+        return None
+    bindings, body = args
+    if not isinstance(bindings, e.Vector) or len(bindings.es) % 2 != 0:
+        return None
+    arg_names = param_names(e.Vector(*bindings.es[::2]))
+    if arg_names is None:
+        return None
+    value_codes = [compile_entity(value) for value in bindings.es[1::2]]
+    layout = e.make_layout(arg_names)
+    # a TailCall coming out of the body is performed by the enclosing
+    # function, after the frame is popped
+    body_code = compile_entity(body, tail)
+    def run(runtime: e.Runtime) -> e.Entity:
+        values = [code(runtime) for code in value_codes]
+        frame = runtime.stack[-1]
+        runtime.push(e.SlotFrame(frame, frame.depth + 1, "<let>", layout, values))
+        try:
+            return body_code(runtime)
+        finally:
+            runtime.pop()
+    return run
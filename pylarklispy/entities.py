@@ -1,5 +1,11 @@
+import copyreg
+import itertools
+import threading
+import weakref
 from typing import Callable, Dict, Generic, Iterable, Mapping, Optional, Sequence, Tuple, TypeVar, Union
 
+from .persistent import PersistentMap, PersistentVector
+
 """
 This module contains the classes that represent all the language
 entities like S-Expr, Integer etc.
@@ -11,18 +17,47 @@ E = TypeVar("E", bound="Entity")
 
 
 class StackFrame:
-    def __init__(self, parent: Optional["StackFrame"], depth: int, caller: str, names: Dict[str, "Entity"]):
+    """A frame of names. `caller` describes what pushed the frame: it's
+    either a string or the `Function` itself, which is only formatted
+    when the description is needed (see `describe`)."""
+    __slots__ = ("parent", "depth", "caller", "names")
+
+    def __init__(self, parent: Optional["StackFrame"], depth: int, caller: Union[str, "Function"], names: Dict[str, "Entity"]):
         self.parent = parent
         self.depth = depth
         self.caller = caller
         self.names = names
 
-    def lookup(self, name: str, *, trace: Tuple["StackFrame", ...] = ()):
-        if name in self.names:
-            return self.names[name]
-        if self.parent is None:
-            raise KeyError(name, trace)
-        return self.parent.lookup(name, trace=trace + (self,))
+    def describe(self) -> str:
+        return self.caller if isinstance(self.caller, str) else repr(self.caller)
+
+    def _state(self) -> Dict[str, object]:
+        return {"parent": self.parent, "depth": self.depth, "caller": self.describe(), "names": self.names}
+
+    def __reduce__(self):
+        # the attributes are set after the frame is created, as they may refer to it
+        return (copyreg.__newobj__, (type(self),), (None, self._state()))
+
+    def get(self, name: str) -> Optional["Entity"]:
+        """Get a name from this frame only, or None"""
+        return self.names.get(name)
+
+    def lookup(self, name: str) -> "Entity":
+        frame = self
+        while True:
+            value = frame.get(name)
+            if value is not None:
+                return value
+            if frame.parent is None:
+                break
+            frame = frame.parent
+        # build the trace only when we need to report it
+        trace = []
+        frame = self
+        while frame.parent is not None:
+            trace.append(frame)
+            frame = frame.parent
+        raise KeyError(name, tuple(trace))
 
     def insert(self, name: str, value: "Entity", *, depth: int = 0):
         if depth < 0:
@@ -36,9 +71,112 @@ class StackFrame:
             self.parent.insert(name, value, depth=depth-1)
 
 
+class SlotFrame(StackFrame):
+    """A stack frame of a user-defined function.
+
+    The values are stored in a fixed-size array; `layout` maps
+    a name to its slot and is shared by all the calls of the function.
+    """
+    __slots__ = ("layout", "values")
+
+    def __init__(self, parent: Optional[StackFrame], depth: int, caller: Union[str, "Function"], layout: Mapping[str, int], values: Sequence["Entity"]):
+        self.parent = parent
+        self.depth = depth
+        self.caller = caller
+        self.layout = layout
+        self.values = tuple(values)
+
+    @property
+    def names(self) -> Dict[str, "Entity"]:
+        return {name: self.values[slot] for name, slot in self.layout.items()}
+
+    def _state(self) -> Dict[str, object]:
+        return {
+            "parent": self.parent, "depth": self.depth, "caller": self.describe(),
+            "layout": self.layout, "values": self.values
+        }
+
+    def get(self, name: str) -> Optional["Entity"]:
+        slot = self.layout.get(name)
+        if slot is None:
+            return None
+        return self.values[slot]
+
+    def insert(self, name: str, value: "Entity", *, depth: int = 0):
+        if depth != 0:
+            return super().insert(name, value, depth=depth)
+        if name not in self.layout:
+            raise LookupError(f"{name} is not a slot of this frame")
+        values = list(self.values)
+        values[self.layout[name]] = value
+        self.values = tuple(values)
+
+
+def make_layout(names: Sequence[str]) -> Dict[str, int]:
+    """Map each name to its slot (later duplicates win, like in a dict)"""
+    return {name: slot for slot, name in enumerate(names)}
+
+
+_versions = itertools.count(1)
+
+# an empty inline cache (see `Name`)
+_NO_CACHE = (None, 0, None)
+
+
+class GlobalNames(dict):
+    """The global names of a runtime.
+
+    Every change gives it a new `version`, unique among all the
+    `GlobalNames`, so a name can cache what it refers to and check that
+    it's still valid cheaply (see `GlobalName.compute`).
+    """
+    __slots__ = ("version",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = next(_versions)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version = next(_versions)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version = next(_versions)
+
+    def __ior__(self, other):
+        result = super().__ior__(other)
+        self.version = next(_versions)
+        return result
+
+    def __reduce__(self):
+        # a new version when loaded, the items are added after it's created
+        return (GlobalNames, (), None, None, iter(self.items()))
+
+    def pop(self, *args):
+        self.version = next(_versions)
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version = next(_versions)
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.version = next(_versions)
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version = next(_versions)
+
+    def clear(self):
+        super().clear()
+        self.version = next(_versions)
+
+
 class Runtime:
     def __init__(self, built_ins: Mapping[str, "Entity"]):
-        self.global_names = dict(built_ins)
+        self.global_names = GlobalNames(built_ins)
         self.global_frame = StackFrame(
             parent=None,
             depth=0,
@@ -46,6 +184,12 @@ class Runtime:
             names=self.global_names
         )
         self.stack = [self.global_frame]
+        # user-defined macros (None: not a macro any more),
+        # see `pylarklispy.macros`
+        self.macros: Dict[str, Optional["Function"]] = {}
+        # the interop modules loaded in this runtime, by (name, path),
+        # see `bif.load_module` and `pylarklispy.image`
+        self.modules: Dict[Tuple[str, str], "interop_utils.Module"] = {}
 
     @property
     def current_frame(self):
@@ -64,6 +208,8 @@ class Runtime:
 
 
 class Entity:
+    __slots__ = ()
+
     def fmap(self, f: Callable[["Entity"], "Entity"]) -> "Entity":
         return f(self)
 
@@ -86,6 +232,8 @@ class Entity:
 
 
 class Integer(Entity):
+    __slots__ = ("n",)
+
     def __init__(self, n: int):
         self.n = n
 
@@ -94,6 +242,9 @@ class Integer(Entity):
             return False
         return self.n == other.n
 
+    def __hash__(self):
+        return hash(self.n)
+
     def __str__(self):
         return str(self.n)
 
@@ -102,6 +253,8 @@ class Integer(Entity):
 
 
 class String(Entity):
+    __slots__ = ("s",)
+
     def __init__(self, s: str):
         self.s = s
 
@@ -109,6 +262,10 @@ class String(Entity):
         if not isinstance(other, String):
             return False
         return self.s == other.s
+
+    def __hash__(self):
+        return hash(self.s)
+
     def __str__(self):
         return repr(self.s)
 
@@ -117,15 +274,30 @@ class String(Entity):
 
 
 class Atom(Entity):
-    def __init__(self, s: str):
-        if s.startswith(":"):
-            raise ValueError(f"You accidentally put a : in the atom: {s}")
-        self.s = s
-
-    def __eq__(self, other):
-        if not isinstance(other, Atom):
-            return False
-        return self.s == other.s
+    """Atoms are interned: `Atom("x") is Atom("x")`, so they are
+    compared and hashed by identity (the defaults of `object`).
+    The table only keeps the atoms that are used somewhere, so a program
+    reading many different atoms doesn't make it grow forever."""
+    __slots__ = ("s", "__weakref__")
+    _interned: "weakref.WeakValueDictionary[str, Atom]" = weakref.WeakValueDictionary()
+    # two threads making the same atom must get the same one
+    _lock = threading.Lock()
+
+    def __new__(cls, s: str):
+        atom = cls._interned.get(s)
+        if atom is None:
+            if s.startswith(":"):
+                raise ValueError(f"You accidentally put a : in the atom: {s}")
+            with cls._lock:
+                atom = cls._interned.get(s)
+                if atom is None:
+                    atom = super().__new__(cls)
+                    atom.s = s
+                    cls._interned[s] = atom
+        return atom
+
+    def __reduce__(self):
+        return (Atom, (self.s,))
 
     def __str__(self):
         return f":{self.s}"
@@ -134,7 +306,18 @@ class Atom(Entity):
         return f"<Atom :{self.s}>"
 
 
+NIL = Atom("Nil")
+TRUE = Atom("True")
+FALSE = Atom("False")
+
+
+def boolean(x: bool) -> Atom:
+    return TRUE if x else FALSE
+
+
 class Quoted(Entity, Generic[E]):
+    __slots__ = ("e",)
+
     def __init__(self, e: E):
         self.e = e
 
@@ -146,6 +329,9 @@ class Quoted(Entity, Generic[E]):
             return False
         return self.e == other.e
 
+    def __hash__(self):
+        return hash((Quoted, self.e))
+
     def __str__(self):
         return f"&{self.e}"
 
@@ -154,6 +340,8 @@ class Quoted(Entity, Generic[E]):
 
 
 class SExpr(Entity):
+    __slots__ = ("es",)
+
     def __init__(self, *es: Entity):
         self.es = es
 
@@ -165,12 +353,22 @@ class SExpr(Entity):
             return False
         return self.es == other.es
 
+    def __hash__(self):
+        return hash((SExpr, self.es))
+
     def compute(self, runtime: Runtime) -> Entity:
+        return self.invoke(runtime, self.es[0].evaluate(runtime))
+
+    def invoke(self, runtime: Runtime, function: Entity) -> Entity:
+        """Call the (already evaluated) head with the arguments"""
         try:
-            return self.es[0].evaluate(runtime).call(runtime, *self.es[1:])
+            return function.call(runtime, *self.es[1:])
         except TypeError as e:
-            print(f"Calling {self} resulted in TypeError: {e.args}")
-            raise RuntimeError from None
+            raise self.type_error(e)
+
+    def type_error(self, e: TypeError) -> RuntimeError:
+        print(f"Calling {self} resulted in TypeError: {e.args}")
+        return RuntimeError()
 
     def __str__(self):
         return "(" + " ".join(map(str, self.es)) + ")"
@@ -180,10 +378,22 @@ class SExpr(Entity):
 
 
 class Vector(Entity, Generic[E]):
+    """A vector of entities. The elements (`es`) are stored in a
+    `PersistentVector`, so updated copies share structure."""
+    __slots__ = ("es", "_computed")
+
     def __init__(self, *es: E, _computed: int = 0):
-        self.es = es
+        self.es: PersistentVector = PersistentVector(es)
         self._computed = _computed
 
+    @staticmethod
+    def wrap(es: PersistentVector, _computed: int = 0) -> "Vector":
+        """Make a vector out of a `PersistentVector` without copying it"""
+        new = Vector()
+        new.es = es
+        new._computed = _computed
+        return new
+
     def fmap(self, f):
         return Vector(*(e.fmap(f) for e in self.es), _computed=0)
 
@@ -192,13 +402,17 @@ class Vector(Entity, Generic[E]):
             return False
         return self.es == other.es
 
+    def __hash__(self):
+        return hash((Vector, self.es))
+
     def i_am_a_mapping(self):
         if len(self.es) % 2 != 0:
             raise TypeError(f"{self} is not a mapping")
 
     def pairs(self):
         self.i_am_a_mapping()
-        return zip(self.es[::2], self.es[1::2])
+        it = iter(self.es)
+        return zip(it, it)
 
     @staticmethod
     def from_pairs(kvs: Iterable[Tuple[Entity, Entity]]) -> "Vector":
@@ -214,7 +428,7 @@ class Vector(Entity, Generic[E]):
             for k, v in self.pairs():
                 if k == key:
                     return v
-        return Atom("Nil")
+        return NIL
 
     def compute(self, runtime: Runtime) -> "Vector":
         if self._computed == len(self.es):
@@ -230,6 +444,8 @@ class Vector(Entity, Generic[E]):
         return Vector(*new_es, _computed=computed)
 
     def evaluate(self, runtime: Runtime) -> "Vector":
+        if self._computed == len(self.es):
+            return self
         # if we just want the result, there's no need
         # to do a billion `compute`s
         return Vector(
@@ -241,20 +457,128 @@ class Vector(Entity, Generic[E]):
         return "[" + " ".join(map(str, self.es)) + "]"
 
     def __repr__(self):
-        return f"<Vector {self.es}>"
+        return f"<Vector {tuple(self.es)}>"
+
+
+class Map(Entity, Generic[E]):
+    """A hashed mapping, written as `{key value key value...}`.
+
+    A map from the parser is a literal: its keys and values are
+    computed into a `PersistentMap` when it's evaluated.
+    """
+    __slots__ = ("literal", "table")
+
+    def __init__(self, *es: E):
+        if len(es) % 2 != 0:
+            raise ValueError(f"Odd number of elements in a map literal: {len(es)}")
+        self.literal: Optional[Tuple[E, ...]] = es
+        self.table = PersistentMap()
+
+    @staticmethod
+    def from_table(table: PersistentMap) -> "Map":
+        new = Map()
+        new.literal = None
+        new.table = table
+        return new
+
+    @staticmethod
+    def from_pairs(kvs: Iterable[Tuple[Entity, Entity]]) -> "Map":
+        return Map.from_table(PersistentMap(kvs))
+
+    def fmap(self, f):
+        if self.literal is not None:
+            return Map(*(e.fmap(f) for e in self.literal))
+        return Map.from_pairs((k.fmap(f), v.fmap(f)) for k, v in self.table.items())
+
+    def __eq__(self, other):
+        if not isinstance(other, Map):
+            return False
+        return (self.literal, self.table) == (other.literal, other.table)
+
+    def __hash__(self):
+        return hash((Map, self.literal, self.table))
+
+    def pairs(self):
+        if self.literal is not None:
+            return zip(self.literal[::2], self.literal[1::2])
+        return self.table.items()
+
+    def call(self, runtime: Runtime, *keys: Entity):
+        for key in keys:
+            value = self.table.get(key.evaluate(runtime))
+            if value is not None:
+                return value
+        return NIL
+
+    def compute(self, runtime: Runtime) -> "Map":
+        if self.literal is None:
+            return self
+        return Map.from_pairs(
+            (k.evaluate(runtime), v.evaluate(runtime))
+            for k, v in self.pairs()
+        )
+
+    def __str__(self):
+        return "{" + " ".join(f"{k} {v}" for k, v in self.pairs()) + "}"
+
+    def __repr__(self):
+        return f"<Map {dict(self.pairs())}>"
+
+
+def is_data(entity: Entity) -> bool:
+    """Whether `entity` is a literal made of integers, strings, atoms and
+    vectors and maps of them: there's nothing in it to expand, resolve
+    or call. Checked without recursion, so it works at any depth."""
+    stack = [entity]
+    while stack:
+        x = stack.pop()
+        cls = x.__class__
+        if cls is Vector:
+            if x._computed != len(x.es):
+                stack.extend(x.es)
+        elif cls is Map:
+            if x.literal is not None:
+                stack.extend(x.literal)
+        elif cls is not Integer and cls is not String and cls is not Atom:
+            return False
+    return True
 
 
 class Name(Entity):
+    # `_cache` is an inline cache of the global value: the global names
+    # it was found in, their version and the value (see `GlobalNames`).
+    # It's replaced as a whole, so a node shared by several runtimes or
+    # threads never mixes the version of one with the value of another.
+    __slots__ = ("identifier", "_cache")
+
     def __init__(self, identifier: str):
         self.identifier = identifier
+        self._cache = _NO_CACHE
 
     def __eq__(self, other):
         if not isinstance(other, Name):
             return False
         return self.identifier == other.identifier
 
+    def __hash__(self):
+        return hash((Name, self.identifier))
+
+    def __reduce__(self):
+        # without the cache
+        return (type(self), (self.identifier,))
+
     def compute(self, runtime: Runtime) -> Entity:
-        return runtime[self.identifier]
+        frame = runtime.stack[-1]
+        if frame is not runtime.global_frame:
+            # it may be bound by a local frame
+            return frame.lookup(self.identifier)
+        names = runtime.global_names
+        cached_names, version, value = self._cache
+        if cached_names is names and version == names.version:
+            return value
+        value = frame.lookup(self.identifier)
+        self._cache = (names, names.version, value)
+        return value
 
     def __str__(self):
         return self.identifier
@@ -263,7 +587,44 @@ class Name(Entity):
         return f"<Name {self.identifier}>"
 
 
+class LocalName(Name):
+    """A name bound by an enclosing function, found by the resolver
+    (see `pylarklispy.resolver`) at `depth` frames up in slot `slot`"""
+    __slots__ = ("depth", "slot")
+
+    def __init__(self, identifier: str, depth: int, slot: int):
+        self.identifier = identifier
+        self.depth = depth
+        self.slot = slot
+
+    def __reduce__(self):
+        return (LocalName, (self.identifier, self.depth, self.slot))
+
+    def compute(self, runtime: Runtime) -> Entity:
+        frame = runtime.stack[-1]
+        for _ in range(self.depth):
+            frame = frame.parent
+        return frame.values[self.slot]
+
+
+class GlobalName(Name):
+    """A name that isn't bound by any enclosing function,
+    so it's looked up in the global frame directly"""
+    __slots__ = ()
+
+    def compute(self, runtime: Runtime) -> Entity:
+        names = runtime.global_names
+        cached_names, version, value = self._cache
+        if cached_names is names and version == names.version:
+            return value
+        value = names[self.identifier]
+        self._cache = (names, names.version, value)
+        return value
+
+
 class SigilString(Entity):
+    __slots__ = ("sigil", "string")
+
     def __init__(self, sigil: str, string: str):
         self.sigil = sigil
         self.string = string
@@ -273,6 +634,9 @@ class SigilString(Entity):
             return False
         return (self.sigil, self.string) == (other.sigil, other.string)
 
+    def __hash__(self):
+        return hash((SigilString, self.sigil, self.string))
+
     @property
     def sigil_function_name(self) -> str:
         return f"sigil<{self.sigil}>"
@@ -291,40 +655,94 @@ class SigilString(Entity):
 
 
 class Function(Entity):
+    """A callable entity.
+
+    `body` is the body of a user-defined function (see `create_function`),
+    calls to those in tail position are trampolined by `apply`.
+
+    A `tail` function is a lazy built-in that returns the expression
+    in its tail position without evaluating it (like `if`), so
+    `evaluate_tail` can keep looking for a tail call inside it.
+
+    A `pure` function returns a final entity, depends on nothing but
+    its arguments and has no side effects, so `pylarklispy.folding`
+    may call it ahead of time on constant arguments.
+
+    `layout` maps the parameters of a user-defined function to their
+    slots in its frame (see `SlotFrame`).
+    """
+    __slots__ = ("name", "fn", "closure", "lazy", "tail", "body", "pure", "layout")
+
     def __init__(
         self,
         name: str,
         fn: Callable[..., Entity], # Runtime, *Entity -> Entity
         closure: Optional[StackFrame] = None,
-        lazy: bool = False
+        lazy: bool = False,
+        tail: bool = False,
+        body: Optional[Entity] = None,
+        pure: bool = False,
+        layout: Optional[Mapping[str, int]] = None
     ):
         self.name = name
         self.fn = fn
         self.closure = closure
         self.lazy = lazy
+        self.tail = tail
+        self.body = body
+        self.pure = pure
+        self.layout = layout
 
     @staticmethod
-    def make(name: str, *, lazy: bool = False):
+    def make(name: str, *, lazy: bool = False, tail: bool = False, pure: bool = False):
         def _(fn):
-            return Function(name, fn, lazy=lazy)
+            return Function(name, fn, lazy=lazy, tail=tail, pure=pure)
         return _
 
     def with_name(self, name):
-        return Function(name, self.fn, self.closure)
+        return Function(name, self.fn, self.closure, tail=self.tail, body=self.body, pure=self.pure, layout=self.layout)
 
     def call(self, runtime: Runtime, *args: Entity) -> Entity:
         if self.lazy:
-            computed_args = [Quoted(arg) for arg in args]
-        else:
-            computed_args = [arg.evaluate(runtime) for arg in args]
+            return self.apply_sequence(runtime, [Quoted(arg) for arg in args])
+        return self.apply_sequence(runtime, [arg.evaluate(runtime) for arg in args])
 
-        if self.closure is not None:
-            runtime.push(self.closure)
-        try:
-            return self.fn(runtime, *computed_args).evaluate(runtime)
-        finally:
-            if self.closure is not None:
-                runtime.pop()
+    def apply(self, runtime: Runtime, *args: Entity) -> Entity:
+        """Call the function with arguments that are already
+        computed (or quoted, if the function is lazy)"""
+        return self.apply_sequence(runtime, args)
+
+    def apply_sequence(self, runtime: Runtime, args: Sequence[Entity]) -> Entity:
+        """Like `apply`, without unpacking and repacking `args`"""
+        function = self
+        while True:
+            if function.closure is not None:
+                runtime.push(function.closure)
+            try:
+                result = function.fn(runtime, *args)
+                if result.__class__ is not TailCall:
+                    return result.evaluate(runtime)
+            finally:
+                if function.closure is not None:
+                    runtime.pop()
+            # the frames of the previous function are gone by now
+            function = result.function
+            args = result.args
+
+    def __reduce__(self):
+        if self.layout is None:
+            # a built-in, saved with its Python function
+            return (Function, (self.name, self.fn, self.closure, self.lazy, self.tail, self.body, self.pure))
+        # a user-defined function is made again out of its body; the
+        # closure is set afterwards, as it may refer to the function
+        arg_names = [f"#{slot}" for slot in range(max(self.layout.values(), default=-1) + 1)]
+        for name, slot in self.layout.items():
+            arg_names[slot] = name
+        return (
+            _restore_function,
+            (self.name, arg_names, self.body, self.lazy),
+            (None, {"closure": self.closure})
+        )
 
     def __str__(self):
         return f"<fun({self.name})[{self.fn}]>"
@@ -333,28 +751,164 @@ class Function(Entity):
         return f"<Function {self.name} {self.fn} {self.closure}>"
 
 
-def create_function(outer_runtime: Optional[Runtime], name: str, arg_names: Sequence[str], body: Entity, lazy: bool = False):
+class Folded(Entity):
+    """A constant-folded expression (see `pylarklispy.folding`).
+
+    It evaluates to `value` as long as each global name in `assumptions`
+    still refers to the function the value was computed with, and to
+    the value of `original` otherwise.
+    """
+    __slots__ = ("value", "assumptions", "original", "_checked")
+
+    def __init__(self, value: Entity, assumptions: Tuple[Tuple[str, Entity], ...], original: Entity):
+        self.value = value
+        self.assumptions = assumptions
+        self.original = original
+        # the last version of the global names the assumptions held in
+        self._checked = 0
+
+    def holds(self, runtime: Runtime) -> bool:
+        """Whether `value` is still valid"""
+        global_names = runtime.global_names
+        if global_names.version == self._checked:
+            return True
+        for name, function in self.assumptions:
+            if global_names.get(name) is not function:
+                return False
+        self._checked = global_names.version
+        return True
+
+    def compute(self, runtime: Runtime) -> Entity:
+        if self.holds(runtime):
+            return self.value
+        # fully evaluated: a vector or a map computes its elements once
+        return self.original.evaluate(runtime)
+
+    def __eq__(self, other):
+        if not isinstance(other, Folded):
+            return False
+        return (self.value, self.assumptions, self.original) == (other.value, other.assumptions, other.original)
+
+    def __hash__(self):
+        return hash((Folded, self.value, self.original))
+
+    def __reduce__(self):
+        return (Folded, (self.value, self.assumptions, self.original))
+
+    def __str__(self):
+        return str(self.original)
+
+    def __repr__(self):
+        return f"<Folded {self.value!r} {self.original!r}>"
+
+
+class TailCall(Entity):
+    """A call of a user-defined function in tail position, whose arguments
+    are already computed. `Function.apply` performs it after leaving
+    the frame of the caller."""
+    __slots__ = ("function", "args")
+
+    def __init__(self, function: Function, args: Sequence[Entity]):
+        self.function = function
+        self.args = args
+
+    def compute(self, runtime: Runtime) -> Entity:
+        return self.function.apply_sequence(runtime, self.args)
+
+    def __str__(self):
+        return f"<tail call {self.function}>"
+
+    def __repr__(self):
+        return f"<TailCall {self.function!r} {self.args}>"
+
+
+def evaluate_tail(expr: Entity, runtime: Runtime) -> Entity:
+    """Evaluate an expression in tail position of a function body.
+
+    A call of a user-defined function isn't performed, but returned
+    as a `TailCall` instead. Tail built-ins (`if`, `do`...) are seen through.
+    """
+    while expr.__class__ is SExpr and expr.es:
+        function = expr.es[0].evaluate(runtime)
+        if not isinstance(function, Function):
+            return expr.invoke(runtime, function)
+        args = expr.es[1:]
+        if function.tail:
+            try:
+                expr = function.fn(runtime, *(Quoted(arg) for arg in args))
+            except TypeError as e:
+                raise expr.type_error(e)
+        elif function.body is not None:
+            if function.lazy:
+                return TailCall(function, [Quoted(arg) for arg in args])
+            return TailCall(function, [arg.evaluate(runtime) for arg in args])
+        else:
+            return expr.invoke(runtime, function)
+    if expr.__class__ is TailCall:
+        return expr
+    return expr.evaluate(runtime)
+
+
+def create_function(
+        outer_runtime: Optional[Runtime],
+        name: str,
+        arg_names: Sequence[str],
+        body: Entity,
+        lazy: bool = False,
+        code: Optional[Callable[[Runtime], Entity]] = None,
+        closure: Optional[StackFrame] = None
+    ):
     """Create a new user-defined function and attaches
-    a proper closure to it
+    a proper closure to it: `closure` if given (see `capture_frame`),
+    else the current frame of `outer_runtime`
+
+    If `code` is given (see `pylarklispy.compiler`), it is run
+    instead of evaluating `body`. Either way, a call in tail position
+    comes back as a `TailCall`, which `Function.apply` performs.
     """
+    from . import jit
+    layout = make_layout(arg_names)
+    arity = len(arg_names)
+    # the number of calls so far, until the JIT is tried (see `pylarklispy.jit`)
+    calls = 0 if not lazy else None
+    jitted = None
     def fun(runtime: Runtime, *args: Entity) -> Entity:
-        nonlocal caller
-        if len(args) != len(arg_names):
-            raise ValueError(f"Got {len(args)} args, exprected {len(arg_names)}")
-        local_frame = StackFrame(
-            parent=runtime.current_frame,
-            depth=runtime.current_frame.depth + 1,
-            caller=repr(caller),
-            names=dict(zip(arg_names, args))
-        )
-        runtime.push(local_frame)
+        nonlocal calls, jitted
+        if jitted is not None:
+            result = jitted(runtime, args)
+            if result is not None:
+                return result
+        elif calls is not None:
+            calls += 1
+            if calls >= jit.THRESHOLD:
+                calls = None
+                if jit.enabled:
+                    jitted = jit.compile_function(fun, arity, body, runtime.global_names)
+        if len(args) != arity:
+            raise ValueError(f"Got {len(args)} args, exprected {arity}")
+        stack = runtime.stack
+        parent = stack[-1]
+        # the caller is described only if someone asks (`StackFrame.describe`)
+        stack.append(SlotFrame(parent, parent.depth + 1, caller, layout, args))
         try:
-            return body.evaluate(runtime)
+            if code is not None:
+                return code(runtime)
+            return evaluate_tail(body, runtime)
         finally:
-            runtime.pop()
-    if outer_runtime is not None:
+            stack.pop()
+    if closure is None and outer_runtime is not None:
         closure = outer_runtime.current_frame
-    else:
-        closure = None
-    caller = Function(name, fun, closure=closure, lazy=lazy)
-    return caller
\ No newline at end of file
+    caller = Function(name, fun, closure=closure, lazy=lazy, body=body, layout=layout)
+    return caller
+
+def _restore_function(name: str, arg_names: Sequence[str], body: Entity, lazy: bool) -> Function:
+    # see `Function.__reduce__`
+    return create_function(None, name, arg_names, body, lazy=lazy)
+
+
+def capture_frame(runtime: Runtime, captures: Sequence[LocalName], values: Sequence[Entity]) -> SlotFrame:
+    """The closure of a function that only captures some names
+    (see `pylarklispy.resolver`); `values` are the values of `captures`"""
+    global_frame = runtime.global_frame
+    layout = make_layout([name.identifier for name in captures])
+    return SlotFrame(global_frame, global_frame.depth + 1, "<closure>", layout, values)
@@ -0,0 +1,136 @@
+import json
+import re
+from typing import List, Optional, Tuple
+
+from lark.exceptions import LarkError
+
+from . import entities as e
+
+"""
+This module contains a hand-written reader for the grammar in
+`grammar.lark`. It produces exactly the same entities as
+`parser.Transformer`, but doesn't go through Lark's generic lexer and
+LALR machinery, so it is several times faster on big (e.g. generated)
+files. Use it with `pylarklispy.compile_code(code, fast=True)`.
+
+The tokens are the ones from the grammar: `_TOKEN` has to be kept in
+sync with `grammar.lark`. Errors are reported as a `lark.LarkError`,
+like Lark does, so this imports Lark (but never builds its parser).
+"""
+
+
+class ReaderError(LarkError, ValueError):
+    def __init__(self, message: str, code: str, pos: int):
+        line = code.count("\n", 0, pos) + 1
+        column = pos - (code.rfind("\n", 0, pos) + 1) + 1
+        super().__init__(f"{message} at line {line}, column {column}")
+        self.line = line
+        self.column = column
+
+
+_TOKEN = re.compile(r'''
+      (?P<skip>(?:[ \t\f\r\n,]+|;.*)+)
+    | (?P<open>[(\[{])
+    | (?P<close>[)\]}])
+    | (?P<integer>[+-]?(?:0|[1-9][0-9]*))
+    | (?P<identifier>(?![+-]?[0-9])[-+*/%=<>_!?a-zA-Z0-9]+)
+    | (?P<string>".*?(?<!\\)(?:\\\\)*?")
+    | (?P<prefix>[:&~])
+''', re.VERBOSE)
+
+_CLOSERS = {"(": ")", "[": "]", "{": "}"}
+_CONSTRUCTORS = {"(": e.SExpr, "[": e.Vector, "{": e.Map}
+
+# what the next token has to be after `:` or `~`
+_ATOM, _SIGIL, _SIGIL_STRING = range(3)
+
+
+class _Frame:
+    __slots__ = ("opener", "items", "quotes", "start")
+
+    def __init__(self, opener: Optional[str], quotes: int, start: int):
+        self.opener = opener
+        self.items: List[e.Entity] = []
+        self.quotes = quotes  # the number of `&` before the opener
+        self.start = start
+
+
+def _string(token: str, code: str, pos: int) -> str:
+    try:
+        return json.loads(token)
+    except ValueError as error:
+        raise ReaderError(f"Bad string {token!r}: {error}", code, pos) from error
+
+
+def read(code: str) -> Tuple[e.Entity, ...]:
+    """Read all the top-level entities of `code`, like `compile_code`"""
+    frame = _Frame(None, 0, 0)
+    stack = [frame]
+    quotes = 0  # pending `&` before the next entity
+    expect = None  # _ATOM, _SIGIL, _SIGIL_STRING or None
+    sigil = ""
+    pos = 0
+    match = None
+    scanner = _TOKEN.scanner(code)
+    for match in iter(scanner.match, None):
+        kind = match.lastgroup
+        if kind == "skip":
+            continue
+        text = match.group()
+        pos = match.start()
+        if expect is not None:
+            if expect == _ATOM and kind == "identifier":
+                entity = e.Atom(text)
+            elif expect == _SIGIL and kind == "identifier":
+                sigil = text
+                expect = _SIGIL_STRING
+                continue
+            elif expect == _SIGIL_STRING and kind == "string":
+                entity = e.SigilString(sigil, _string(text, code, pos))
+            else:
+                raise ReaderError(f"Unexpected {text!r}", code, pos)
+            expect = None
+        elif kind == "identifier":
+            entity = e.Name(text)
+        elif kind == "integer":
+            entity = e.Integer(int(text))
+        elif kind == "string":
+            entity = e.String(_string(text, code, pos))
+        elif kind == "open":
+            frame = _Frame(text, quotes, pos)
+            stack.append(frame)
+            quotes = 0
+            continue
+        elif kind == "close":
+            if frame.opener is None or _CLOSERS[frame.opener] != text or quotes:
+                raise ReaderError(f"Unexpected {text!r}", code, pos)
+            try:
+                entity = _CONSTRUCTORS[frame.opener](*frame.items)
+            except ValueError as error:
+                # e.g. a map with an odd number of elements
+                raise ReaderError(str(error), code, frame.start) from error
+            quotes = frame.quotes
+            stack.pop()
+            frame = stack[-1]
+        elif text == "&":
+            quotes += 1
+            continue
+        elif text == ":":
+            expect = _ATOM
+            continue
+        else:  # ~
+            expect = _SIGIL
+            continue
+        while quotes:
+            entity = e.Quoted(entity)
+            quotes -= 1
+        frame.items.append(entity)
+
+    end = match.end() if match is not None else 0
+    if end != len(code):
+        raise ReaderError(f"Unexpected character {code[end]!r}", code, end)
+    if len(stack) > 1:
+        raise ReaderError(f"Unclosed {frame.opener!r}", code, frame.start)
+    if quotes or expect is not None:
+        raise ReaderError("Unexpected end of input", code, end)
+    return tuple(frame.items)
@@ -0,0 +1,193 @@
+from typing import Dict, Optional, Sequence, Tuple
+
+from . import entities as e
+from . import bif
+
+"""
+This module contains the constant folding pass. It runs on resolved
+statements (see `pylarklispy.resolver`) and:
+
+- replaces literal vectors and maps of constants with final ones, so
+  evaluating them doesn't build a copy every time;
+- calls `pure` functions on constant arguments ahead of time, e.g.
+  `(+ 1 (* 2 3))` or a sigil string like `~%"%!"`;
+- picks the branch of a built-in `if` with a constant condition (as
+  produced by the `not` macro).
+
+The pass runs on branches that may never be taken, so a call that could
+take too long (see `_is_bounded`) is left to the run time.
+
+A global name can be redefined after the pass, so a call of a global
+function is folded into an `entities.Folded`, which checks that the
+name still refers to the same function before using the value.
+"""
+
+Assumptions = Dict[str, e.Entity]
+
+
+def fold(entity: e.Entity, runtime: e.Runtime) -> e.Entity:
+    """Return a copy of `entity` with constant subexpressions folded,
+    using the global names of `runtime`"""
+    if isinstance(entity, e.SExpr):
+        return _fold_s_expr(entity, runtime)
+    elif isinstance(entity, e.Vector):
+        return _fold_vector(entity, runtime)
+    elif isinstance(entity, e.Map) and entity.literal is not None:
+        return _fold_map(entity, runtime)
+    elif isinstance(entity, e.SigilString):
+        folded = _fold_s_expr(
+            e.SExpr(e.GlobalName(entity.sigil_function_name), e.String(entity.string)),
+            runtime
+        )
+        return folded if _is_constant(folded) else entity
+    else:
+        return entity
+
+
+def _is_final(entity: e.Entity) -> bool:
+    if isinstance(entity, e.Vector):
+        return entity._computed == len(entity.es)
+    if isinstance(entity, e.Map):
+        return entity.literal is None
+    return type(entity).compute is e.Entity.compute
+
+
+def _is_constant(entity: e.Entity) -> bool:
+    return isinstance(entity, e.Folded) or _is_final(entity)
+
+
+def _values(entities: Sequence[e.Entity]) -> Tuple[list, Assumptions]:
+    """The values of constant entities and the assumptions they depend on"""
+    values = []
+    assumptions: Assumptions = {}
+    for entity in entities:
+        if isinstance(entity, e.Folded):
+            values.append(entity.value)
+            assumptions.update(entity.assumptions)
+        else:
+            values.append(entity)
+    return values, assumptions
+
+
+def _constant(value: e.Entity, assumptions: Assumptions, original: e.Entity) -> e.Entity:
+    if not assumptions:
+        return value
+    return e.Folded(value, tuple(assumptions.items()), original)
+
+
+def _freeze(data: e.Entity) -> e.Entity:
+    """The final value of a data literal (see `entities.is_data`), made
+    without recursion, so a deeply nested one doesn't need a deep stack
+    to be folded or evaluated"""
+    literals = []
+    stack = [data]
+    while stack:
+        entity = stack.pop()
+        if entity.__class__ is e.Vector and not _is_final(entity):
+            literals.append(entity)
+            stack.extend(entity.es)
+        elif entity.__class__ is e.Map and entity.literal is not None:
+            literals.append(entity)
+            stack.extend(entity.literal)
+    final: Dict[int, e.Entity] = {}
+    # the elements of a literal come after it
+    for entity in reversed(literals):
+        if entity.__class__ is e.Vector:
+            values = [final.get(id(x), x) for x in entity.es]
+            final[id(entity)] = e.Vector(*values, _computed=len(values))
+        else:
+            it = iter([final.get(id(x), x) for x in entity.literal])
+            final[id(entity)] = e.Map.from_pairs(zip(it, it))
+    return final.get(id(data), data)
+
+
+def _fold_vector(vector: e.Vector, runtime: e.Runtime) -> e.Entity:
+    if _is_final(vector):
+        return vector
+    if e.is_data(vector):
+        return _freeze(vector)
+    es = [fold(x, runtime) for x in vector.es]
+    original = e.Vector(*es)
+    if not all(map(_is_constant, es)):
+        return original
+    values, assumptions = _values(es)
+    return _constant(e.Vector(*values, _computed=len(values)), assumptions, original)
+
+
+def _fold_map(map_: e.Map, runtime: e.Runtime) -> e.Entity:
+    if e.is_data(map_):
+        return _freeze(map_)
+    es = [fold(x, runtime) for x in map_.literal]
+    original = e.Map(*es)
+    if not all(map(_is_constant, es)):
+        return original
+    values, assumptions = _values(es)
+    it = iter(values)
+    return _constant(e.Map.from_pairs(zip(it, it)), assumptions, original)
+
+
+def _function(head: e.Entity, runtime: e.Runtime) -> Tuple[Optional[e.Function], Assumptions]:
+    """The function `head` refers to if it's known now, and the assumption
+    it depends on"""
+    if isinstance(head, e.Function):
+        return head, {}
+    if type(head) is e.GlobalName:
+        function = runtime.global_names.get(head.identifier)
+        if isinstance(function, e.Function):
+            return function, {head.identifier: function}
+    return None, {}
+
+
+# the largest integer `*` and `**` compute ahead of time, in bits
+MAX_BITS = 1 << 16
+
+
+def _is_bounded(function: e.Function, values: Sequence[e.Entity]) -> bool:
+    """Whether calling `function` on `values` ahead of time is cheap,
+    e.g. not `(** 10 10000000000)`"""
+    if function is bif.index["**"] and len(values) == 2:
+        a, b = values
+        if isinstance(a, e.Integer) and isinstance(b, e.Integer):
+            return abs(a.n) <= 1 or b.n <= 0 or a.n.bit_length() * b.n <= MAX_BITS
+    elif function is bif.index["*"]:
+        bits = sum(x.n.bit_length() for x in values if isinstance(x, e.Integer))
+        return bits <= MAX_BITS
+    # the other pure functions take a time linear in their arguments
+    return True
+
+
+def _fold_s_expr(s_expr: e.SExpr, runtime: e.Runtime) -> e.Entity:
+    if not s_expr.es:
+        return s_expr
+    head, *args = s_expr.es
+    args = [fold(arg, runtime) for arg in args]
+    original = e.SExpr(head, *args)
+    function, assumptions = _function(head, runtime)
+    if function is None:
+        return original
+
+    if function is bif.index["if"] and not assumptions and len(args) == 3:
+        # (if <constant> then else), put there by a macro
+        # `if` calls the global `bool`, which can be redefined as well
+        bool_ = runtime.global_names.get("bool")
+        if bool_ is not bif.index["bool"]:
+            return original
+        if _is_constant(args[0]) and not isinstance(args[0], e.Folded):
+            condition = bool_.fn(runtime, args[0])
+            branch = args[1] if condition is e.TRUE else args[2]
+            if _is_constant(branch):
+                values, assumptions = _values([branch])
+                return e.Folded(values[0], (("bool", bool_), *assumptions.items()), original)
+        return original
+
+    if not function.pure or function.lazy or not all(map(_is_constant, args)):
+        return original
+    values, arg_assumptions = _values(args)
+    if not _is_bounded(function, values):
+        return original
+    try:
+        value = function.apply(runtime, *values)
+    except Exception:
+        # leave the error to the run time
+        return original
+    return _constant(value, {**assumptions, **arg_assumptions}, original)
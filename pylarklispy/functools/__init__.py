@@ -4,6 +4,8 @@ from ..interop_utils import Index
 
 
 class LinkedList(e.Entity):
+    __slots__ = ("value", "rest")
+
     def __init__(self, value, rest):
         self.value = value
         self.rest = rest
@@ -0,0 +1,142 @@
+import io
+import pickle
+from typing import Any, BinaryIO, Dict, Sequence, Tuple
+
+from . import entities as e
+from . import bif
+
+"""
+This module contains runtime images: a `Runtime` saved to a file after
+running a program (a prelude), so it can be loaded later instead of
+running the program again:
+
+    with open("prelude.image", "wb") as file:
+        image.save(runtime, file)
+    with open("prelude.image", "rb") as file:
+        runtime = image.load(file)
+
+An image holds the global names, the macros and everything they refer
+to: user-defined functions (their body and closure; the Python function
+is made again when loading), `ref` cells, `functools` lists... The
+built-ins of `bif.index` are saved by name, and the members of the
+interop modules (`import`, `interop`) by module and name: the modules
+are imported again when the image is loaded.
+
+Anything else has to be picklable: a value that isn't (a function made
+in Python by a closure, a lock...) makes `save` and `snapshot` raise an
+`ImageError` naming the global it was found in.
+"""
+
+MAGIC = b"pylarklispy image\n"
+VERSION = 1
+
+
+class ImageError(ValueError):
+    pass
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file: BinaryIO, runtime: e.Runtime):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        # what's saved by reference
+        self.references: Dict[int, Tuple[str, ...]] = {}
+        for (module_name, path), module in runtime.modules.items():
+            # the members not made yet aren't used by anything
+            for name, value in module.members.items():
+                self.references[id(value)] = ("module", module_name, path, name)
+        for name, function in bif.index.items():
+            self.references[id(function)] = ("bif", name)
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+# what pickle raises for a value it can't save
+_PICKLING_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+
+
+def _culprit(runtime: e.Runtime, values: Sequence[Any]) -> str:
+    """What couldn't be saved, found by saving the parts one by one"""
+    def picklable(value) -> bool:
+        try:
+            _Pickler(io.BytesIO(), runtime).dump(value)
+        except _PICKLING_ERRORS:
+            return False
+        return True
+    for name, value in runtime.global_names.items():
+        if not picklable(value):
+            return f"the value of `{name}` ({value})"
+    for value in values:
+        if not picklable(value):
+            return str(value)
+    return "the runtime"
+
+
+def _dump(runtime: e.Runtime, obj, file: BinaryIO, values: Sequence[Any] = ()):
+    try:
+        _Pickler(file, runtime).dump(obj)
+    except _PICKLING_ERRORS as error:
+        raise ImageError(f"Cannot save {_culprit(runtime, values)}: {error}") from None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file: BinaryIO):
+        super().__init__(file)
+        # the interop modules are loaded with a runtime of their own,
+        # the one being loaded doesn't exist yet
+        self.module_runtime = e.Runtime(bif.index)
+
+    def persistent_load(self, pid):
+        kind, *key = pid
+        if kind == "bif":
+            [name] = key
+            return bif.index[name]
+        if kind == "module":
+            module_name, path, name = key
+            return bif.load_module(self.module_runtime, module_name, path).member(name)
+        raise ImageError(f"Unknown reference in the image: {pid!r}")
+
+
+def _header(file: BinaryIO):
+    if file.readline() != MAGIC:
+        raise ImageError("Not a runtime image")
+    version = file.readline()
+    if version != f"{VERSION}\n".encode():
+        raise ImageError(f"Unsupported image version {version.strip()!r}, expected {VERSION}")
+
+
+def save(runtime: e.Runtime, file: BinaryIO):
+    """Save `runtime` to a binary file; raises `ImageError` if something
+    in it can't be saved"""
+    if len(runtime.stack) != 1:
+        raise ImageError("A runtime can only be saved between two statements")
+    file.write(MAGIC + f"{VERSION}\n".encode())
+    _dump(runtime, runtime, file)
+
+
+def load(file: BinaryIO) -> e.Runtime:
+    """Load a runtime saved with `save`"""
+    _header(file)
+    runtime = _Unpickler(file).load()
+    if not isinstance(runtime, e.Runtime):
+        raise ImageError("Not a runtime image")
+    return runtime
+
+
+def snapshot(runtime: e.Runtime, values: Sequence[Any] = ()) -> bytes:
+    """An image of `runtime` and of `values` (that may refer to it), to
+    make copies of both with `restore`, e.g. one for each worker"""
+    file = io.BytesIO()
+    file.write(MAGIC + f"{VERSION}\n".encode())
+    _dump(runtime, (runtime, tuple(values)), file, values)
+    return file.getvalue()
+
+
+def restore(data: bytes) -> Tuple[e.Runtime, Tuple[Any, ...]]:
+    """A copy of the runtime and the values of a `snapshot`"""
+    file = io.BytesIO(data)
+    _header(file)
+    runtime, values = _Unpickler(file).load()
+    # the snapshot may have been taken during an evaluation
+    runtime.stack = [runtime.global_frame]
+    return runtime, values
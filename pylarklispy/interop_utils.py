@@ -1,9 +1,20 @@
-from .entities import Function
+from typing import Callable, Dict, Optional
+
+from .entities import Entity, Function
+
+class Lazy:
+    """A member of an interop module made the first time it's used,
+    see `Index.add_lazy` and `Module.member`"""
+    __slots__ = ("factory",)
+
+    def __init__(self, factory: Callable[[], Entity]):
+        self.factory = factory
+
 
 class Index(dict):
-    def add_function(self, name, rewrite: bool = False):
+    def add_function(self, name, rewrite: bool = False, pure: bool = False):
         def decorator(fn):
-            entity = Function.make(name)(fn)
+            entity = Function.make(name, pure=pure)(fn)
             self.add_value(name, entity, rewrite=rewrite)
             return entity
         return decorator
@@ -11,4 +22,31 @@ class Index(dict):
     def add_value(self, name, value, rewrite: bool = False):
         if name in self and not rewrite:
             raise LookupError(f"{name} is already present")
-        self[name] = value
\ No newline at end of file
+        self[name] = value
+
+    def add_lazy(self, name, rewrite: bool = False):
+        """Like `add_value`, with the value returned by the decorated
+        function, called when the member is first imported"""
+        def decorator(factory):
+            self.add_value(name, Lazy(factory), rewrite=rewrite)
+            return factory
+        return decorator
+
+
+class Module:
+    """An interop module loaded in a runtime (see `bif.load_module`):
+    what its `interop` function returned, and the mtime of its file
+    when it was loaded"""
+    __slots__ = ("file", "mtime", "members")
+
+    def __init__(self, file: Optional[str], mtime: Optional[int], members: Dict[str, object]):
+        self.file = file
+        self.mtime = mtime
+        # values, or `Lazy` for the members not made yet
+        self.members = members
+
+    def member(self, name: str) -> Entity:
+        value = self.members[name]
+        if value.__class__ is Lazy:
+            value = self.members[name] = value.factory()
+        return value
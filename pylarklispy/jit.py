@@ -0,0 +1,411 @@
+import ast
+import itertools
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import entities as e
+from . import bif
+
+"""
+This module contains a JIT compiler for hot user-defined functions.
+
+`entities.create_function` counts the calls of a function, and after
+`THRESHOLD` of them asks `compile_function` to translate its (resolved)
+body into a Python function through the `ast` module. Only a numeric
+subset of the language is supported:
+
+- integer constants and the parameters of the function, which have to
+  be integers; they are unboxed into Python `int`s;
+- `+ * - neg ** < > = /=`, `if`, `not`, `and`, `or`, `let` and `do`;
+- calls of the function itself (a call in tail position becomes a jump
+  to the start of the function);
+- `(loop [init...] (fun [params] body))`, whose body returns
+  `[:next ...]` or `[:return x]`, becomes a `while` loop.
+
+Anything else makes the translation give up, and the function is
+interpreted as before. The compiled function is only used while its
+arguments are integers and the global names it relies on (`+`, the
+function itself...) are unchanged; otherwise the call falls back to
+the interpreter.
+
+Set `enabled = False` (or the environment variable `PYLARKLISPY_JIT=0`)
+to turn the JIT off, e.g. for debugging.
+"""
+
+enabled = os.environ.get("PYLARKLISPY_JIT", "1") != "0"
+
+THRESHOLD = 50
+
+# the result of a translated function: (runtime, args) -> Entity, or
+# None if the interpreter has to do the call
+Entry = Callable[[e.Runtime, Sequence[e.Entity]], Optional[e.Entity]]
+
+INT = "int"
+BOOL = "bool"
+
+_ARITHMETIC = {"+": ast.Add, "*": ast.Mult, "-": ast.Sub, "**": ast.Pow}
+_COMPARISONS = {"<": ast.Lt, ">": ast.Gt, "=": ast.Eq, "/=": ast.NotEq}
+_BUILTINS = {*_ARITHMETIC, *_COMPARISONS, "neg", "if", "and", "or", "let", "do", "loop", "fun"}
+
+
+class Unsupported(Exception):
+    pass
+
+
+Scope = Tuple[List[Tuple[str, str]], ...]  # innermost first; (variable, type) by slot
+
+
+class _Loop:
+    """Where `[:next ...]` and `[:return x]` go inside a `loop`"""
+    def __init__(self, variables: List[Tuple[str, str]], result: str):
+        self.variables = variables
+        self.result = result
+        self.result_type: Optional[str] = None
+
+
+class _Translator:
+    def __init__(self, fn: Callable, global_names: Dict[str, e.Entity], params: List[str], return_type: str):
+        self.fn = fn
+        self.global_names = global_names
+        self.params = params
+        self.return_type = return_type
+        self.guards: Dict[str, e.Entity] = {}
+        self._names = (f"v{i}" for i in itertools.count())
+
+    def fresh(self) -> str:
+        return next(self._names)
+
+    ##### heads #####
+
+    def builtin(self, head: e.Entity) -> Optional[str]:
+        """The name of the supported built-in `head` refers to"""
+        if isinstance(head, e.Function):
+            if head.name in _BUILTINS and bif.index.get(head.name) is head:
+                return head.name
+            return None
+        if type(head) is e.GlobalName and head.identifier in _BUILTINS:
+            self.guards[head.identifier] = bif.index[head.identifier]
+            return head.identifier
+        return None
+
+    def is_self(self, head: e.Entity) -> bool:
+        """Whether `head` is a global name of the function being translated"""
+        if type(head) is not e.GlobalName:
+            return False
+        function = self.global_names.get(head.identifier)
+        if isinstance(function, e.Function) and function.fn is self.fn:
+            self.guards[head.identifier] = function
+            return True
+        return False
+
+    ##### expressions #####
+
+    def expr(self, entity: e.Entity, scope: Scope, block: list) -> Tuple[ast.expr, str]:
+        """Translate `entity` into an expression, possibly adding
+        statements that must run before it to `block`"""
+        if isinstance(entity, e.Folded):
+            self.guards.update(entity.assumptions)
+            entity = entity.value
+        if isinstance(entity, e.Integer):
+            return ast.Constant(entity.n), INT
+        if entity is e.TRUE or entity is e.FALSE:
+            return ast.Constant(entity is e.TRUE), BOOL
+        if isinstance(entity, e.LocalName):
+            if entity.depth >= len(scope):
+                raise Unsupported(entity)
+            variable, type_ = scope[entity.depth][entity.slot]
+            return ast.Name(variable, ast.Load()), type_
+        if isinstance(entity, e.SExpr) and entity.es:
+            return self.call(entity, scope, block)
+        raise Unsupported(entity)
+
+    def ints(self, args: Sequence[e.Entity], scope: Scope, block: list) -> List[ast.expr]:
+        exprs = []
+        for arg in args:
+            expr, type_ = self.expr(arg, scope, block)
+            if type_ != INT:
+                raise Unsupported(arg)
+            exprs.append(expr)
+        return exprs
+
+    def truthy(self, entity: e.Entity, scope: Scope, block: list) -> ast.expr:
+        """A Python bool, like the `bool` built-in"""
+        # `if`, `and` and `or` call `bool` through its global name
+        self.guards["bool"] = bif.index["bool"]
+        expr, type_ = self.expr(entity, scope, block)
+        if type_ == BOOL:
+            return expr
+        return ast.Compare(expr, [ast.NotEq()], [ast.Constant(0)])
+
+    def call(self, s_expr: e.SExpr, scope: Scope, block: list) -> Tuple[ast.expr, str]:
+        head, *args = s_expr.es
+        if self.is_self(head):
+            if len(args) != len(self.params):
+                raise Unsupported(s_expr)
+            exprs = self.ints(args, scope, block)
+            return ast.Call(ast.Name("native", ast.Load()), exprs, []), self.return_type
+
+        name = self.builtin(head)
+        if name is None:
+            raise Unsupported(s_expr)
+
+        if name in _ARITHMETIC:
+            exprs = self.ints(args, scope, block)
+            if name == "-" and len(exprs) != 2 or name == "**" and len(exprs) != 2:
+                raise Unsupported(s_expr)
+            if not exprs:
+                return ast.Constant(1 if name == "*" else 0), INT
+            result = exprs[0]
+            if name in ("+", "*") and len(exprs) == 1:
+                return result, INT
+            for expr in exprs[1:]:
+                result = ast.BinOp(result, _ARITHMETIC[name](), expr)
+            return result, INT
+        if name == "neg":
+            if len(args) != 1:
+                raise Unsupported(s_expr)
+            [expr] = self.ints(args, scope, block)
+            return ast.UnaryOp(ast.USub(), expr), INT
+        if name in _COMPARISONS:
+            if len(args) != 2:
+                raise Unsupported(s_expr)
+            a, a_type = self.expr(args[0], scope, block)
+            b, b_type = self.expr(args[1], scope, block)
+            if name in ("<", ">") and (a_type, b_type) != (INT, INT) or a_type != b_type:
+                raise Unsupported(s_expr)
+            return ast.Compare(a, [_COMPARISONS[name]()], [b]), BOOL
+        if name in ("and", "or"):
+            conditions = []
+            for arg in args:
+                arg_block: list = []
+                conditions.append(self.truthy(arg, scope, arg_block))
+                if arg_block:
+                    # it wouldn't short-circuit any more
+                    raise Unsupported(s_expr)
+            if not conditions:
+                return ast.Constant(name == "and"), BOOL
+            op = ast.And() if name == "and" else ast.Or()
+            return ast.BoolOp(op, conditions) if len(conditions) > 1 else conditions[0], BOOL
+        if name == "if":
+            return self.if_expr(s_expr, args, scope, block)
+        if name == "let":
+            inner = self.bind(s_expr, args, scope, block)
+            return self.expr(args[1], inner, block)
+        if name == "do":
+            if not args:
+                raise Unsupported(s_expr)
+            for arg in args[:-1]:
+                expr, _ = self.expr(arg, scope, block)
+                block.append(ast.Expr(expr))
+            return self.expr(args[-1], scope, block)
+        if name == "loop":
+            return self.loop(s_expr, args, scope, block)
+        raise Unsupported(s_expr)
+
+    def if_expr(self, s_expr, args, scope, block) -> Tuple[ast.expr, str]:
+        if len(args) != 3:
+            raise Unsupported(s_expr)
+        cond = self.truthy(args[0], scope, block)
+        then_block: list = []
+        then, then_type = self.expr(args[1], scope, then_block)
+        else_block: list = []
+        else_, else_type = self.expr(args[2], scope, else_block)
+        if then_type != else_type:
+            raise Unsupported(s_expr)
+        if not then_block and not else_block:
+            return ast.IfExp(cond, then, else_), then_type
+        result = self.fresh()
+        block.append(ast.If(
+            cond,
+            then_block + [_assign(result, then)],
+            else_block + [_assign(result, else_)],
+        ))
+        return ast.Name(result, ast.Load()), then_type
+
+    def bind(self, s_expr, args, scope, block) -> Scope:
+        """Assign the values of a `let` and return the scope of its body"""
+        if len(args) != 2 or not isinstance(args[0], e.Vector) or len(args[0].es) % 2:
+            raise Unsupported(s_expr)
+        frame = []
+        for _, value in args[0].pairs():
+            expr, type_ = self.expr(value, scope, block)
+            variable = self.fresh()
+            block.append(_assign(variable, expr))
+            frame.append((variable, type_))
+        return (frame, *scope)
+
+    def loop(self, s_expr, args, scope, block) -> Tuple[ast.expr, str]:
+        if len(args) != 2 or not isinstance(args[0], e.Vector):
+            raise Unsupported(s_expr)
+        initial, fun = args
+        if not (isinstance(fun, e.SExpr) and len(fun.es) in (3, 4) and self.builtin(fun.es[0]) == "fun"):
+            raise Unsupported(s_expr)
+        _, params, body, *captures = fun.es
+        if not isinstance(params, e.Vector) or len(params.es) != len(initial.es):
+            raise Unsupported(s_expr)
+        outer = scope
+        if captures:
+            # the function only sees its captures (see `pylarklispy.resolver`)
+            if not isinstance(captures[0], e.Vector):
+                raise Unsupported(s_expr)
+            captured = []
+            for name in captures[0].es:
+                variable, type_ = self.expr(name, scope, block)  # a local name
+                captured.append((variable.id, type_))
+            outer = (captured,)
+        variables = []
+        for value in initial.es:
+            expr, type_ = self.expr(value, scope, block)
+            variable = self.fresh()
+            block.append(_assign(variable, expr))
+            variables.append((variable, type_))
+        loop = _Loop(variables, self.fresh())
+        loop_block: list = []
+        self.tail(body, (variables, *outer), loop_block, loop)
+        block.append(ast.While(ast.Constant(True), loop_block, []))
+        return ast.Name(loop.result, ast.Load()), loop.result_type
+
+    ##### statements #####
+
+    def tail(self, entity: e.Entity, scope: Scope, block: list, loop: Optional[_Loop] = None):
+        """Translate `entity` in tail position: of the function (a return)
+        or of the body of a `loop` (a vector like `[:next ...]`)"""
+        if isinstance(entity, e.SExpr) and entity.es:
+            head, *args = entity.es
+            name = None if self.is_self(head) else self.builtin(head)
+            if loop is None and self.is_self(head):
+                # a self tail call: jump to the start
+                if len(args) != len(self.params):
+                    raise Unsupported(entity)
+                exprs = self.ints(args, scope, block)
+                block.append(_assign_all(self.params, exprs))
+                block.append(ast.Continue())
+                return
+            if name == "if" and len(args) == 3:
+                cond = self.truthy(args[0], scope, block)
+                then_block: list = []
+                self.tail(args[1], scope, then_block, loop)
+                else_block: list = []
+                self.tail(args[2], scope, else_block, loop)
+                block.append(ast.If(cond, then_block, else_block))
+                return
+            if name == "let":
+                inner = self.bind(entity, args, scope, block)
+                self.tail(args[1], inner, block, loop)
+                return
+            if name == "do" and args:
+                for arg in args[:-1]:
+                    expr, _ = self.expr(arg, scope, block)
+                    block.append(ast.Expr(expr))
+                self.tail(args[-1], scope, block, loop)
+                return
+        if loop is not None:
+            self.loop_step(entity, scope, block, loop)
+            return
+        expr, type_ = self.expr(entity, scope, block)
+        if type_ != self.return_type:
+            raise Unsupported(entity)
+        block.append(ast.Return(expr))
+
+    def loop_step(self, entity: e.Entity, scope: Scope, block: list, loop: _Loop):
+        if isinstance(entity, e.Folded):
+            self.guards.update(entity.assumptions)
+            entity = entity.value
+        if not isinstance(entity, e.Vector) or not entity.es:
+            raise Unsupported(entity)
+        status, *values = entity.es
+        if status is e.Atom("next") and len(values) == len(loop.variables):
+            exprs = []
+            for value, (_, type_) in zip(values, loop.variables):
+                expr, value_type = self.expr(value, scope, block)
+                if value_type != type_:
+                    raise Unsupported(entity)
+                exprs.append(expr)
+            block.append(_assign_all([variable for variable, _ in loop.variables], exprs))
+            block.append(ast.Continue())
+        elif status is e.Atom("return") and len(values) == 1:
+            expr, type_ = self.expr(values[0], scope, block)
+            if loop.result_type not in (None, type_):
+                raise Unsupported(entity)
+            loop.result_type = type_
+            block.append(_assign(loop.result, expr))
+            block.append(ast.Break())
+        else:
+            raise Unsupported(entity)
+
+
+def _assign(variable: str, expr: ast.expr) -> ast.stmt:
+    return ast.Assign([ast.Name(variable, ast.Store())], expr)
+
+
+def _assign_all(variables: List[str], exprs: List[ast.expr]) -> ast.stmt:
+    # a parallel assignment, the values are computed first
+    if len(variables) == 1:
+        return _assign(variables[0], exprs[0])
+    return ast.Assign(
+        [ast.Tuple([ast.Name(v, ast.Store()) for v in variables], ast.Store())],
+        ast.Tuple(exprs, ast.Load())
+    )
+
+
+def _translate(fn, global_names, arity, body, return_type) -> Tuple[Callable, Dict[str, e.Entity]]:
+    params = [f"p{i}" for i in range(arity)]
+    translator = _Translator(fn, global_names, params, return_type)
+    loop_body: list = []
+    translator.tail(body, ([(p, INT) for p in params],), loop_body)
+    native = ast.FunctionDef(
+        name="native",
+        args=ast.arguments(
+            posonlyargs=[], args=[ast.arg(p) for p in params], vararg=None,
+            kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[]
+        ),
+        body=[ast.While(ast.Constant(True), loop_body, [])],
+        decorator_list=[],
+        returns=None,
+    )
+    module = ast.fix_missing_locations(ast.Module([native], type_ignores=[]))
+    namespace: dict = {}
+    exec(compile(module, "<jit>", "exec"), namespace)
+    return namespace["native"], translator.guards
+
+
+def compile_function(
+        fn: Callable,
+        arity: int,
+        body: e.Entity,
+        global_names: Dict[str, e.Entity]
+    ) -> Optional[Entry]:
+    """Translate the body of a user-defined function, or return None if
+    it's not supported. `fn` is the Python function of the `Function`,
+    used to recognize recursive calls through `global_names`."""
+    for return_type in (INT, BOOL):
+        try:
+            native, guards = _translate(fn, global_names, arity, body, return_type)
+        except Unsupported:
+            continue
+        return _entry(native, tuple(guards.items()), arity, return_type)
+    return None
+
+
+def _entry(native: Callable, guards: Tuple[Tuple[str, e.Entity], ...], arity: int, return_type: str) -> Entry:
+    integer = e.Integer
+    # the last version of the global names the guards held in
+    checked = 0
+    def entry(runtime: e.Runtime, args: Sequence[e.Entity]) -> Optional[e.Entity]:
+        nonlocal checked
+        if not enabled or len(args) != arity:
+            return None
+        global_names = runtime.global_names
+        if global_names.version != checked:
+            for name, value in guards:
+                if global_names.get(name) is not value:
+                    return None
+            checked = global_names.version
+        for arg in args:
+            if arg.__class__ is not integer:
+                return None
+        result = native(*[arg.n for arg in args])
+        if return_type == INT:
+            return integer(result)
+        return e.TRUE if result else e.FALSE
+    return entry
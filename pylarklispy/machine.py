@@ -0,0 +1,350 @@
+from typing import List, Optional, Sequence
+
+from . import entities as e
+from . import bif
+
+"""
+This module contains an evaluator in the style of a CEK machine: the
+expression being evaluated (control), the frame it's evaluated in
+(environment) and what to do with its value (continuation).
+
+The continuation is a list on the heap instead of the Python stack,
+so deeply nested data and non-tail recursion are only limited by
+memory, not by Python's recursion limit:
+
+    machine.evaluate(statement, runtime)
+
+It runs the same (resolved) code as `Entity.evaluate` and the built-ins
+of `bif.index`. The control forms (`if`, `and`, `or`, `do`, `let`,
+`define`, `loop`) and the calls of user-defined functions are done by
+the machine itself; any other built-in is called like usual, and the
+expression it returns (if any) is evaluated by the machine.
+
+A `Machine` can also be run a number of steps at a time, so the
+evaluation can be suspended and resumed later:
+
+    m = Machine(statement, runtime)
+    while not m.run(steps=1000):
+        ...  # do something else
+    m.result
+"""
+
+
+##### Continuations #####
+# Each one holds what's left to do after a subexpression is evaluated,
+# and the frame to do it in.
+
+class _Call:
+    """Evaluating the head (`function` is None) or the arguments of a call"""
+    __slots__ = ("s_expr", "env", "function", "values")
+
+    def __init__(self, s_expr: e.SExpr, env: e.StackFrame):
+        self.s_expr = s_expr
+        self.env = env
+        self.function: Optional[e.Entity] = None
+        self.values: List[e.Entity] = []
+
+
+class _Sequence:
+    """Evaluating the parts of `if`, `and`, `or`, `do`, a vector or a map"""
+    __slots__ = ("kind", "es", "env", "values")
+
+    def __init__(self, kind: str, es: Sequence[e.Entity], env: e.StackFrame):
+        self.kind = kind
+        self.es = es
+        self.env = env
+        self.values: List[e.Entity] = []
+
+
+class _Let:
+    __slots__ = ("names", "es", "body", "env", "values")
+
+    def __init__(self, names: List[str], es: List[e.Entity], body: e.Entity, env: e.StackFrame):
+        self.names = names
+        self.es = es
+        self.body = body
+        self.env = env
+        self.values: List[e.Entity] = []
+
+
+class _Define:
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Loop:
+    __slots__ = ("function", "env")
+
+    def __init__(self, function: e.Entity, env: e.StackFrame):
+        self.function = function
+        self.env = env
+
+
+_SPECIAL_FORMS = {name: bif.index[name] for name in ("if", "and", "or", "do", "let", "define")}
+_LOOP = bif.index["loop"]
+
+
+class Machine:
+    def __init__(self, entity: e.Entity, runtime: e.Runtime, env: Optional[e.StackFrame] = None):
+        self.runtime = runtime
+        # the register: an expression to evaluate in `env`,
+        # or a value for the top of the continuation if `returning`
+        self.control = entity
+        self.env = env or runtime.current_frame
+        self.returning = False
+        self.continuation: list = []
+        self.finished = False
+        self.result: Optional[e.Entity] = None
+
+    def run(self, steps: Optional[int] = None) -> bool:
+        """Run at most `steps` steps (all of them by default) and return
+        whether the evaluation is finished; its value is then `result`"""
+        while not self.finished:
+            if steps is not None:
+                if steps <= 0:
+                    return False
+                steps -= 1
+            if self.returning:
+                self._return(self.control)
+            else:
+                self._evaluate(self.control, self.env)
+        return True
+
+    ##### helpers #####
+
+    def _value(self, value: e.Entity):
+        self.control = value
+        self.returning = True
+
+    def _eval(self, entity: e.Entity, env: e.StackFrame):
+        self.control = entity
+        self.env = env
+        self.returning = False
+
+    def _in(self, env: e.StackFrame, f, *args):
+        """Call Python code that may use the current frame of the runtime"""
+        stack = self.runtime.stack
+        stack.append(env)
+        try:
+            return f(*args)
+        finally:
+            stack.pop()
+
+    def _truthy(self, value: e.Entity, env: e.StackFrame) -> bool:
+        # like `if`, through whatever the global `bool` refers to
+        bool_ = self.runtime.global_names["bool"]
+        return self._in(env, e.SExpr(bool_, value).evaluate, self.runtime) is e.TRUE
+
+    ##### steps #####
+
+    def _evaluate(self, entity: e.Entity, env: e.StackFrame):
+        cls = entity.__class__
+        if cls is e.SExpr:
+            if not entity.es:
+                # like `SExpr.compute`
+                raise IndexError("tuple index out of range")
+            self.continuation.append(_Call(entity, env))
+            self._eval(entity.es[0], env)
+        elif cls is e.LocalName:
+            frame = env
+            for _ in range(entity.depth):
+                frame = frame.parent
+            self._value(frame.values[entity.slot])
+        elif cls is e.GlobalName:
+            self._value(entity.compute(self.runtime))
+        elif cls is e.Name:
+            self._value(env.lookup(entity.identifier))
+        elif cls is e.Folded:
+            if entity.holds(self.runtime):
+                self._value(entity.value)
+            else:
+                # an assumption doesn't hold any more
+                self._eval(entity.original, env)
+        elif cls is e.Vector and entity._computed != len(entity.es):
+            self._sequence("vector", entity.es, env)
+        elif cls is e.Map and entity.literal is not None:
+            self._sequence("map", entity.literal, env)
+        elif cls is e.SigilString:
+            self._eval(entity.compute(self.runtime), env)
+        elif cls is e.TailCall:
+            self._apply(entity.function, entity.args, env, None)
+        elif cls.compute is e.Entity.compute or cls in (e.Vector, e.Map):
+            self._value(entity)
+        else:
+            self._value(self._in(env, entity.evaluate, self.runtime))
+
+    def _sequence(self, kind: str, es: Sequence[e.Entity], env: e.StackFrame):
+        if not es:
+            self._return_sequence(_Sequence(kind, es, env))
+            return
+        self.continuation.append(_Sequence(kind, es, env))
+        self._eval(es[0], env)
+
+    def _return(self, value: e.Entity):
+        if not self.continuation:
+            self.finished = True
+            self.result = value
+            return
+        k = self.continuation.pop()
+        cls = k.__class__
+        if cls is _Call:
+            self._return_call(k, value)
+        elif cls is _Sequence:
+            self._return_part(k, value)
+        elif cls is _Let:
+            k.values.append(value)
+            if len(k.values) < len(k.es):
+                self.continuation.append(k)
+                self._eval(k.es[len(k.values)], k.env)
+            else:
+                env = k.env
+                frame = e.SlotFrame(env, env.depth + 1, "<let>", e.make_layout(k.names), k.values)
+                self._eval(k.body, frame)
+        elif cls is _Define:
+            self.runtime.global_frame.insert(k.name, bif.name_function(k.name, value))
+            self._value(e.NIL)
+        else:  # _Loop
+            self._return_loop(k, value)
+
+    def _return_call(self, k: _Call, value: e.Entity):
+        args = k.s_expr.es[1:]
+        if k.function is None:
+            k.function = function = value
+            if not isinstance(function, e.Function):
+                self._eval(self._in(k.env, k.s_expr.invoke, self.runtime, function), k.env)
+                return
+            if function.lazy:
+                self._call_lazy(k, function, args)
+                return
+        else:
+            k.values.append(value)
+        if len(k.values) < len(args):
+            self.continuation.append(k)
+            self._eval(args[len(k.values)], k.env)
+        else:
+            self._apply(k.function, k.values, k.env, k.s_expr)
+
+    def _call_lazy(self, k: _Call, function: e.Function, args: Sequence[e.Entity]):
+        env = k.env
+        if function is _SPECIAL_FORMS["if"] and len(args) == 3:
+            self._sequence("if", args, env)
+        elif function is _SPECIAL_FORMS["and"] or function is _SPECIAL_FORMS["or"]:
+            self._sequence(function.name, args, env)
+        elif function is _SPECIAL_FORMS["do"]:
+            if not args:
+                self._value(e.NIL)
+            elif len(args) == 1:
+                self._eval(args[0], env)
+            else:
+                self._sequence("do", args, env)
+        elif function is _SPECIAL_FORMS["let"] and len(args) == 2 and isinstance(args[0], e.Vector):
+            bindings, body = args
+            pairs = list(bindings.pairs())
+            let = _Let([name.identifier for name, _ in pairs], [value for _, value in pairs], body, env)
+            if not pairs:
+                self._eval(body, e.SlotFrame(env, env.depth + 1, "<let>", {}, ()))
+                return
+            self.continuation.append(let)
+            self._eval(let.es[0], env)
+        elif function is _SPECIAL_FORMS["define"] and len(args) == 2:
+            self.continuation.append(_Define(args[0].identifier))
+            self._eval(args[1], env)
+        else:
+            self._apply(function, tuple(e.Quoted(arg) for arg in args), env, k.s_expr)
+
+    def _apply(self, function: e.Entity, args: Sequence[e.Entity], env: e.StackFrame, s_expr: Optional[e.SExpr]):
+        if not isinstance(function, e.Function):
+            self._eval(self._in(env, function.call, self.runtime, *args), env)
+            return
+        if function.layout is not None:
+            # a user-defined function: evaluate its body in a new frame
+            # the last parameter has the last slot, even with duplicate names
+            arity = max(function.layout.values(), default=-1) + 1
+            if len(args) != arity:
+                raise ValueError(f"Got {len(args)} args, exprected {arity}")
+            parent = function.closure if function.closure is not None else env
+            frame = e.SlotFrame(parent, parent.depth + 1, function.name, function.layout, args)
+            self._eval(function.body, frame)
+            return
+        if function is _LOOP and len(args) == 2:
+            initial, loop_function = args
+            self.continuation.append(_Loop(loop_function, env))
+            self._apply(loop_function, tuple(initial.es), env, s_expr)
+            return
+        try:
+            result = self._in(env, function.fn, self.runtime, *args)
+        except TypeError as error:
+            if s_expr is None:
+                raise
+            raise s_expr.type_error(error)
+        if result.__class__ is e.TailCall:
+            self._apply(result.function, result.args, env, None)
+        else:
+            # like `Function.apply`, the result is evaluated
+            self._eval(result, env)
+
+    def _return_part(self, k: _Sequence, value: e.Entity):
+        kind = k.kind
+        if kind == "if":
+            self._eval(k.es[1] if self._truthy(value, k.env) else k.es[2], k.env)
+            return
+        if kind == "and" or kind == "or":
+            truthy = self._truthy(value, k.env)
+            if truthy == (kind == "or"):
+                self._value(e.boolean(truthy))
+                return
+            k.values.append(value)
+            if len(k.values) == len(k.es):
+                self._value(e.boolean(kind == "and"))
+                return
+            self.continuation.append(k)
+            self._eval(k.es[len(k.values)], k.env)
+            return
+        k.values.append(value)
+        if kind == "do" and len(k.values) == len(k.es) - 1:
+            # the last expression is in tail position
+            self._eval(k.es[-1], k.env)
+        elif len(k.values) < len(k.es):
+            self.continuation.append(k)
+            self._eval(k.es[len(k.values)], k.env)
+        else:
+            self._return_sequence(k)
+
+    def _return_sequence(self, k: _Sequence):
+        if k.kind == "vector":
+            self._value(e.Vector(*k.values, _computed=len(k.values)))
+        elif k.kind == "map":
+            it = iter(k.values)
+            self._value(e.Map.from_pairs(zip(it, it)))
+        elif k.kind == "and":
+            self._value(e.TRUE)
+        elif k.kind == "or":
+            self._value(e.FALSE)
+        else:
+            raise AssertionError(k.kind)
+
+    def _return_loop(self, k: _Loop, result: e.Entity):
+        # like `bif.loop`
+        if not isinstance(result, e.Vector):
+            raise TypeError(f"Expected vector, got {result}")
+        if len(result.es) == 0:
+            raise ValueError(f"Expected non-zero vector")
+        status, *acc = result.es
+        if status is not bif._RETURN and status is not bif._NEXT:
+            raise TypeError(f"Expected :next/:return, got {status}")
+        if status is bif._RETURN:
+            if len(acc) != 1:
+                raise TypeError(f"Expected one argument after :return, got {len(acc)}")
+            self._value(acc[0])
+            return
+        self.continuation.append(k)
+        self._apply(k.function, tuple(acc), k.env, None)
+
+
+def evaluate(entity: e.Entity, runtime: e.Runtime) -> e.Entity:
+    """Evaluate `entity` in the current frame of `runtime`, like `entity.evaluate(runtime)`"""
+    machine = Machine(entity, runtime)
+    machine.run()
+    return machine.result
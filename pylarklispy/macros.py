@@ -0,0 +1,261 @@
+import itertools
+from typing import AbstractSet, Callable, Dict, Optional, Sequence
+
+from . import entities as e
+from . import bif
+
+"""
+This module contains the macro expander, which rewrites the AST of a
+top-level statement once, before it's resolved and run.
+
+A macro is either built-in (a Python function from the argument ASTs
+to a new AST, see `index`) or defined with `defmacro`. A user-defined
+macro is a function stored in `Runtime.macros`; it's called at
+expansion time with its arguments quoted, and returns quoted code
+(usually built with `form`), e.g.
+
+    (defmacro unless [cond x] (form &if cond &:Nil x))
+
+Built-in macros put the built-in functions themselves into the head of
+the forms they produce, so their expansions mean the same thing even
+if a name like `or` is shadowed where the macro is used. A macro name
+that is bound locally (a parameter or a `let` binding) isn't expanded,
+and neither is one redefined by a top-level `define` or `defun`.
+"""
+
+BuiltinMacro = Callable[[Sequence[e.Entity]], Optional[e.Entity]]
+
+index: Dict[str, BuiltinMacro] = {}
+
+def _register(name):
+    def _(f):
+        index[name] = f
+        return f
+    return _
+
+
+def expand_statement(statement: e.Entity, runtime: e.Runtime) -> e.Entity:
+    """Expand a top-level statement. A top-level `defmacro` is also
+    run right away, so that the statements after it can use the macro
+    even if they are all compiled before anything runs."""
+    expanded = expand(statement, runtime)
+    if not isinstance(expanded, e.SExpr) or len(expanded.es) < 2:
+        return expanded
+    form, name = _form_name(expanded.es[0], frozenset()), expanded.es[1]
+    if form == "defmacro":
+        expanded.evaluate(runtime)
+    elif form in ("define", "defun") and isinstance(name, e.Name):
+        # `(define not ...)` turns off the macro from now on
+        if name.identifier in index or name.identifier in runtime.macros:
+            runtime.macros[name.identifier] = None
+    return expanded
+
+
+def expand(entity: e.Entity, runtime: e.Runtime, bound: AbstractSet[str] = frozenset()) -> e.Entity:
+    """Return a copy of `entity` with all the macros expanded.
+    `bound` is the set of names bound locally around `entity`."""
+    if isinstance(entity, e.SExpr):
+        return _expand_s_expr(entity, runtime, bound)
+    elif e.is_data(entity):
+        # nothing to expand, however deep it is
+        return entity
+    elif isinstance(entity, e.Vector):
+        return e.Vector(*(expand(x, runtime, bound) for x in entity.es))
+    elif isinstance(entity, e.Map) and entity.literal is not None:
+        return e.Map(*(expand(x, runtime, bound) for x in entity.literal))
+    else:
+        return entity
+
+
+def _lookup(name: str, runtime: e.Runtime) -> Optional[BuiltinMacro]:
+    if name in runtime.macros:
+        user_macro = runtime.macros[name]
+        if user_macro is None:
+            # redefined as a plain name
+            return None
+        return lambda args: _call_user_macro(user_macro, args, runtime)
+    builtin_macro = index.get(name)
+    # a built-in macro stands for a built-in function; if the global name
+    # was redefined, leave the call alone
+    if builtin_macro is not None and runtime.global_names.get(name) is bif.index[name]:
+        return builtin_macro
+    return None
+
+
+def _call_user_macro(macro: e.Function, args: Sequence[e.Entity], runtime: e.Runtime) -> e.Entity:
+    expansion = macro.apply(runtime, *(e.Quoted(arg) for arg in args))
+    if isinstance(expansion, e.Quoted):
+        return expansion.e
+    # a macro may also return a plain value, like an integer
+    return expansion
+
+
+def _form_name(head: e.Entity, bound: AbstractSet[str]) -> Optional[str]:
+    """The name of the built-in form `head` refers to, if any"""
+    if type(head) is e.Name:
+        return None if head.identifier in bound else head.identifier
+    if isinstance(head, e.Function) and bif.index.get(head.name) is head:
+        return head.name
+    return None
+
+
+def _expand_s_expr(s_expr: e.SExpr, runtime: e.Runtime, bound: AbstractSet[str]) -> e.Entity:
+    while s_expr.es:
+        head = s_expr.es[0]
+        if type(head) is not e.Name or head.identifier in bound:
+            break
+        macro = _lookup(head.identifier, runtime)
+        if macro is None:
+            break
+        expansion = macro(s_expr.es[1:])
+        if expansion is None:
+            break
+        if not isinstance(expansion, e.SExpr):
+            return expand(expansion, runtime, bound)
+        s_expr = expansion
+
+    if not s_expr.es:
+        return s_expr
+    head, *args = s_expr.es
+    form = _binding_forms.get(_form_name(head, bound))
+    if form is not None:
+        expanded_args = form(args, runtime, bound)
+        if expanded_args is not None:
+            return e.SExpr(head, *expanded_args)
+    return e.SExpr(*(expand(x, runtime, bound) for x in s_expr.es))
+
+
+##### Binding forms #####
+# The parts of these forms that are names aren't expanded, and their
+# parameters shadow the macros in the body.
+
+def _names(vector: e.Entity) -> Optional[AbstractSet[str]]:
+    if not isinstance(vector, e.Vector):
+        return None
+    if not all(isinstance(name, e.Name) for name in vector.es):
+        return None
+    return {name.identifier for name in vector.es}
+
+
+def _expand_fun(args, runtime, bound):
+    # (fun [params] body)
+    if len(args) != 2:
+        return None
+    params, body = args
+    names = _names(params)
+    if names is None:
+        return None
+    return [params, expand(body, runtime, bound | names)]
+
+
+def _expand_defun(args, runtime, bound):
+    # (defun name [params] body), also (defmacro name [params] body)
+    if len(args) != 3:
+        return None
+    name, *fun_args = args
+    expanded = _expand_fun(fun_args, runtime, bound)
+    if expanded is None:
+        return None
+    return [name, *expanded]
+
+
+def _expand_define(args, runtime, bound):
+    # (define name value)
+    if len(args) != 2:
+        return None
+    name, value = args
+    return [name, expand(value, runtime, bound)]
+
+
+def _expand_let(args, runtime, bound):
+    # (let [name value ...] body)
+    if len(args) != 2:
+        return None
+    bindings, body = args
+    if not isinstance(bindings, e.Vector) or len(bindings.es) % 2 != 0:
+        return None
+    names = _names(e.Vector(*bindings.es[::2]))
+    if names is None:
+        return None
+    es = []
+    for name, value in bindings.pairs():
+        es += (name, expand(value, runtime, bound))
+    return [e.Vector(*es), expand(body, runtime, bound | names)]
+
+
+_binding_forms = {
+    "fun": _expand_fun,
+    "defun": _expand_defun,
+    "defmacro": _expand_defun,
+    "define": _expand_define,
+    "let": _expand_let,
+}
+
+
+##### Built-in macros #####
+
+_gensym_counter = itertools.count()
+
+def gensym(prefix: str = "g") -> e.Name:
+    """A fresh name that can't be written in the source code"""
+    return e.Name(f"#{prefix}{next(_gensym_counter)}")
+
+
+def _is_simple(entity: e.Entity) -> bool:
+    """Whether evaluating `entity` twice is the same as evaluating it once"""
+    return isinstance(entity, (e.Name, e.Integer, e.String, e.Atom))
+
+
+def _comparison(strict: str, args: Sequence[e.Entity]) -> Optional[e.Entity]:
+    # (>= a b) -> (or (> a b) (= a b)), evaluating a and b once
+    if len(args) != 2:
+        return None
+    a, b = args
+    bindings = []
+    if not _is_simple(a):
+        value, a = a, gensym("a")
+        bindings += [a, value]
+    if not _is_simple(b):
+        value, b = b, gensym("b")
+        bindings += [b, value]
+    comparison = e.SExpr(
+        bif.index["or"],
+        e.SExpr(bif.index[strict], a, b),
+        e.SExpr(bif.index["="], a, b),
+    )
+    if not bindings:
+        return comparison
+    return e.SExpr(bif.index["let"], e.Vector(*bindings), comparison)
+
+
+@_register(">=")
+def _(args):
+    return _comparison(">", args)
+
+
+@_register("<=")
+def _(args):
+    return _comparison("<", args)
+
+
+@_register("not")
+def _(args):
+    # (not x) -> (if x :False :True)
+    if len(args) != 1:
+        return None
+    return e.SExpr(bif.index["if"], args[0], e.FALSE, e.TRUE)
+
+
+@_register("defun")
+def _(args):
+    # (defun name [params] body) -> (define name (fun [params] body))
+    if len(args) != 3:
+        return None
+    name, params, body = args
+    if not isinstance(name, e.Name):
+        return None
+    return e.SExpr(
+        bif.index["define"],
+        name,
+        e.SExpr(bif.index["fun"], params, body),
+    )
@@ -1,9 +1,26 @@
+import hashlib
 import json
+import os
 from os.path import join, dirname, realpath
+from typing import Optional
 
 import lark
 
 from . import entities
+from .ast_cache import cache_dir
+
+"""
+This module contains the Lark parser and the transformer that turns
+its parse tree into entities.
+
+The LALR parser is only built on first use (see `get_parser`), and
+its analysed tables are pickled into the cache directory, so later
+processes load them instead of analysing the grammar again.
+
+`Transformer` runs inside the parser: each rule is turned into an
+entity as soon as it's reduced, so no intermediate `lark.Tree` is
+built. `parse` returns the tuple of top-level entities directly.
+"""
 
 DIR = dirname(realpath(__file__))
 GRAMMAR_FILENAME = join(DIR, "grammar.lark")
@@ -11,14 +28,66 @@ GRAMMAR_FILENAME = join(DIR, "grammar.lark")
 with open(GRAMMAR_FILENAME) as grammar_file:
     grammar = grammar_file.read()
 
-parser = lark.Lark(grammar, parser="lalr")
+_parser: Optional[lark.Lark] = None
+
+
+def tables_filename() -> str:
+    digest = hashlib.sha256((grammar + lark.__version__).encode()).hexdigest()
+    return join(cache_dir(), f"lalr-{digest}.pickle")
+
+
+def _build_parser() -> lark.Lark:
+    filename = tables_filename()
+    if os.path.exists(filename):
+        try:
+            return lark.Lark(grammar, parser="lalr", transformer=Transformer(), cache=filename)
+        except Exception:
+            # corrupt, or written by an incompatible Lark
+            pass
+    new_parser = lark.Lark(grammar, parser="lalr", transformer=Transformer())
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(dirname(filename), exist_ok=True)
+        with open(tmp_filename, "wb") as tables_file:
+            new_parser.save(tables_file)
+        os.replace(tmp_filename, filename)
+    except OSError:
+        pass
+    return new_parser
+
+
+def get_parser() -> lark.Lark:
+    """The LALR parser for `grammar.lark` producing entities, built on first use"""
+    global _parser
+    if _parser is None:
+        _parser = _build_parser()
+    return _parser
+
+
+class LiteralError(lark.LarkError, ValueError):
+    """A literal the grammar accepts but that has no value, e.g. a map
+    with an odd number of elements, reported like a syntax error"""
+
+
+def parse(code: str):
+    """The entities of `code`; any error in it is a `lark.LarkError`"""
+    try:
+        return get_parser().parse(code)
+    except lark.LarkError:
+        raise
+    except ValueError as error:
+        # raised by an entity constructor or by the string decoder
+        raise LiteralError(str(error)) from error
+
+
+def __getattr__(name: str):
+    # `parser.parser` used to be built at import time
+    if name == "parser":
+        return get_parser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 @lark.v_args(inline=True)
 class Transformer(lark.Transformer):
-    @staticmethod
-    def ESCAPED_STRING(token):
-        return json.loads(str(token))
-
     @staticmethod
     def start(*e: entities.Entity):
         return e
@@ -28,16 +97,16 @@ class Transformer(lark.Transformer):
         return entities.Integer(int(token))
 
     @staticmethod
-    def string(s):
-        return entities.String(s)
+    def string(token):
+        return entities.String(json.loads(token))
 
     @staticmethod
     def atom(token):
         return entities.Atom(str(token))
 
     @staticmethod
-    def sigil_string(sigil_token, string):
-        return entities.SigilString(str(sigil_token), string)
+    def sigil_string(sigil_token, string_token):
+        return entities.SigilString(str(sigil_token), json.loads(string_token))
 
     @staticmethod
     def name(token):
@@ -51,6 +120,10 @@ class Transformer(lark.Transformer):
     def vector(*es: entities.Entity):
         return entities.Vector(*es)
 
+    @staticmethod
+    def map(*es: entities.Entity):
+        return entities.Map(*es)
+
     @staticmethod
     def quoted(subentity):
         return entities.Quoted(subentity)
\ No newline at end of file
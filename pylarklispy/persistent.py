@@ -0,0 +1,622 @@
+import itertools
+from typing import Any, List, Hashable, Iterable, Iterator, Optional, Sequence, Tuple
+
+"""
+Persistent (immutable, structurally shared) data structures
+backing the language's collections.
+
+`PersistentMap` is a hash array mapped trie: every update copies only
+the path from the root to the changed entry, that is O(log32 n) nodes.
+
+`PersistentVector` is a bit-partitioned trie with a tail (like
+Clojure's vectors): lookup and update are O(log32 n), appending is
+amortized O(1), and slicing is O(1) because a slice is a window
+over the same trie. A slice shorter than half of the trie gets a trie
+of its own instead, so it doesn't keep a much bigger one alive. That
+trie, and the ones made by `extend` and `splice`, reuse the leaves
+(the tuples of 32 elements) of the original: only the few nodes above
+them are made again.
+"""
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_MASK = 0xFFFFFFFF
+
+if hasattr(int, "bit_count"):
+    _popcount = int.bit_count
+else:
+    def _popcount(x: int) -> int:
+        return bin(x).count("1")
+
+
+def _hash(key: Hashable) -> int:
+    return hash(key) & _HASH_MASK
+
+
+class _Node:
+    """An inner node: `bitmap` tells which of the 32 slots are occupied,
+    and `entries` holds them in order. An entry is either a leaf
+    `(hash, key, value)`, a `_Node` or a `_Collision`."""
+    __slots__ = ("bitmap", "entries")
+
+    def __init__(self, bitmap: int, entries: Tuple[Any, ...]):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+class _Collision:
+    """Several keys with the very same hash"""
+    __slots__ = ("hash", "pairs")
+
+    def __init__(self, hash_: int, pairs: Tuple[Tuple[Any, Any], ...]):
+        self.hash = hash_
+        self.pairs = pairs
+
+
+_EMPTY_NODE = _Node(0, ())
+
+
+def _entry_hash(entry) -> int:
+    if type(entry) is tuple:
+        return entry[0]
+    return entry.hash
+
+
+def _merge(shift: int, h1: int, e1, h2: int, e2) -> Any:
+    """Make a node containing two leaves/collisions with different hashes"""
+    i1 = (h1 >> shift) & _MASK
+    i2 = (h2 >> shift) & _MASK
+    if i1 == i2:
+        return _Node(1 << i1, (_merge(shift + _BITS, h1, e1, h2, e2),))
+    if i1 < i2:
+        return _Node((1 << i1) | (1 << i2), (e1, e2))
+    return _Node((1 << i1) | (1 << i2), (e2, e1))
+
+
+def _assoc(node: _Node, shift: int, h: int, key, value) -> Tuple[_Node, bool]:
+    """Return the new node and whether a new key was added"""
+    bit = 1 << ((h >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+
+    if not node.bitmap & bit:
+        new_entries = entries[:index] + ((h, key, value),) + entries[index:]
+        return _Node(node.bitmap | bit, new_entries), True
+
+    entry = entries[index]
+    if type(entry) is tuple:
+        if entry[0] == h and (entry[1] is key or entry[1] == key):
+            if entry[2] is value:
+                return node, False
+            new_entry = (h, key, value)
+            added = False
+        elif entry[0] == h:
+            new_entry = _Collision(h, ((entry[1], entry[2]), (key, value)))
+            added = True
+        else:
+            new_entry = _merge(shift + _BITS, entry[0], entry, h, (h, key, value))
+            added = True
+    elif type(entry) is _Collision:
+        if entry.hash == h:
+            pairs = tuple(pair for pair in entry.pairs if pair[0] != key)
+            added = len(pairs) == len(entry.pairs)
+            new_entry = _Collision(h, pairs + ((key, value),))
+        else:
+            new_entry = _merge(shift + _BITS, entry.hash, entry, h, (h, key, value))
+            added = True
+    else:
+        new_entry, added = _assoc(entry, shift + _BITS, h, key, value)
+        if new_entry is entry:
+            return node, False
+
+    new_entries = entries[:index] + (new_entry,) + entries[index + 1:]
+    return _Node(node.bitmap, new_entries), added
+
+
+def _dissoc(node: _Node, shift: int, h: int, key) -> Optional[Any]:
+    """Return the new entry replacing `node` (None if it's now empty),
+    or `node` itself if the key wasn't there"""
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    entry = entries[index]
+
+    if type(entry) is tuple:
+        if not (entry[0] == h and (entry[1] is key or entry[1] == key)):
+            return node
+        new_entry = None
+    elif type(entry) is _Collision:
+        if entry.hash != h:
+            return node
+        pairs = tuple(pair for pair in entry.pairs if pair[0] != key)
+        if len(pairs) == len(entry.pairs):
+            return node
+        if len(pairs) == 1:
+            new_entry = (h, pairs[0][0], pairs[0][1])
+        else:
+            new_entry = _Collision(h, pairs)
+    else:
+        new_entry = _dissoc(entry, shift + _BITS, h, key)
+        if new_entry is entry:
+            return node
+
+    if new_entry is None:
+        if node.bitmap == bit:
+            return None
+        new_entries = entries[:index] + entries[index + 1:]
+        new_node = _Node(node.bitmap ^ bit, new_entries)
+    else:
+        new_entries = entries[:index] + (new_entry,) + entries[index + 1:]
+        new_node = _Node(node.bitmap, new_entries)
+    # a node holding a single leaf can be replaced by the leaf itself
+    if shift > 0 and len(new_node.entries) == 1 and type(new_node.entries[0]) is not _Node:
+        return new_node.entries[0]
+    return new_node
+
+
+def _build(shift: int, leaves) -> Any:
+    """Build a node out of leaves with distinct keys, bottom-up"""
+    if len(leaves) == 1:
+        return leaves[0]
+    if all(leaf[0] == leaves[0][0] for leaf in leaves):
+        return _Collision(leaves[0][0], tuple((k, v) for (_, k, v) in leaves))
+    buckets = {}
+    for leaf in leaves:
+        buckets.setdefault((leaf[0] >> shift) & _MASK, []).append(leaf)
+    bitmap = 0
+    entries = []
+    for index in sorted(buckets):
+        bitmap |= 1 << index
+        entries.append(_build(shift + _BITS, buckets[index]))
+    return _Node(bitmap, tuple(entries))
+
+
+class PersistentMap:
+    """An immutable mapping; `assoc`, `dissoc` and `update` return
+    new maps sharing most of their structure with the original"""
+    __slots__ = ("_root", "_size", "_hash")
+
+    def __init__(self, items: Iterable[Tuple[Any, Any]] = ()):
+        # later duplicates win, like in a dict
+        unique = dict(items)
+        if unique:
+            root = _build(0, [(_hash(k), k, v) for k, v in unique.items()])
+            if type(root) is not _Node:
+                root = _Node(1 << (_entry_hash(root) & _MASK), (root,))
+        else:
+            root = _EMPTY_NODE
+        self._root = root
+        self._size = len(unique)
+        self._hash: Optional[int] = None
+
+    def __reduce__(self):
+        # the trie depends on the hashes, which change from one process to another
+        return (PersistentMap, (list(self.items()),))
+
+    @classmethod
+    def _make(cls, root: _Node, size: int) -> "PersistentMap":
+        new = cls.__new__(cls)
+        new._root = root
+        new._size = size
+        new._hash = None
+        return new
+
+    def get(self, key, default=None):
+        h = _hash(key)
+        node = self._root
+        shift = 0
+        while True:
+            bit = 1 << ((h >> shift) & _MASK)
+            if not node.bitmap & bit:
+                return default
+            entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+            if type(entry) is tuple:
+                if entry[0] == h and (entry[1] is key or entry[1] == key):
+                    return entry[2]
+                return default
+            if type(entry) is _Collision:
+                for k, v in entry.pairs:
+                    if k == key:
+                        return v
+                return default
+            node = entry
+            shift += _BITS
+
+    def __getitem__(self, key):
+        sentinel = _MISSING
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def assoc(self, key, value) -> "PersistentMap":
+        root, added = _assoc(self._root, 0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return self._make(root, self._size + added)
+
+    def dissoc(self, key) -> "PersistentMap":
+        root = _dissoc(self._root, 0, _hash(key), key)
+        if root is self._root:
+            return self
+        if root is None:
+            root = _EMPTY_NODE
+        return self._make(root, self._size - 1)
+
+    def update(self, items: Iterable[Tuple[Any, Any]]) -> "PersistentMap":
+        new = self
+        for key, value in items:
+            new = new.assoc(key, value)
+        return new
+
+    def __len__(self) -> int:
+        return self._size
+
+    def items(self) -> Iterator[Tuple[Any, Any]]:
+        stack = [iter(self._root.entries)]
+        while stack:
+            for entry in stack[-1]:
+                if type(entry) is tuple:
+                    yield (entry[1], entry[2])
+                elif type(entry) is _Collision:
+                    yield from entry.pairs
+                else:
+                    stack.append(iter(entry.entries))
+                    break
+            else:
+                stack.pop()
+
+    def keys(self) -> Iterator[Any]:
+        return (k for k, _ in self.items())
+
+    def values(self) -> Iterator[Any]:
+        return (v for _, v in self.items())
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.keys()
+
+    def __eq__(self, other):
+        if not isinstance(other, PersistentMap):
+            return NotImplemented
+        if self._size != len(other):
+            return False
+        for key, value in self.items():
+            if other.get(key, _MISSING) != value:
+                return False
+        return True
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self.items()))
+        return self._hash
+
+    def __repr__(self):
+        return "PersistentMap({" + ", ".join(f"{k!r}: {v!r}" for k, v in self.items()) + "})"
+
+
+_MISSING = object()
+
+
+##### Vector #####
+
+_WIDTH = 1 << _BITS
+
+
+def _tail_offset(size: int) -> int:
+    """Index of the first element stored in the tail"""
+    if size < _WIDTH:
+        return 0
+    return ((size - 1) >> _BITS) << _BITS
+
+
+def _new_path(level: int, node: tuple) -> tuple:
+    while level > 0:
+        node = (node,)
+        level -= _BITS
+    return node
+
+
+def _push_tail(size: int, level: int, parent: tuple, tail: tuple) -> tuple:
+    """Put a full tail into the trie (`size` is the number of
+    elements in the vector before that)"""
+    sub_index = ((size - 1) >> level) & _MASK
+    if level == _BITS:
+        node = tail
+    elif sub_index < len(parent):
+        node = _push_tail(size, level - _BITS, parent[sub_index], tail)
+    else:
+        node = _new_path(level - _BITS, tail)
+    return parent[:sub_index] + (node,) + parent[sub_index + 1:]
+
+
+def _push_leaf(size: int, shift: int, root: tuple, tail: tuple) -> Tuple[int, tuple]:
+    """Move a full tail into the trie of a vector of `size` elements
+    (the tail included): (shift, root)"""
+    if (size >> _BITS) > (1 << shift):
+        return shift + _BITS, (root, _new_path(shift, tail))
+    return shift, _push_tail(size, shift, root, tail)
+
+
+def _collect_leaves(level: int, node: tuple, lo: int, hi: int, leaves: List[tuple]):
+    """Append the leaves under `node` holding its elements `lo ... hi`"""
+    if level == _BITS:
+        leaves.extend(node[lo >> _BITS:((hi - 1) >> _BITS) + 1])
+        return
+    for k in range(lo >> level, ((hi - 1) >> level) + 1):
+        child_lo = k << level
+        child_hi = child_lo + (1 << level)
+        _collect_leaves(
+            level - _BITS, node[k], max(lo, child_lo) - child_lo, min(hi, child_hi) - child_lo, leaves
+        )
+
+
+def _flatten(pieces: Iterable[tuple]) -> list:
+    # much faster than itertools.chain for a lot of short tuples
+    elements: list = []
+    for piece in pieces:
+        elements += piece
+    return elements
+
+
+def _cut(elements: Sequence[Any]) -> List[tuple]:
+    """`elements` cut into leaves; only the last one may not be full"""
+    leaves: List[tuple] = list(zip(*[iter(elements)] * _WIDTH))
+    if len(elements) % _WIDTH:
+        leaves.append(tuple(elements[len(elements) - len(elements) % _WIDTH:]))
+    return leaves
+
+
+def _build_trie(leaves: Sequence[tuple]) -> Tuple[int, tuple]:
+    """The (shift, root) of a trie made of full leaves, bottom-up"""
+    nodes = leaves
+    shift = _BITS
+    while len(nodes) > _WIDTH:
+        nodes = [tuple(nodes[i:i + _WIDTH]) for i in range(0, len(nodes), _WIDTH)]
+        shift += _BITS
+    return shift, tuple(nodes)
+
+
+def _assoc_index(level: int, node: tuple, i: int, value) -> tuple:
+    sub_index = (i >> level) & _MASK
+    if level == 0:
+        child = value
+    else:
+        child = _assoc_index(level - _BITS, node[sub_index], i, value)
+    return node[:sub_index] + (child,) + node[sub_index + 1:]
+
+
+class PersistentVector(Sequence):
+    """An immutable sequence; `append`, `set`, `extend` and slicing
+    return new vectors sharing most of their structure with the original.
+
+    The elements are `_start ... _start + _count` of a trie holding
+    `_size` elements (the last ones of which are in `_tail`).
+    """
+    __slots__ = ("_size", "_shift", "_root", "_tail", "_start", "_count", "_hash")
+
+    def __init__(self, items: Iterable[Any] = ()):
+        items = tuple(items)
+        size = len(items)
+        offset = _tail_offset(size)
+        shift, root = _build_trie([items[i:i + _WIDTH] for i in range(0, offset, _WIDTH)])
+        self._size = size
+        self._shift = shift
+        self._root = root
+        self._tail = items[offset:]
+        self._start = 0
+        self._count = size
+        self._hash: Optional[int] = None
+
+    def __reduce__(self):
+        return (PersistentVector, (tuple(self),))
+
+    @classmethod
+    def _make(cls, size, shift, root, tail, start, count) -> "PersistentVector":
+        new = cls.__new__(cls)
+        new._size = size
+        new._shift = shift
+        new._root = root
+        new._tail = tail
+        new._start = start
+        new._count = count
+        new._hash = None
+        return new
+
+    @classmethod
+    def _from_leaves(cls, leaves: List[tuple], skip: int) -> "PersistentVector":
+        """The vector of the elements of `leaves` but the first `skip`;
+        all of them but the last one must be full"""
+        if not leaves:
+            return cls()
+        tail = leaves.pop()
+        shift, root = _build_trie(leaves)
+        size = len(leaves) * _WIDTH + len(tail)
+        return cls._make(size, shift, root, tail, skip, size - skip)
+
+    def _leaves(self, start: int, stop: int) -> List[tuple]:
+        """The leaves (and the tail) holding the elements `start ... stop`
+        of the trie; the first and the last ones may hold more"""
+        leaves: List[tuple] = []
+        if start >= stop:
+            return leaves
+        offset = _tail_offset(self._size)
+        if start < offset:
+            _collect_leaves(self._shift, self._root, start, min(stop, offset), leaves)
+        if stop > offset:
+            leaves.append(self._tail)
+        return leaves
+
+    def _exact_leaves(self, start: int, stop: int) -> List[tuple]:
+        """Like `_leaves`, but the last leaf stops at `stop`"""
+        leaves = self._leaves(start, stop)
+        if leaves:
+            leaves[-1] = leaves[-1][:stop - (((stop - 1) >> _BITS) << _BITS)]
+        return leaves
+
+    def _leaf_for(self, i: int) -> tuple:
+        """The leaf (or the tail) holding the `i`-th element of the trie"""
+        if i >= _tail_offset(self._size):
+            return self._tail
+        node = self._root
+        level = self._shift
+        while level > 0:
+            node = node[(i >> level) & _MASK]
+            level -= _BITS
+        return node
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            if step != 1:
+                return PersistentVector(tuple(self)[index])
+            count = max(stop - start, 0)
+            start += self._start
+            if count * 2 < self._size:
+                # a trie of its own, out of the same leaves
+                return self._from_leaves(self._exact_leaves(start, start + count), start & _MASK)
+            start -= self._start
+            return self._make(
+                self._size, self._shift, self._root, self._tail,
+                self._start + start, count
+            )
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("vector index out of range")
+        i = self._start + index
+        return self._leaf_for(i)[i & _MASK]
+
+    def __iter__(self) -> Iterator[Any]:
+        start = self._start
+        stop = start + self._count
+        if start == 0 and stop == self._size and not self._root:
+            return iter(self._tail)
+        return itertools.chain.from_iterable(self._pieces(start, stop))
+
+    def _pieces(self, start: int, stop: int) -> List[tuple]:
+        """Tuples holding the elements `start ... stop` of the trie, in order"""
+        pieces = self._exact_leaves(start, stop)
+        if pieces:
+            pieces[0] = pieces[0][start & _MASK:]
+        return pieces
+
+    def _trie_append(self, value) -> Tuple[int, tuple, tuple]:
+        """Append to the underlying trie: (shift, root, tail)"""
+        size = self._size
+        if size - _tail_offset(size) < _WIDTH:
+            return self._shift, self._root, self._tail + (value,)
+        # the tail is full, move it into the trie
+        shift, root = _push_leaf(size, self._shift, self._root, self._tail)
+        return shift, root, (value,)
+
+    def _trie_set(self, i: int, value) -> Tuple[tuple, tuple]:
+        """Replace an element of the underlying trie: (root, tail)"""
+        offset = _tail_offset(self._size)
+        if i >= offset:
+            tail = self._tail
+            j = i - offset
+            return self._root, tail[:j] + (value,) + tail[j + 1:]
+        return _assoc_index(self._shift, self._root, i, value), self._tail
+
+    def append(self, value) -> "PersistentVector":
+        end = self._start + self._count
+        if end == self._size:
+            shift, root, tail = self._trie_append(value)
+            return self._make(self._size + 1, shift, root, tail, self._start, self._count + 1)
+        # this is a slice: reuse the slot right after it
+        root, tail = self._trie_set(end, value)
+        return self._make(self._size, self._shift, root, tail, self._start, self._count + 1)
+
+    def extend(self, values: Iterable[Any]) -> "PersistentVector":
+        if values.__class__ is not PersistentVector:
+            values = tuple(values)
+        if len(values) <= _WIDTH:
+            new = self
+            for value in values:
+                new = new.append(value)
+            return new
+        start = self._start
+        left = self._exact_leaves(start, start + self._count)
+        skip = start & _MASK if left else 0
+        if values.__class__ is PersistentVector:
+            right_start = values._start
+            right = values._exact_leaves(right_start, right_start + values._count)
+            return self._join(left, skip, (), right, right_start & _MASK)
+        return self._join(left, skip, values, [], 0)
+
+    @classmethod
+    def _join(
+        cls, left: List[tuple], skip: int, middle: Sequence[Any], right: List[tuple], right_skip: int
+    ) -> "PersistentVector":
+        """The vector of the elements of the leaves `left` but the first
+        `skip`, of `middle`, and of the leaves `right` but the first
+        `right_skip`. The leaves of one side are kept as they are, and
+        the other side is cut into new ones: the shorter one, as that
+        copies its elements."""
+        if not middle and right_skip == 0 and (not left or len(left[-1]) == _WIDTH):
+            # they fit together as they are
+            return cls._from_leaves(left + right, skip)
+        if sum(map(len, right)) - right_skip <= sum(map(len, left)) - skip:
+            elements = list(left.pop()) if left else []
+            elements += middle
+            if right:
+                right[0] = right[0][right_skip:]
+            elements += _flatten(right)
+            return cls._from_leaves(left + _cut(elements), skip)
+        # padded at the start, so that they end where the right ones begin
+        # (the padding is skipped, see `_start`)
+        if left:
+            left[0] = left[0][skip:]
+        elements = _flatten(left)
+        elements += middle
+        if right:
+            elements += right.pop(0)[right_skip:]
+        padding = -len(elements) % _WIDTH
+        return cls._from_leaves(_cut([None] * padding + elements) + right, padding)
+
+    def set(self, index: int, value) -> "PersistentVector":
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("vector index out of range")
+        root, tail = self._trie_set(self._start + index, value)
+        return self._make(self._size, self._shift, root, tail, self._start, self._count)
+
+    def splice(self, start: int, stop: int, values: Iterable[Any]) -> "PersistentVector":
+        """Replace `self[start:stop]` with `values`, like `list[a:b] = values`"""
+        start, stop, _ = slice(start, stop).indices(self._count)
+        stop = max(start, stop)
+        first = self._start
+        left = self._exact_leaves(first, first + start)
+        right = self._exact_leaves(first + stop, first + self._count)
+        return self._join(
+            left, first & _MASK if left else 0, tuple(values), right, (first + stop) & _MASK
+        )
+
+    def __add__(self, other: Iterable[Any]) -> "PersistentVector":
+        return self.extend(other)
+
+    def __eq__(self, other):
+        if not isinstance(other, PersistentVector):
+            return NotImplemented
+        if self._count != other._count:
+            return False
+        if self._root is other._root and self._tail is other._tail and self._start == other._start:
+            return True
+        return all(a == b for a, b in zip(self, other))
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(tuple(self))
+        return self._hash
+
+    def __repr__(self):
+        return f"PersistentVector({list(self)!r})"
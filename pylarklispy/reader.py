@@ -0,0 +1,103 @@
+import codecs
+import re
+from typing import IO, Iterator, Union
+
+from . import entities as e
+
+"""
+This module contains a streaming reader: it yields the top-level forms
+of a program one at a time, reading the source in chunks.
+
+The reader only finds where each top-level form ends (by tracking
+brackets, strings and comments) and parses that slice on its own, so
+at most one form and one chunk are kept in memory, no matter how long
+the program is.
+"""
+
+CHUNK_SIZE = 1 << 16
+
+_DELIMITERS = r'\s,;()\[\]{}"&~:'
+
+# a prefix is part of the form that follows it: `&x`, `~r "z"`, `:a`,
+# and `: a` too, like for the grammar
+_TOKEN = re.compile(rf'''
+      (?P<space>[\s,]+)
+    | (?P<comment>;[^\n]*)
+    | (?P<string>"(?:[^"\\]|\\.)*")
+    | (?P<open>[(\[{{])
+    | (?P<close>[)\]}}])
+    | (?P<prefix>&|:|~[\s,]*[^{_DELIMITERS}]+)
+    | (?P<word>[^{_DELIMITERS}]+)
+''', re.VERBOSE)
+
+
+Source = Union[IO[str], IO[bytes]]
+
+
+def _chunks(source: Source, chunk_size: int) -> Iterator[str]:
+    decoder = None
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b"", final=True)
+
+
+def read_form_sources(source: Source, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Yield the source code of each top-level form.
+
+    `source` is anything with a `read(n)` method returning `str` or
+    UTF-8 `bytes`: a text or binary file, an `mmap.mmap`, `io.StringIO`...
+    """
+    buffer = ""
+    pos = 0  # where to continue scanning
+    start = None  # where the current form started, if it did
+    depth = 0
+    chunks = _chunks(source, chunk_size)
+    eof = False
+    while not eof:
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer += chunk
+        while pos < len(buffer):
+            match = _TOKEN.match(buffer, pos)
+            if match is None or (match.end() == len(buffer) and not eof):
+                # an unfinished token (or a syntax error, at the end)
+                break
+            kind = match.lastgroup
+            if kind in ("space", "comment"):
+                pass
+            elif start is None:
+                start = match.start()
+            if kind == "open":
+                depth += 1
+            elif kind == "close":
+                depth -= 1
+            pos = match.end()
+            if depth <= 0 and kind in ("close", "string", "word"):
+                yield buffer[start:pos]
+                start = None
+                depth = 0
+        keep = pos if start is None else start
+        buffer = buffer[keep:]
+        pos -= keep
+        if start is not None:
+            start = 0
+    if buffer.strip():
+        # an unfinished form; let the parser report it
+        yield buffer
+
+
+def read_forms(source: Source, chunk_size: int = CHUNK_SIZE, fast: bool = False) -> Iterator[e.Entity]:
+    """Yield the top-level entities of a program, one at a time"""
+    from . import compile_code
+    for form_source in read_form_sources(source, chunk_size):
+        yield from compile_code(form_source, fast=fast)
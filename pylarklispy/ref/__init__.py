@@ -5,6 +5,8 @@ from ..interop_utils import Index
 
 
 class Reference(Entity):
+    __slots__ = ("value",)
+
     def __init__(self, value: e.Entity):
         self.value: e.Entity = value
 
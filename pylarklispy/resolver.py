@@ -0,0 +1,168 @@
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+from . import entities as e
+from . import bif
+
+"""
+This module contains the resolution pass: it replaces each `Name`
+whose binding is statically known with a `LocalName` carrying
+(depth, slot) coordinates, and every other name with a `GlobalName`.
+
+The pass assumes that `fun`, `defun` and `let` are the built-in
+binding forms (a macro can also put the built-in function itself
+in the head of a form, see `pylarklispy.macros`). Quoted entities are left alone, because they can be
+evaluated anywhere.
+
+A `fun` inside another function also gets the list of the local names
+its body uses from outside (its captures), as a third argument:
+
+    (fun [x] (+ x y))  ->  (fun [x] (+ x y) [y])
+
+The function only keeps the values of these names (in a frame of their
+own, between its frame and the global one), instead of every frame
+around it, so a closure doesn't keep the temporaries of its enclosing
+functions alive.
+"""
+
+
+class _FunScope(dict):
+    """The layout of a function that collects the names it captures"""
+    def __init__(self, layout: Mapping[str, int]):
+        super().__init__(layout)
+        self.captures: List[e.LocalName] = []
+
+    def capture(self, name: e.LocalName) -> int:
+        """The slot of `name` (as seen from outside) among the captures"""
+        for slot, captured in enumerate(self.captures):
+            if captured.identifier == name.identifier:
+                return slot
+        self.captures.append(name)
+        return len(self.captures) - 1
+
+
+Scopes = Tuple[Mapping[str, int], ...]  # innermost first
+
+
+def resolve(entity: e.Entity, scopes: Scopes = ()) -> e.Entity:
+    """Return a copy of `entity` with resolved names"""
+    if type(entity) is e.Name:
+        return _resolve_name(entity, scopes)
+    elif isinstance(entity, e.SExpr):
+        return _resolve_s_expr(entity, scopes)
+    elif e.is_data(entity):
+        # no names in it, however deep it is
+        return entity
+    elif isinstance(entity, e.Vector):
+        return e.Vector(*(resolve(x, scopes) for x in entity.es))
+    elif isinstance(entity, e.Map) and entity.literal is not None:
+        return e.Map(*(resolve(x, scopes) for x in entity.literal))
+    else:
+        return entity
+
+
+def _resolve_name(name: e.Name, scopes: Scopes) -> e.Name:
+    for depth, layout in enumerate(scopes):
+        slot = layout.get(name.identifier)
+        if slot is not None:
+            return e.LocalName(name.identifier, depth, slot)
+        if isinstance(layout, _FunScope):
+            # from outside of a function: it's one of its captures
+            outer = _resolve_name(name, scopes[depth + 1:])
+            if type(outer) is e.GlobalName:
+                return outer
+            return e.LocalName(name.identifier, depth + 1, layout.capture(outer))
+    return e.GlobalName(name.identifier)
+
+
+def _is_bound(name: str, scopes: Scopes) -> bool:
+    return any(name in layout for layout in scopes)
+
+
+def param_names(params: e.Entity) -> Optional[List[str]]:
+    """Names of a parameter vector like `[a b c]`, or None"""
+    if not isinstance(params, e.Vector):
+        return None
+    if not all(isinstance(param, e.Name) for param in params.es):
+        return None
+    return [param.identifier for param in params.es]
+
+
+def _resolve_s_expr(s_expr: e.SExpr, scopes: Scopes) -> e.SExpr:
+    if not s_expr.es:
+        return s_expr
+    head, *args = s_expr.es
+    form = None
+    if type(head) is e.Name and not _is_bound(head.identifier, scopes):
+        form = _binding_forms.get(head.identifier)
+    elif isinstance(head, e.Function) and bif.index.get(head.name) is head:
+        # put there by a macro
+        form = _binding_forms.get(head.name)
+    if form is not None:
+        resolved_args = form(args, scopes)
+        if resolved_args is not None:
+            return e.SExpr(resolve(head, scopes), *resolved_args)
+    return e.SExpr(*(resolve(x, scopes) for x in s_expr.es))
+
+
+def _resolve_fun(args: Sequence[e.Entity], scopes: Scopes, capture: bool = True):
+    # (fun [params] body) -> (fun [params] body [captures]) inside a function
+    if len(args) != 2:
+        return None
+    params, body = args
+    arg_names = param_names(params)
+    if arg_names is None:
+        return None
+    if not scopes or not capture:
+        return [params, resolve(body, (e.make_layout(arg_names),) + scopes)]
+    scope = _FunScope(e.make_layout(arg_names))
+    resolved_body = resolve(body, (scope,) + scopes)
+    return [params, resolved_body, e.Vector(*scope.captures)]
+
+
+def _resolve_defun(args: Sequence[e.Entity], scopes: Scopes):
+    # (defun name [params] body), the function sees all the frames around it
+    if len(args) != 3:
+        return None
+    name, *fun_args = args
+    resolved = _resolve_fun(fun_args, scopes, capture=False)
+    if resolved is None:
+        return None
+    return [name, *resolved]
+
+
+def _resolve_define(args: Sequence[e.Entity], scopes: Scopes):
+    # (define name value)
+    if len(args) != 2:
+        return None
+    name, value = args
+    return [name, resolve(value, scopes)]
+
+
+def _resolve_let(args: Sequence[e.Entity], scopes: Scopes):
+    # (let [name value ...] body)
+    if len(args) != 2:
+        return None
+    bindings, body = args
+    if not isinstance(bindings, e.Vector) or len(bindings.es) % 2 != 0:
+        return None
+    names = bindings.es[::2]
+    arg_names = param_names(e.Vector(*names))
+    if arg_names is None:
+        return None
+    # the values are computed outside, the body inside the new frame
+    es = []
+    for name, value in bindings.pairs():
+        es += (name, resolve(value, scopes))
+    return [
+        e.Vector(*es),
+        resolve(body, (e.make_layout(arg_names),) + scopes)
+    ]
+
+
+_binding_forms = {
+    "fun": _resolve_fun,
+    "defun": _resolve_defun,
+    "defmacro": _resolve_defun,
+    "define": _resolve_define,
+    "let": _resolve_let,
+}
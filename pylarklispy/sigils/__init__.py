@@ -1,50 +1,65 @@
+import functools
+import re
 from typing import *
 import pylarklispy.entities as e
 from ..interop_utils import Index
 
+_FORMAT = e.GlobalName("format")
+
+# The functions made by the sigils are partial applications of these,
+# not closures, so they can be saved in an image (`pylarklispy.image`).
+
+def _substitute_percent(template: e.String, starts: Tuple[int, ...], rr: e.Runtime, *args: e.Entity):
+    if len(args) != len(starts):
+        raise ValueError(f"Expected {len(starts)} args for "
+                         f"{template}, got: {e.Vector(*args)}")
+    chars = list(template.s)
+    for index, arg in [*zip(starts, args)][::-1]:
+        chars[index:index+1] =\
+            e.SExpr(_FORMAT, arg).evaluate(rr).s # type: ignore
+    return e.String("".join(chars))
+
+
+def _substitute_f(template: e.String, fields: Tuple[Tuple[int, int, str], ...], rr: e.Runtime, lookup: e.Entity):
+    chars = list(template.s)
+    for start, end, name in fields[::-1]:
+        chars[start:end] = \
+            e.SExpr(_FORMAT, e.SExpr(lookup, e.Atom(name))).evaluate(rr).s # type: ignore
+    return e.String("".join(chars))
+
 
 def interop(_runtime: e.Runtime):
-    import re
     index = Index()
     ####################################
 
 
-    @index.add_function("sigil<%>")
-    def _(r: e.Runtime, template: e.String):
-        matches = list(re.finditer(r"(?<!%)%(?!%)", template.s))
-
-        @e.Function.make("sigil<%>.substitute")
-        def substitute(rr: e.Runtime, *args: e.Entity):
-            if len(args) != len(matches):
-                raise ValueError(f"Expected {len(matches)} args for "
-                                 f"{template}, got: {e.Vector(*args)}")
-            chars = list(template.s)
-            for match, arg in [*zip(matches, args)][::-1]:
-                index = match.start(0)
-                chars[index:index+1] =\
-                    e.SExpr(e.Name("format"), arg).evaluate(rr).s # type: ignore
-            return e.String("".join(chars))
+    # the patterns are compiled when a sigil is first imported
 
-        return substitute
+    @index.add_lazy("sigil<%>")
+    def _():
+        holes = re.compile(r"(?<!%)%(?!%)")
 
+        @e.Function.make("sigil<%>", pure=True)
+        def sigil(r: e.Runtime, template: e.String):
+            starts = tuple(match.start(0) for match in holes.finditer(template.s))
+            return e.Function("sigil<%>.substitute", functools.partial(_substitute_percent, template, starts))
+        return sigil
 
-    @index.add_function("sigil<f>")
-    def _(r: e.Runtime, template: e.String):
-        matches = list(re.finditer(r"\%\(([^{}]+?)\)", template.s))
 
-        @e.Function.make("sigil<f>.substitute")
-        def substitute(rr: e.Runtime, lookup: e.Entity):
-            chars = list(template.s)
-            for match in matches[::-1]:
-                name = match.group(1)
-                slice_ = slice(match.start(0), match.end(1)+1)
-                chars[slice_] = \
-                    e.SExpr(e.Name("format"), e.SExpr(lookup, e.Atom(name))).evaluate(rr).s # type: ignore
-            return e.String("".join(chars))
+    @index.add_lazy("sigil<f>")
+    def _():
+        holes = re.compile(r"\%\(([^{}]+?)\)")
 
-        return substitute
+        @e.Function.make("sigil<f>", pure=True)
+        def sigil(r: e.Runtime, template: e.String):
+            fields = tuple(
+                (match.start(0), match.end(1) + 1, match.group(1))
+                for match in holes.finditer(template.s)
+            )
+            return e.Function("sigil<f>.substitute", functools.partial(_substitute_f, template, fields))
+        return sigil
 
 
 
     ###################################
-    return index
\ No newline at end of file
+    return index
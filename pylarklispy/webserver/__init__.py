@@ -1,84 +1,185 @@
+import functools
 from typing import *
 import pylarklispy.entities as e
 from ..interop_utils import Index
+from . import cache, markup, prefork, templates
+from . import pool as pool_
 
-def interop(_runtime: e.Runtime):
+
+def make_app(r: e.Runtime, route_table: e.Vector, pool: Optional[str] = None, pool_size: Optional[int] = None):
+    """The `aiohttp` application serving `route_table` (see `server`);
+    the views run on a pool of workers if `pool` is given (see `pool`)"""
     from aiohttp import web
+    routes = web.RouteTableDef()
+    views: List[e.Entity] = []
+    workers: Optional[pool_.Workers] = None
+
+    caches: Dict[str, cache.ResponseCache] = {}
+
+    def connect_route(route: e.Vector):
+        if len(route.es) not in (3, 4):
+            raise ValueError(f"Routing row must be [method name view <options>], got {route}")
+        method, name, fn, *options = route.es
+        if not isinstance(method, (e.String, e.Atom)):
+            raise ValueError(f"{method} should be a string or an atom")
+        if not isinstance(name, e.String):
+            raise TypeError(f"Route name must be a string, not {name}.")
+        response_cache: Optional[cache.ResponseCache] = None
+        if options:
+            # [:ttl seconds :max-entries N], see `cache`
+            settings = _options(options[0], _ROUTE_OPTIONS, "route")
+            ttl = settings.get("ttl")
+            max_entries = settings.get("max-entries")
+            response_cache = caches[f"{method.s.upper()} {name.s}"] = cache.ResponseCache(
+                ttl=ttl.n if ttl is not None else None,
+                max_entries=max_entries.n if max_entries is not None else cache.DEFAULT_MAX_ENTRIES,
+            )
+        # we hope that `fn` is callable :-)
+        add_route = getattr(routes, method.s)(name.s)
+        # the parts of the page that don't depend on the request,
+        # rendered once (None if `fn` isn't a user-defined function)
+        template = templates.compile_view(fn)
+        view_index = len(views)
+        views.append(fn)
+
+        async def cached_route(request):
+            assert response_cache is not None
+            key = (request.method, request.path, tuple(sorted(request.match_info.items())))
+            page = response_cache.get(key)
+            status = "HIT"
+            if page is None:
+                if workers is not None:
+                    chunks = await workers.render(view_index, dict(request.match_info))
+                else:
+                    chunks = list(templates.render_page(r, fn, template, request.match_info))
+                page = response_cache.put(key, b"".join(chunks))
+                status = "MISS"
+            headers = {"ETag": page.etag, "X-Cache": status}
+            if cache.matches(request.headers.get("If-None-Match"), page.etag):
+                return web.Response(status=304, headers=headers)
+            return web.Response(body=page.body, content_type="text/html", charset="utf-8", headers=headers)
+
+        @add_route
+        async def a_route(request):
+            if response_cache is not None:
+                return await cached_route(request)
+            if workers is not None:
+                chunks = iter(await workers.render(view_index, dict(request.match_info)))
+            else:
+                # written while it's rendered, see `markup`; the first
+                # chunk is rendered before the headers are sent, so bad
+                # markup still gets an error response
+                chunks = templates.render_page(r, fn, template, request.match_info)
+            first = next(chunks, b"")
+            response = web.StreamResponse()
+            response.content_type = "text/html"
+            response.charset = "utf-8"
+            await response.prepare(request)
+            await response.write(first)
+            for chunk in chunks:
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+
+    for row in route_table.es:
+        if not isinstance(row, e.Vector):
+            raise TypeError(f"Routing row must be a vector, got {row}")
+        connect_route(row)
+
+    app = web.Application()
+    app.add_routes(routes)
+    app[_caches_key()] = caches
+    if pool is not None:
+        workers = pool_.Workers(r, views, pool, pool_size)
+        async def shutdown(app):
+            workers.shutdown()
+        app.on_cleanup.append(shutdown)
+    return app
+
+
+@functools.lru_cache(maxsize=None)
+def _caches_key():
+    # made on first use, like everything from aiohttp
+    from aiohttp import web
+    return web.AppKey("pylarklispy.response_caches", dict)
+
+
+def response_caches(app) -> Dict[str, cache.ResponseCache]:
+    """The response caches of the routes of `app`, see `cache`"""
+    return app[_caches_key()]
+
+
+_SERVER_OPTIONS = {"pool": e.Atom, "pool-size": e.Integer, "workers": e.Integer}
+_ROUTE_OPTIONS = {"ttl": e.Integer, "max-entries": e.Integer}
+
+def _options(options: e.Entity, spec: Dict[str, type], what: str) -> Dict[str, e.Entity]:
+    if not isinstance(options, e.Vector):
+        raise TypeError(f"The {what} options must be a vector, got {options}")
+    settings: Dict[str, e.Entity] = {}
+    for key, value in options.pairs():
+        if not isinstance(key, e.Atom) or key.s not in spec:
+            raise ValueError(f"Unknown {what} option {key}, expected one of {list(spec)}")
+        if not isinstance(value, spec[key.s]):
+            raise TypeError(f"Bad value for {what} option {key}: {value}")
+        settings[key.s] = value
+    return settings
+
+
+def server_options(options: e.Vector) -> Dict[str, e.Entity]:
+    """The options of `server`, checked, by name"""
+    return _options(options, _SERVER_OPTIONS, "server")
+
+
+def interop(_runtime: e.Runtime):
     index = Index()
     ####################################
 
     @index.add_function("render")
     def _render(r: e.Runtime, obj):
-        if isinstance(obj, e.String):
-            return obj
-        elif isinstance(obj, e.Vector):
-            key, elements = obj.es
-            assert isinstance(elements, (e.Vector, e.String)), f"{elements=}"
-            if isinstance(elements, e.String):
-                elements = e.Vector(elements)
-            if isinstance(key, (e.Atom, e.String)):
-                tag_name = key.s
-                param_string = ""
-            elif isinstance(key, e.Vector):
-                tag, attrs = key.es
-                assert isinstance(tag, (e.Atom, e.String)), f"{tag=}"
-                assert isinstance(attrs, e.Vector), f"{attrs=}"
-                tag_name = tag.s
-                param_string = " ".join(
-                    f"{name.s}={value.s}" for (name, value) in attrs.pairs() # type: ignore
-                )
-            else:
-                assert False, f"bad key: {obj}->{key}"
-            return e.SExpr(
-                e.Name("join"),
-                e.String(f"<{tag_name} {param_string}>"),
-                *(e.SExpr(_render, element) for element in elements.es), # type: ignore
-                e.String(f"</{tag_name}>"),
-            )
-        else:
-            assert False, f"bad obj: {obj}"
-
+        return e.String(markup.render(obj))
 
-    @index.add_function("server")
-    def _(
-        r: e.Runtime,
-        route_table: e.Vector,
-        host: e.String = e.String("0.0.0.0"),
-        port: e.Integer = e.Integer(8080)
-    ):
-        routes = web.RouteTableDef()
 
-        def connect_route(route: e.Vector):
-            method, name, fn = route.es
-            if not isinstance(method, (e.String, e.Atom)):
-                raise ValueError(f"{method} should be a string or an atom")
-            if not isinstance(name, e.String):
-                raise TypeError(f"Route name must be a string, not {name}.")
-            # we hope that `fn` is callable :-)
-            add_route = getattr(routes, method.s)(name.s)
+    @index.add_lazy("server")
+    def _():
+        # aiohttp takes a while to import: only when `server` is imported
+        from aiohttp import web
 
-            @add_route
-            def a_route(request):
-                @e.Function.make("<Request wrapper>")
-                def request_wrapper(rr: e.Runtime, a: e.Atom):
-                    return e.String(request.match_info[a.s])
+        @e.Function.make("server")
+        def server(
+            r: e.Runtime,
+            route_table: e.Vector,
+            host: e.String = e.String("0.0.0.0"),
+            port: e.Integer = e.Integer(8080),
+            options: e.Vector = e.Vector(),
+        ):
+            # [:pool :threads|:processes :pool-size N :workers N]
+            settings = server_options(options)
+            pool = settings.get("pool")
+            pool_size = settings.get("pool-size")
+            workers = settings.get("workers")
 
-                text = e.SExpr(_render, e.SExpr(fn, request_wrapper)).evaluate(r) # type: ignore
-                assert isinstance(text, e.String)
-                return web.Response(text=text.s, content_type="text/html")
+            def app():
+                return make_app(
+                    r, route_table,
+                    pool=pool.s if pool is not None else None,
+                    pool_size=pool_size.n if pool_size is not None else None,
+                )
 
-        for row in route_table.es:
-            if not isinstance(row, e.Vector):
-                raise TypeError(f"Routing row must be a vector, got {row}")
-            connect_route(row)
+            if workers is None:
+                web.run_app(app(), host=host.s, port=port.n)
+            else:
+                # each worker makes its app (templates, pool, caches) after
+                # it's forked, see `prefork`
+                prefork.serve(
+                    lambda sock: web.run_app(app(), sock=sock, print=None),
+                    host.s, port.n, workers.n
+                )
+            return e.Atom("Nil")
 
-        app = web.Application()
-        app.add_routes(routes)
-        web.run_app(app, host=host.s, port=port.n)
-        return e.Atom("Nil")
+        return server
 
 
 
 
     ###################################
-    return index
\ No newline at end of file
+    return index
@@ -0,0 +1,95 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional
+
+"""
+This module contains the response cache of a route (see `make_app`),
+for routes whose page only depends on the request path:
+
+    [:get "/item/{id}" item [:ttl 60 :max-entries 100]]
+
+The pages are kept for `ttl` seconds (forever if not given), and the
+least recently used one is dropped when there are `max-entries` of
+them. Each one has an ETag, so a client that already has it gets a
+`304 Not Modified` instead (`If-None-Match`).
+
+`hits` and `misses` count the requests answered from the cache or not,
+for monitoring: `webserver.response_caches(app)` has the caches of the
+routes of an app, by method and route name (`"GET /item/{id}"`), and
+every response of a cached route has an `X-Cache` header (`HIT` or
+`MISS`).
+"""
+
+DEFAULT_MAX_ENTRIES = 1024
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Whether an `If-None-Match` header matches the ETag `tag`"""
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # a weak comparison, like for GET and HEAD
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+
+class CachedPage:
+    __slots__ = ("body", "etag", "expires")
+
+    def __init__(self, body: bytes, expires: float):
+        self.body = body
+        self.etag = etag(body)
+        self.expires = expires
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries < 1:
+            raise ValueError(f"A cache needs room for at least one page, got {max_entries}")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        # least recently used first
+        self.pages: "OrderedDict[Hashable, CachedPage]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CachedPage]:
+        """The page for `key`, if it's there and fresh; counts a hit or a miss"""
+        page = self.pages.get(key)
+        if page is not None and page.expires <= self.clock():
+            del self.pages[key]
+            page = None
+        if page is None:
+            self.misses += 1
+            return None
+        self.pages.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def put(self, key: Hashable, body: bytes) -> CachedPage:
+        expires = self.clock() + self.ttl if self.ttl is not None else float("inf")
+        page = self.pages[key] = CachedPage(body, expires)
+        self.pages.move_to_end(key)
+        while len(self.pages) > self.max_entries:
+            self.pages.popitem(last=False)
+        return page
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.pages)}
@@ -0,0 +1,137 @@
+import re
+from html import escape
+from typing import Iterable, Iterator, List, Tuple
+
+import pylarklispy.entities as e
+
+"""
+This module turns markup into HTML. Markup is a string (written as it
+is) or a vector `[key children]`, where `key` is the tag name or
+`[tag [name value...]]`, and `children` is a string or a vector of
+markup:
+
+    [:ul [[:li "one"]
+          [[:li [:class "last"]] "two"]]]
+
+    <ul><li>one</li><li class="last">two</li></ul>
+
+The tree is walked with a stack of iterators instead of recursion, and
+the HTML comes out piece by piece (`iter_html`) or in chunks of about
+`CHUNK_SIZE` bytes (`iter_chunks`), so a response can be written while
+the page is rendered and nothing holds the whole page but the client.
+Attribute values are escaped; text is not, so markup can contain HTML.
+Tag and attribute names are checked instead, since they can't be escaped.
+"""
+
+CHUNK_SIZE = 16 * 1024
+
+_NAME = re.compile(r"[A-Za-z][\w:.-]*")
+
+
+def _name(entity: e.Entity, what: str) -> str:
+    if isinstance(entity, (e.Atom, e.String)) and _NAME.fullmatch(entity.s):
+        return entity.s
+    raise TypeError(f"Bad {what} name: {entity}")
+
+
+def tag(key: e.Entity) -> Tuple[str, str]:
+    """The opening and the closing tag for `key`"""
+    if isinstance(key, (e.Atom, e.String)):
+        name = _name(key, "tag")
+        return f"<{name}>", f"</{name}>"
+    if isinstance(key, e.Vector) and len(key.es) == 2:
+        name, attrs = key.es
+        if isinstance(name, (e.Atom, e.String)) and isinstance(attrs, e.Vector):
+            name = _name(name, "tag")
+            params = "".join(
+                f' {_name(attr, "attribute")}="{escape(_text(value))}"'
+                for attr, value in attrs.pairs()
+            )
+            return f"<{name}{params}>", f"</{name}>"
+    raise TypeError(f"Bad tag: {key}")
+
+
+def _text(value: e.Entity) -> str:
+    if isinstance(value, (e.String, e.Atom)):
+        return value.s
+    return str(value)
+
+
+def _walk(nodes: Iterator[e.Entity]) -> Iterator[str]:
+    # (the children left to write, the closing tag of their parent)
+    stack = [(nodes, "")]
+    while stack:
+        nodes, closing = stack[-1]
+        for node in nodes:
+            if node.__class__ is e.String:
+                yield node.s
+                continue
+            if not isinstance(node, e.Vector) or len(node.es) != 2:
+                raise TypeError(f"Bad markup: {node}")
+            key, children = node.es
+            opening, end = tag(key)
+            if isinstance(children, e.String):
+                yield opening + children.s + end
+            elif isinstance(children, e.Vector):
+                yield opening
+                stack.append((iter(children.es), end))
+                break
+            else:
+                raise TypeError(f"Bad children of {key}: {children}")
+        else:
+            stack.pop()
+            if closing:
+                yield closing
+
+
+def iter_html(markup: e.Entity) -> Iterator[str]:
+    """The HTML for `markup`, piece by piece"""
+    return _walk(iter((markup,)))
+
+
+def iter_children_html(children: e.Entity) -> Iterator[str]:
+    """The HTML for the children of a node (a string or a vector of markup)"""
+    if isinstance(children, e.String):
+        return iter((children.s,))
+    if isinstance(children, e.Vector):
+        return _walk(iter(children.es))
+    raise TypeError(f"Bad children: {children}")
+
+
+def encode(pieces: Iterable[str], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Encode `pieces` of HTML, in chunks of about `size` bytes"""
+    buffer: List[str] = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield "".join(buffer).encode()
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+def iter_chunks(markup: e.Entity, size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """The HTML for `markup`, encoded, in chunks of about `size` bytes"""
+    return encode(iter_html(markup), size)
+
+
+def coalesce(chunks: Iterable[bytes], size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Join small `chunks` into chunks of about `size` bytes"""
+    buffer: List[bytes] = []
+    buffered = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        buffered += len(chunk)
+        if buffered >= size:
+            yield b"".join(buffer)
+            buffer.clear()
+            buffered = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def render(markup: e.Entity) -> str:
+    return "".join(iter_html(markup))
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import pylarklispy.entities as e
+from .. import image
+from . import templates
+
+"""
+This module runs the views of routes on a pool of threads or processes,
+so a slow page doesn't hold the event loop (and every other connection)
+while it's evaluated and rendered:
+
+    workers = Workers(runtime, views, "threads", size=4)
+    chunks = await workers.render(view_index, match_info)
+
+Each worker has a runtime of its own, a copy of the server's runtime
+made when the worker starts (see `image.snapshot`), so two requests
+never share a stack. A consequence: what a request changes in the
+runtime (a `define`, a `ref`...) stays in the worker that ran it.
+
+With processes, the views run in parallel; with threads, they take
+turns on the GIL, but the event loop keeps answering in between.
+The page is rendered in the worker and sent back whole, in chunks.
+
+The runtime has to be picklable to be copied: if it isn't (see
+`image.save`), making the pool raises an `image.ImageError` naming the
+value that can't be copied.
+"""
+
+KINDS = ("threads", "processes")
+
+# the state of the worker (thread or process) running this code
+_worker = threading.local()
+
+
+def _start_worker(snapshot: bytes):
+    runtime, views = image.restore(snapshot)
+    _worker.runtime = runtime
+    _worker.views = views
+    _worker.templates = [templates.compile_view(view) for view in views]
+
+
+def _render(index: int, match_info: Dict[str, str]) -> List[bytes]:
+    return list(templates.render_page(
+        _worker.runtime, _worker.views[index], _worker.templates[index], match_info
+    ))
+
+
+class Workers:
+    def __init__(self, runtime: e.Runtime, views: Sequence[e.Entity], kind: str, size: Optional[int] = None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown pool {kind!r}, expected one of {KINDS}")
+        # taken now: the workers start when they're first needed
+        try:
+            snapshot = image.snapshot(runtime, views)
+        except image.ImageError as error:
+            raise image.ImageError(f"Cannot run the views on a pool of {kind}: {error}") from None
+        self.executor: Executor
+        if kind == "threads":
+            self.executor = ThreadPoolExecutor(
+                size, thread_name_prefix="pylarklispy-view",
+                initializer=_start_worker, initargs=(snapshot,)
+            )
+        else:
+            self.executor = ProcessPoolExecutor(size, initializer=_start_worker, initargs=(snapshot,))
+
+    async def render(self, index: int, match_info: Dict[str, str]) -> List[bytes]:
+        """The page of the view at `index` for a request, in chunks"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, _render, index, match_info)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
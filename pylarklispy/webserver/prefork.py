@@ -0,0 +1,210 @@
+import os
+import select
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Set
+
+"""
+This module serves with several processes (`server` with `:workers N`):
+the supervisor, the process that ran the program, opens the listening
+socket and forks the workers, which inherit it and accept connections
+from it, each with its own copy of the runtime as it was when the
+server started.
+
+The supervisor then watches them:
+
+- a worker that exits by itself (a crash) is replaced, after
+  `RESPAWN_DELAY` seconds if it lived less than that, so a worker that
+  can't start doesn't make it fork in a loop;
+- SIGHUP restarts the workers gracefully, one by one: a new worker is
+  started, then the old one gets SIGTERM, so it stops accepting
+  connections and finishes the requests it has;
+- SIGTERM or SIGINT stops them all, the same way, then the supervisor;
+  the workers still there after `STOP_TIMEOUT` seconds are killed.
+
+The supervisor waits on a pipe that the signals write to (see
+`signal.set_wakeup_fd`), so it handles them right away, even while it
+waits to replace a worker.
+
+It needs `os.fork`, so it doesn't work on Windows.
+"""
+
+RESPAWN_DELAY = 1.0
+# how long the workers have to finish their requests when stopping
+STOP_TIMEOUT = 30.0
+# how often the supervisor looks at its workers
+POLL_INTERVAL = 0.1
+
+
+def listen(host: str, port: int, backlog: int = 128) -> socket.socket:
+    """The listening socket shared by the workers"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _log(message: str):
+    print(f"[supervisor {os.getpid()}] {message}", file=sys.stderr, flush=True)
+
+
+class Supervisor:
+    def __init__(self, serve: Callable[[socket.socket], None], sock: socket.socket, workers: int):
+        if not hasattr(os, "fork"):
+            raise OSError("Serving with several workers needs os.fork")
+        if workers < 1:
+            raise ValueError(f"Expected at least one worker, got {workers}")
+        # what a worker runs, with the listening socket
+        self.serve = serve
+        self.sock = sock
+        self.size = workers
+        # pid -> when it started
+        self.workers: Dict[int, float] = {}
+        # the workers that were asked to stop
+        self.retiring: Set[int] = set()
+        self.signals: List[int] = []
+        # when to replace the workers that crashed
+        self.respawns: List[float] = []
+
+    def spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            # the worker
+            for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, signal.SIG_DFL)
+            signal.set_wakeup_fd(-1)
+            status = 0
+            try:
+                self.serve(self.sock)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(status)
+        self.workers[pid] = time.monotonic()
+        _log(f"started worker {pid}")
+        return pid
+
+    def retire(self, pid: int):
+        self.retiring.add(pid)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    def reap(self) -> List[int]:
+        """The workers that exited without being asked to"""
+        crashed = []
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            if pid in self.retiring:
+                self.retiring.discard(pid)
+                _log(f"worker {pid} stopped")
+            else:
+                _log(f"worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+                crashed.append(started)
+        return crashed
+
+    def restart(self):
+        """Replace the workers one by one"""
+        for pid in list(self.workers):
+            if pid in self.retiring:
+                continue
+            self.spawn()
+            self.retire(pid)
+
+    def stop(self, timeout: Optional[float] = STOP_TIMEOUT):
+        """Stop the workers, and kill the ones still running after
+        `timeout` seconds (never if None)"""
+        self.respawns.clear()
+        for pid in list(self.workers):
+            self.retire(pid)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            self.reap()
+            if not self.workers:
+                return
+            if deadline is not None and time.monotonic() > deadline:
+                for pid in self.workers:
+                    _log(f"killing worker {pid}")
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                deadline = None
+            time.sleep(POLL_INTERVAL)
+
+    def respawn(self):
+        """Replace the workers that crashed, when it's time"""
+        now = time.monotonic()
+        for started in self.reap():
+            # a worker that can't start would make it fork in a loop
+            self.respawns.append(now + RESPAWN_DELAY if now - started < RESPAWN_DELAY else now)
+        due = [when for when in self.respawns if when <= now]
+        self.respawns = [when for when in self.respawns if when > now]
+        for _ in due:
+            self.spawn()
+
+    def run(self):
+        """Start the workers and watch them until SIGTERM or SIGINT"""
+        handler = lambda signum, frame: self.signals.append(signum)
+        previous = {
+            signum: signal.signal(signum, handler)
+            for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+        }
+        wakeup, woken = os.pipe()
+        os.set_blocking(wakeup, False)
+        os.set_blocking(woken, False)
+        previous_wakeup_fd = signal.set_wakeup_fd(woken)
+        try:
+            for _ in range(self.size):
+                self.spawn()
+            while True:
+                self.respawn()
+                while self.signals:
+                    signum = self.signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        _log("restarting the workers")
+                        self.restart()
+                    else:
+                        _log("stopping")
+                        self.stop()
+                        return
+                # until a signal comes
+                if select.select([wakeup], [], [], POLL_INTERVAL)[0]:
+                    try:
+                        while os.read(wakeup, 512):
+                            pass
+                    except BlockingIOError:
+                        pass
+        finally:
+            signal.set_wakeup_fd(previous_wakeup_fd)
+            os.close(wakeup)
+            os.close(woken)
+            for signum, previous_handler in previous.items():
+                signal.signal(signum, previous_handler)
+
+
+def serve(serve: Callable[[socket.socket], None], host: str, port: int, workers: int):
+    """Run `serve` in `workers` processes sharing a socket listening on
+    `host` and `port`, until SIGTERM or SIGINT"""
+    with listen(host, port) as sock:
+        bound_host, bound_port = sock.getsockname()[:2]
+        print(f"======== Running on http://{bound_host}:{bound_port} with {workers} workers ========", flush=True)
+        Supervisor(serve, sock, workers).run()
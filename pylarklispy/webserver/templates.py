@@ -0,0 +1,148 @@
+from typing import Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+import pylarklispy.entities as e
+from . import markup
+
+"""
+This module compiles the view functions of routes into templates, when
+the server starts. The markup a view returns is mostly literal:
+
+    (defun hello [request]
+        [:html [[:head [[:title "Hello"]]]
+                [:body [[:p (join "Hello, " (request :name))]]]]])
+
+The literal parts of the body are rendered once, into bytes, and only
+the other parts (the holes) are evaluated for each request, in a frame
+of the view like a call would do:
+
+    b"<html><head><title>Hello</title></head><body><p>"
+    (join "Hello, " (request :name))
+    b"</p></body></html>"
+
+A hole is either a node of markup, or the children of a node whose tag
+is literal. Only user-defined functions of one parameter are compiled;
+`compile_view` returns None for anything else.
+"""
+
+
+class Hole:
+    __slots__ = ("expression", "children")
+
+    def __init__(self, expression: e.Entity, children: bool = False):
+        self.expression = expression
+        # the children of a node, not a node
+        self.children = children
+
+
+Part = Union[bytes, Hole]
+# a part, or a hole with its value
+Filled = Union[bytes, Tuple[Hole, e.Entity]]
+
+
+def _is_literal(entity: e.Entity) -> bool:
+    cls = entity.__class__
+    if cls is e.Vector:
+        return entity._computed == len(entity.es) or all(_is_literal(x) for x in entity.es)
+    return cls is e.String or cls is e.Atom or cls is e.Integer
+
+
+def _compile(entity: e.Entity, parts: List[Part]):
+    if _is_literal(entity):
+        try:
+            parts.append(markup.render(entity).encode())
+            return
+        except TypeError:
+            # bad markup: fail when a request gets it, like without a template
+            parts.append(Hole(entity))
+            return
+    if entity.__class__ is e.Vector and len(entity.es) == 2:
+        key, children = entity.es
+        if _is_literal(key):
+            try:
+                opening, closing = markup.tag(key)
+            except TypeError:
+                parts.append(Hole(entity))
+                return
+            parts.append(opening.encode())
+            if children.__class__ is e.Vector:
+                for child in children.es:
+                    _compile(child, parts)
+            else:
+                parts.append(Hole(children, children=True))
+            parts.append(closing.encode())
+            return
+    parts.append(Hole(entity))
+
+
+class Template:
+    __slots__ = ("function", "parts")
+
+    def __init__(self, function: e.Function, parts: Sequence[Part]):
+        self.function = function
+        self.parts = parts
+
+    def fill(self, runtime: e.Runtime, *args: e.Entity) -> List[Filled]:
+        """Evaluate the holes for a call of the view with `args`; the
+        result is rendered by `iter_bytes`"""
+        function = self.function
+        parent = function.closure if function.closure is not None else runtime.current_frame
+        runtime.push(e.SlotFrame(parent, parent.depth + 1, function, function.layout, args))
+        try:
+            return [
+                part if part.__class__ is bytes else (part, part.expression.evaluate(runtime))
+                for part in self.parts
+            ]
+        finally:
+            runtime.pop()
+
+    @staticmethod
+    def iter_bytes(filled: List[Filled]) -> Iterator[bytes]:
+        for part in filled:
+            if part.__class__ is bytes:
+                yield part
+                continue
+            hole, value = part
+            if hole.children:
+                yield from markup.encode(markup.iter_children_html(value))
+            else:
+                yield from markup.iter_chunks(value)
+
+
+def _merge(parts: List[Part]) -> List[Part]:
+    merged: List[Part] = []
+    for part in parts:
+        if part.__class__ is bytes and merged and merged[-1].__class__ is bytes:
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return merged
+
+
+def compile_view(function: e.Entity) -> Optional[Template]:
+    """The template of a view function, or None if it can't have one"""
+    if not isinstance(function, e.Function) or function.lazy:
+        return None
+    if function.body is None or function.layout is None or list(function.layout.values()) != [0]:
+        return None
+    parts: List[Part] = []
+    _compile(function.body, parts)
+    return Template(function, _merge(parts))
+
+
+def request_wrapper(match_info: Mapping[str, str]) -> e.Function:
+    """What a view gets: a function from an atom to a part of the path"""
+    @e.Function.make("<Request wrapper>")
+    def request_wrapper(rr: e.Runtime, a: e.Atom):
+        return e.String(match_info[a.s])
+    return request_wrapper
+
+
+def render_page(
+    runtime: e.Runtime, view: e.Entity, template: Optional[Template], match_info: Mapping[str, str]
+) -> Iterator[bytes]:
+    """The page of `view` (with its `template`, if any) for a request"""
+    request = request_wrapper(match_info)
+    if template is not None:
+        return markup.coalesce(template.iter_bytes(template.fill(runtime, request)))
+    page = e.SExpr(view, request).evaluate(runtime)
+    return markup.iter_chunks(page)
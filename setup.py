@@ -22,6 +22,9 @@ setuptools.setup(
         "lark-parser>=0.9.0",
         "pytest",
     ],
+    extras_require={
+        "webserver": ["aiohttp>=3.9"],
+    },
     include_package_data=True,
-    python_requires='>=3.6',
+    python_requires='>=3.9',
 )
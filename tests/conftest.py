@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+from tests.utils import run_closures, run_interpreted
+
+
+@pytest.fixture(autouse=True, scope="session")
+def cache_dir(tmp_path_factory):
+    # the parser tables and the AST cache go there instead of ~/.cache,
+    # for the subprocesses too (they inherit the environment)
+    previous = os.environ.get("PYLARKLISPY_CACHE_DIR")
+    os.environ["PYLARKLISPY_CACHE_DIR"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if previous is None:
+        del os.environ["PYLARKLISPY_CACHE_DIR"]
+    else:
+        os.environ["PYLARKLISPY_CACHE_DIR"] = previous
+
+
+@pytest.fixture(params=[run_interpreted, run_closures])
+def run(request):
+    """Run code with the interpreter, then with the closure compiler"""
+    return request.param
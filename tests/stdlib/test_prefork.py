@@ -0,0 +1,113 @@
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+
+from pylarklispy.webserver import prefork
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+
+PROGRAM = """
+(import "$.webserver" :all)
+(defun hello [request] [:p (join "Hello, " (request :name))])
+(server [[:get "/hello/{name}" hello]] "127.0.0.1" 0 [:workers 2])
+"""
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        time.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+def started_workers(log_path):
+    with open(log_path) as file:
+        return [int(pid) for pid in re.findall(r"started worker (\d+)", file.read())]
+
+
+def get(port, name):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/hello/{name}", timeout=5) as response:
+        return response.read().decode()
+
+
+def test_supervisor(tmp_path):
+    program = tmp_path / "app.lisp"
+    program.write_text(PROGRAM)
+    log_path = tmp_path / "stderr.txt"
+    env = dict(os.environ, PYTHONPATH=os.getcwd())
+    with open(log_path, "w") as log:
+        supervisor = subprocess.Popen(
+            [sys.executable, "-m", "pylarklispy", "run", str(program)],
+            stdout=subprocess.PIPE, stderr=log, text=True, env=env,
+        )
+    try:
+        port = int(re.search(r":(\d+) with 2 workers", supervisor.stdout.readline()).group(1))
+        first = wait_for(lambda: len(started_workers(log_path)) >= 2 and started_workers(log_path)[0])
+        assert wait_for(lambda: get(port, "a")) == "<p>Hello, a</p>"
+
+        # a crashed worker is replaced
+        os.kill(first, signal.SIGKILL)
+        wait_for(lambda: len(started_workers(log_path)) == 3)
+        assert get(port, "b") == "<p>Hello, b</p>"
+
+        # a restart replaces every worker
+        supervisor.send_signal(signal.SIGHUP)
+        wait_for(lambda: len(started_workers(log_path)) == 5)
+        wait_for(lambda: log_path.read_text().count("stopped") == 2)
+        assert get(port, "c") == "<p>Hello, c</p>"
+
+        supervisor.send_signal(signal.SIGTERM)
+        assert supervisor.wait(timeout=10) == 0
+        assert log_path.read_text().count("stopped") == 4
+    finally:
+        if supervisor.poll() is None:
+            supervisor.kill()
+            supervisor.wait()
+
+
+def crash(sock):
+    raise RuntimeError("can't start")
+
+
+def test_signals_interrupt_the_respawn_delay(monkeypatch):
+    monkeypatch.setattr(prefork, "RESPAWN_DELAY", 60.0)
+    supervisor = prefork.Supervisor(crash, None, 1)
+    timer = threading.Timer(0.5, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    start = time.monotonic()
+    supervisor.run()
+    assert time.monotonic() - start < 5
+    # the crashed worker wasn't replaced
+    assert not supervisor.workers
+
+
+def test_stop_kills_the_workers_that_dont():
+    ready, ready_w = os.pipe()
+
+    def stubborn(sock):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        os.write(ready_w, b"!")
+        while True:
+            time.sleep(1)
+
+    supervisor = prefork.Supervisor(stubborn, None, 1)
+    try:
+        supervisor.spawn()
+        os.read(ready, 1)
+        start = time.monotonic()
+        supervisor.stop(timeout=0.5)
+        assert time.monotonic() - start < 10
+        assert not supervisor.workers
+    finally:
+        os.close(ready)
+        os.close(ready_w)
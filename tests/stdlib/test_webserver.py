@@ -0,0 +1,243 @@
+import asyncio
+import subprocess
+import sys
+
+import pytest
+
+from pylarklispy import compile_code, image, run_ast
+from pylarklispy.entities import *
+from pylarklispy.webserver import cache, make_app, markup, templates
+from tests.utils import result
+
+
+def test_server_is_made_when_imported():
+    # and aiohttp imported then, see `interop_utils.Lazy`
+    code = (
+        "import sys\n"
+        "from pylarklispy import compile_code, run_ast\n"
+        "from pylarklispy.interop_utils import Lazy\n"
+        "_, runtime = run_ast(compile_code('(import \"$.webserver\" [:only :render])'))\n"
+        "module = runtime.modules['pylarklispy.webserver', '']\n"
+        "print(module.members['server'].__class__ is Lazy, 'aiohttp' in sys.modules)\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.split() == ["True", "False"]
+
+
+def test_render():
+    expr = result("""
+        (import "$.webserver" [:only :render])
+        (render [:ul [[:li "one"]
+                      [[:li [:class "last" :data-n 2]] "two"]
+                      "<br>"]])
+    """)
+    assert expr == String('<ul><li>one</li><li class="last" data-n="2">two</li><br></ul>')
+
+
+def test_attributes_are_escaped():
+    page = result('[[:a [:href "/?a=1&b=\\"2\\"" :title "<x>"]] "link"]')
+    assert markup.render(page) == '<a href="/?a=1&amp;b=&quot;2&quot;" title="&lt;x&gt;">link</a>'
+
+
+def test_bad_markup():
+    with pytest.raises(TypeError):
+        markup.render(result("[:p 42]"))
+    with pytest.raises(TypeError):
+        markup.render(result("[[:p :class] []]"))
+
+
+@pytest.mark.parametrize("page", [
+    r'["p onclick=alert(1)" "x"]',
+    r'["" "x"]',
+    r'["1p" "x"]',
+    r'[[:a [1 "x"]] "link"]',
+    r'[[:a [:href "/" "on click" "z"]] "link"]',
+    r'[[:a ["\"><script>" "x"]] "link"]',
+])
+def test_bad_names(page):
+    with pytest.raises(TypeError, match="Bad (tag|attribute) name"):
+        markup.render(result(page))
+
+
+def test_names():
+    page = result('[["svg:rect" ["xml:lang" "en" "data-x.y_z" 1]] []]')
+    assert markup.render(page) == '<svg:rect xml:lang="en" data-x.y_z="1"></svg:rect>'
+
+
+def test_deep_and_large_markup():
+    page = String("x")
+    for _ in range(10000):
+        page = Vector(Atom("div"), Vector(page))
+    html = markup.render(page)
+    assert html == "<div>" * 10000 + "x" + "</div>" * 10000
+
+    rows = Vector(*(Vector(Atom("li"), String(str(i))) for i in range(20000)))
+    chunks = list(markup.iter_chunks(Vector(Atom("ul"), rows), size=4096))
+    assert len(chunks) > 1
+    assert all(len(chunk) < 2 * 4096 for chunk in chunks)
+    assert b"".join(chunks) == markup.render(Vector(Atom("ul"), rows)).encode()
+
+
+def get(app, *paths):
+    from aiohttp.test_utils import TestClient, TestServer
+
+    async def get_all():
+        async with TestClient(TestServer(app)) as client:
+            responses = []
+            for path in paths:
+                response = await client.get(path)
+                responses.append((response.status, response.content_type, await response.text()))
+            return responses
+
+    return asyncio.run(get_all())
+
+
+@pytest.mark.parametrize("pool", [None, "threads", "processes"])
+def test_route(pool):
+    route_table, runtime = run_ast(compile_code("""
+        (defun hello [request] [:p (join "Hello, " (request :name))])
+        [[:get "/hello/{name}" hello]
+         [:get "/bye/{name}" (fun [request] (join "Bye, " (request :name)))]]
+    """))
+    app = make_app(runtime, route_table, pool=pool, pool_size=2)
+    assert get(app, "/hello/world", "/bye/you") == [
+        (200, "text/html", "<p>Hello, world</p>"),
+        (200, "text/html", "Bye, you"),
+    ]
+
+
+def test_workers_have_their_own_runtime():
+    route_table, runtime = run_ast(compile_code("""
+        (define ref (interop "pylarklispy.ref"))
+        (define count ((ref :make) 0))
+        (defun counter [request]
+            (do ((ref :set!) count (+ ((ref :get!) count) 1))
+                (format ((ref :get!) count))))
+        [[:get "/" counter]]
+    """))
+    app = make_app(runtime, route_table, pool="threads", pool_size=1)
+    assert [text for _, _, text in get(app, "/", "/", "/")] == ["1", "2", "3"]
+    # the server's runtime is left alone
+    assert run_ast(compile_code("((ref :get!) count)"), runtime=runtime)[0] == Integer(0)
+
+
+def test_pool_with_an_unpicklable_runtime():
+    route_table, runtime = run_ast(compile_code('[[:get "/" (fun [request] "hi")]]'))
+    runtime.global_names["local"] = Function("local", lambda runtime: NIL)
+    with pytest.raises(image.ImageError, match="pool of threads.*`local`"):
+        make_app(runtime, route_table, pool="threads")
+
+
+def test_server_options():
+    from pylarklispy.webserver import server_options
+    assert server_options(result("[:pool :threads :pool-size 4]")) == {
+        "pool": Atom("threads"), "pool-size": Integer(4)
+    }
+    with pytest.raises(ValueError):
+        server_options(result("[:poll :threads]"))
+    with pytest.raises(TypeError):
+        server_options(result('[:pool-size "4"]'))
+
+
+REQUEST = Function("<Request wrapper>", lambda runtime, key: String(key.s.upper()))
+
+
+@pytest.mark.parametrize("view, holes", [
+    ('(fun [request] [:p "static"])', 0),
+    ('(fun [request] [:html [[:head [[:title "T"]]] [:p (join "Hi " (request :name))]]])', 1),
+    ('(fun [request] [[:a [:href (request :url)]] "link"])', 1),
+    ('(fun [request] [:ul (map (fun [x] [:li x]) [(request :a) "b"])])', 1),
+    ('(fun [request] (if (request :x) [:p "x"] [:p "y"]))', 1),
+    ('(fun [request] (let [x (request :x)] [:p x]))', 1),
+    ('(do (defun make [prefix] (fun [request] [:div [[:p prefix] [:p (request :y)]]])) (make "pre"))', 2),
+])
+def test_template(view, holes):
+    view, runtime = run_ast(compile_code('(import "$.functools" [:only :map])' + view))
+    template = templates.compile_view(view)
+    assert sum(isinstance(part, templates.Hole) for part in template.parts) == holes
+    expected = markup.render(SExpr(view, REQUEST).evaluate(runtime))
+    assert b"".join(template.iter_bytes(template.fill(runtime, REQUEST))).decode() == expected
+
+
+def test_template_bad_markup():
+    view, runtime = run_ast(compile_code('(fun [request] [:div [[:p 42] [:p (request :x)]]])'))
+    template = templates.compile_view(view)
+    with pytest.raises(TypeError):
+        list(template.iter_bytes(template.fill(runtime, REQUEST)))
+
+
+def test_no_template():
+    assert templates.compile_view(result("(fun [a b] [:p a])")) is None
+    assert templates.compile_view(result("format")) is None
+
+
+def test_response_cache_ttl_and_lru():
+    now = [0.0]
+    response_cache = cache.ResponseCache(ttl=10, max_entries=2, clock=lambda: now[0])
+    assert response_cache.get("a") is None
+    response_cache.put("a", b"A")
+    response_cache.put("b", b"B")
+    assert response_cache.get("a").body == b"A"
+    # "b" is the least recently used
+    response_cache.put("c", b"C")
+    assert response_cache.get("b") is None
+    assert response_cache.get("c").body == b"C"
+    now[0] = 10
+    assert response_cache.get("a") is None
+    assert response_cache.stats() == {"hits": 2, "misses": 3, "entries": 1}
+
+
+def test_etags():
+    tag = cache.etag(b"page")
+    assert tag == cache.etag(b"page") != cache.etag(b"other page")
+    assert cache.matches(tag, tag)
+    assert cache.matches(f'"x", W/{tag}', tag)
+    assert cache.matches("*", tag)
+    assert not cache.matches(None, tag)
+    assert not cache.matches('"x"', tag)
+
+
+@pytest.mark.parametrize("pool", [None, "threads"])
+def test_cached_route(pool):
+    from aiohttp.test_utils import TestClient, TestServer
+    from pylarklispy.webserver import response_caches
+
+    route_table, runtime = run_ast(compile_code("""
+        (define ref (interop "pylarklispy.ref"))
+        (define count ((ref :make) 0))
+        (defun item [request]
+            (do ((ref :set!) count (+ ((ref :get!) count) 1))
+                [:p (join (request :id) " " (format ((ref :get!) count)))]))
+        [[:get "/item/{id}" item [:ttl 60 :max-entries 10]]]
+    """))
+    app = make_app(runtime, route_table, pool=pool, pool_size=1)
+
+    async def requests():
+        async with TestClient(TestServer(app)) as client:
+            responses = []
+            for path, headers in [("/item/a", {}), ("/item/a", {}), ("/item/b", {})]:
+                response = await client.get(path, headers=headers)
+                responses.append((response.headers["X-Cache"], await response.text()))
+            etag = (await client.get("/item/a")).headers["ETag"]
+            not_modified = await client.get("/item/a", headers={"If-None-Match": etag})
+            responses.append((not_modified.status, await not_modified.text()))
+            return responses
+
+    assert asyncio.run(requests()) == [
+        ("MISS", "<p>a 1</p>"),
+        ("HIT", "<p>a 1</p>"),
+        ("MISS", "<p>b 2</p>"),
+        (304, ""),
+    ]
+    assert response_caches(app)["GET /item/{id}"].stats() == {"hits": 3, "misses": 2, "entries": 2}
+
+
+def test_bad_route_options():
+    route_table, runtime = run_ast(compile_code('(defun v [r] "") [[:get "/" v [:ttl "60"]]]'))
+    with pytest.raises(TypeError):
+        make_app(runtime, route_table)
+    route_table, runtime = run_ast(compile_code('(defun v [r] "") [[:get "/" v [:tll 60]]]'))
+    with pytest.raises(ValueError):
+        make_app(runtime, route_table)
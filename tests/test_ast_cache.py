@@ -0,0 +1,62 @@
+import os
+
+import pytest
+from pylarklispy import ast_cache, compile_code
+from pylarklispy.entities import *
+from tests.test_parser import FULL_EXAMPLE
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYLARKLISPY_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_round_trip():
+    statements = compile_code(FULL_EXAMPLE + "(numbers 1 -2 3)")
+    decoded = [ast_cache.decode(ast_cache.encode(s)) for s in statements]
+    assert decoded == list(statements)
+
+
+def test_hit_and_miss():
+    code = "(+ 1 2) [:a {:b &c}]"
+    statements, hit = ast_cache.compile_code_cached(code)
+    assert not hit
+    assert statements == list(compile_code(code))
+    cached, hit = ast_cache.compile_code_cached(code)
+    assert hit
+    assert cached == statements
+
+
+def test_changed_source_misses():
+    ast_cache.compile_code_cached("(+ 1 2)")
+    statements, hit = ast_cache.compile_code_cached("(+ 1 3)")
+    assert not hit
+    assert statements == [SExpr(Name("+"), Integer(1), Integer(3))]
+
+
+def test_corrupt_entry_is_a_miss(cache_dir):
+    code = "(+ 1 2)"
+    (cache_dir / ast_cache.cache_key(code)).write_bytes(b"garbage")
+    statements, hit = ast_cache.compile_code_cached(code)
+    assert not hit
+    assert statements == [SExpr(Name("+"), Integer(1), Integer(2))]
+
+
+def test_too_deep_to_store(cache_dir):
+    statement = Vector()
+    for _ in range(100000):
+        statement = Vector(statement)
+    ast_cache.store(ast_cache.cache_key("deep"), [statement])
+    assert list(cache_dir.iterdir()) == []
+
+
+def test_oldest_entries_are_pruned(cache_dir, monkeypatch):
+    monkeypatch.setattr(ast_cache, "MAX_ENTRIES", 3)
+    (cache_dir / "grammar.lark.tables").write_bytes(b"not an entry")
+    keys = [ast_cache.cache_key(f"(+ 1 {n})") for n in range(5)]
+    for n, key in enumerate(keys):
+        ast_cache.store(key, [Integer(n)])
+        os.utime(cache_dir / key, (n, n))
+    assert sorted(path.name for path in cache_dir.iterdir()) == sorted(keys[2:] + ["grammar.lark.tables"])
+    assert ast_cache.load(keys[4]) == [Integer(4)]
@@ -0,0 +1,55 @@
+import gc
+import tracemalloc
+
+import pytest
+
+from pylarklispy import bif, compile_closures, compile_code, run_ast, run_compiled
+from pylarklispy.entities import *
+
+
+def test_closures(run):
+    assert run("""
+        (defun adder [a] (let [unused [1 2 3]] (fun [b] (fun [c] (+ a b c)))))
+        (((adder 1) 10) 100)
+    """) == Integer(111)
+
+
+def test_closure_in_loop(run):
+    assert run("""
+        (defun powers [base n]
+            (loop [1 0] (fun [acc i]
+                (if (= i n) [:return acc] [:next (* acc base) (+ i 1)]))))
+        (powers 2 10)
+    """) == Integer(1024)
+
+
+@pytest.mark.parametrize("compiled", [False, True], ids=["interpreted", "compiled"])
+def test_closure_does_not_keep_temporaries(compiled):
+    # `big` is a local of `make`, but the closure doesn't use it
+    code = """
+        (defun make [big] (let [size 1] (fun [x] (+ x size))))
+        (define keep (make (big!)))
+        (keep 1)
+    """
+    runtime = Runtime(bif.index)
+    runtime.global_names["big!"] = Function(
+        "big!",
+        lambda runtime: Vector(*(String(str(i) * 10) for i in range(100000)))
+    )
+    statements = compile_code(code)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        if compiled:
+            result, _ = run_compiled(compile_closures(statements, runtime=runtime), runtime=runtime)
+        else:
+            result, _ = run_ast(statements, runtime=runtime)
+        gc.collect()
+        after, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert result == Integer(2)
+    assert "keep" in runtime.global_names
+    assert peak - before > 10_000_000  # the vector was there
+    assert after - before < 1_000_000  # and the closure doesn't keep it
@@ -0,0 +1,99 @@
+import pytest
+from pylarklispy import bif, compile_closures, compile_code, run_compiled
+from pylarklispy import entities as e
+from tests.utils import compiled_result, result
+
+
+PROGRAMS = [
+    """
+    (define bool (fun [x] :True))
+    [(if 0 :yes :no) (and 0 1) (or 0)]
+    """,
+    """
+    (define x (+ 31 10 1))
+    (define y (* x 2 5))
+    (- y (+ x 4))
+    """,
+    """
+    (defun id [x] x)
+    (id :hello!)
+    """,
+    """
+    [(if 1 :one :not-one)
+     (if 0 :zero :not-zero)]
+    """,
+    """
+    (defun sigil<!> [s] (join "!!!" s "!!!"))
+    ~!"attention"
+    """,
+    """
+    (defun factorial [n]
+        (loop [1 n]
+            (fun [acc x]
+                (if x
+                    [:next   (* acc x) (- x 1)]
+                    [:return acc]))))
+    (factorial 10)
+    """,
+    """
+    (defun fib [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+    (fib 12)
+    """,
+    """
+    (defun adder [n] (fun [x] (+ x n)))
+    (define add5 (adder 5))
+    [(add5 1) (add5 10)]
+    """,
+    """
+    (let [a 1, b 2]
+        (let [c (+ a b)]
+            [a b c]))
+    """,
+    """
+    [(and 1 :yes "") (and 1 2) (or 0 "" []) (or 0 :x) (do) (do 1 2 3)]
+    """,
+    """
+    (define users [:alice [:name "Alice" :age 19]])
+    [(/> users [:alice :age]) (users :alice) (>= 2 2) (not 0)]
+    """,
+    """
+    (import "$.sigils" :all)
+    (~f"I am %(name)." [:name "Alice"])
+    """,
+]
+
+
+@pytest.mark.parametrize("program", PROGRAMS)
+def test_same_as_interpreter(program):
+    assert compiled_result(program) == result(program)
+
+
+def test_redefined_special_form():
+    # special forms must not be used once the name is rebound
+    expr = compiled_result("""
+        (defun f [] (if 1 2 3))
+        (define if (fun [a b c] c))
+        [(if 1 2 3) (f)]
+    """)
+    assert expr == e.Vector(e.Integer(3), e.Integer(3))
+
+
+def test_redefined_bool_in_another_runtime():
+    # the compiled `if` looks `bool` up with a cache shared by all the code
+    a = e.Runtime(bif.index)
+    b = e.Runtime(bif.index)
+    b.global_names["bool"] = e.Function("bool", lambda r, x: e.FALSE)
+    b.global_names.version = a.global_names.version
+    codes = compile_closures(compile_code("(if 1 2 3)"))
+    assert run_compiled(codes, runtime=a)[0] == e.Integer(2)
+    assert run_compiled(codes, runtime=b)[0] == e.Integer(3)
+    assert run_compiled(codes, runtime=a)[0] == e.Integer(2)
+
+
+def test_compiled_function_body():
+    expr = compiled_result("""
+        (defun double [x] (+ x x))
+        double
+    """)
+    assert isinstance(expr, e.Function)
+    assert expr.name == "double"
@@ -0,0 +1,73 @@
+import random
+import lark
+import pytest
+from pylarklispy import compile_code
+from pylarklispy.fast_reader import ReaderError
+from tests.test_parser import FULL_EXAMPLE
+
+# differential tests: the fast reader must agree with the Lark grammar
+
+
+def assert_same(code):
+    try:
+        expected = compile_code(code)
+    except lark.LarkError:
+        with pytest.raises(ReaderError):
+            compile_code(code, fast=True)
+    else:
+        assert compile_code(code, fast=True) == expected
+
+
+@pytest.mark.parametrize("code", [
+    FULL_EXAMPLE,
+    "",
+    "  ; only a comment",
+    "() [] {} &() &&[x]",
+    "0 -0 +0 12 -34 +56 007 5abc -5x",
+    "+ - +a -b a-5 <= /> ok? !x_y%z",
+    ": a & b ~ r \"s\" ~r\"t\"",
+    r'"esc\"aped" "back\\slash" "ф" "a;b" "(" ";"',
+    "a,b,,c\n;x\n(d\t\f\re)",
+    # errors
+    "(", ")", "(]", "[)", "&", ":", ":5", ":-a", "~r", "~r 5", "~5 \"x\"",
+    "#", "a.b", '"abc', '"multi\nline"', '"tab\there"', "(a &)", "{a b", "{a}",
+])
+def test_examples(code):
+    assert_same(code)
+
+
+@pytest.mark.parametrize("code", [
+    "(", "a.b", "{a}", "[{:a}]", r'"\x"', r'~r"\q"', r'"\u12"',
+])
+def test_bad_input_is_a_lark_error(code):
+    # from either reader, syntax errors and bad literals alike
+    for fast in (False, True):
+        with pytest.raises(lark.LarkError):
+            compile_code(code, fast=fast)
+
+
+ATOMS = ["x", "-", "+", "a-b", "<=", "0", "-12", "+7", ":kw", '"s"', r'"q\"x"', "~r\"re\""]
+
+
+def random_expr(rng, depth):
+    roll = rng.random()
+    if depth > 4 or roll < 0.5:
+        return rng.choice(ATOMS)
+    if roll < 0.6:
+        return "&" + random_expr(rng, depth + 1)
+    opener, closer = rng.choice(["()", "[]", "{}"])
+    items = [random_expr(rng, depth + 1) for _ in range(rng.randrange(4))]
+    if opener == "{" and len(items) % 2 != 0:
+        items.pop()
+    return opener + rng.choice([" ", ",", "\n", " ; c\n"]).join(items) + closer
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_programs(seed):
+    rng = random.Random(seed)
+    code = " ".join(random_expr(rng, 0) for _ in range(10))
+    assert_same(code)
+    # and some broken versions of it
+    for _ in range(5):
+        cut = rng.randrange(len(code) + 1)
+        assert_same(code[:cut])
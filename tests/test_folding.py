@@ -0,0 +1,93 @@
+from pylarklispy import bif, compile_code, prepare
+from pylarklispy.entities import *
+
+
+def fold(code, runtime=None):
+    runtime = runtime or Runtime(bif.index)
+    [statement] = compile_code(code)
+    return prepare(statement, runtime)
+
+
+def test_arithmetic():
+    folded = fold("(+ 1 (* 2 3))")
+    assert isinstance(folded, Folded)
+    assert folded.value == Integer(7)
+    assert dict(folded.assumptions) == {"+": bif.index["+"], "*": bif.index["*"]}
+
+
+def test_literal_vectors_and_maps_are_final():
+    runtime = Runtime(bif.index)
+    vector = fold("[1 [:a &b] \"c\"]")
+    assert vector.evaluate(runtime) is vector
+    map_ = fold("{:a 1 :b [2]}")
+    assert map_.evaluate(runtime) is map_
+    assert map_.table.get(Atom("b")) == Vector(Integer(2))
+
+
+def test_folded_vector_of_calls():
+    folded = fold("[(+ 1 2) 4]")
+    assert isinstance(folded, Folded)
+    assert folded.value == Vector(Integer(3), Integer(4))
+
+
+def test_macro_expansion_is_folded():
+    folded = fold("(not 0)")
+    assert isinstance(folded, Folded)
+    assert folded.value is TRUE
+    assert dict(folded.assumptions) == {"bool": bif.index["bool"]}
+    assert fold("(>= 2 1)").evaluate(Runtime(bif.index)) is TRUE
+
+
+def test_not_folded():
+    assert isinstance(fold("(print! 1)"), SExpr)  # not pure
+    assert isinstance(fold("(+ 1 x)"), SExpr)  # not constant
+    assert isinstance(fold('(+ 1 "a")'), SExpr)  # fails, left to the run time
+    assert isinstance(fold("(fun [x] (+ 1 2))").es[2], Folded)  # inside a body
+
+
+def test_unbounded_calls_are_not_folded():
+    assert isinstance(fold("(** 10 10000000000)"), SExpr)
+    assert isinstance(fold("(* (** 2 65536) (** 2 65536))"), SExpr)
+    assert fold("(** 2 100)").value == Integer(2 ** 100)
+    assert fold("(** 1 10000000000)").value == Integer(1)
+    # not even in a branch that's never taken
+    folded = fold("(if :False (** 10 10000000000) 0)")
+    assert isinstance(folded.es[2], SExpr)
+
+
+def test_sigil_string():
+    runtime = Runtime(bif.index)
+    fold('(import "$.sigils" :all)', runtime).evaluate(runtime)
+    folded = fold('~%"%!"', runtime)
+    assert isinstance(folded, Folded)
+    assert isinstance(folded.value, Function)
+    assert fold('(~%"%!" "hi")', runtime).evaluate(runtime) == String("hi!")
+
+
+def test_redefined_function(run):
+    assert run("""
+        (defun f [] (+ 1 2))
+        (define + (fun [a b] (* a b)))
+        (f)
+    """) == Integer(2)
+
+
+def test_redefined_function_inside_a_vector_and_a_map(run):
+    assert run("""
+        (defun f [x] [x (+ 1 2) {:sum (+ 3 4)}])
+        (define + (fun [a b] 42))
+        (f 0)
+    """) == run("[0 42 {:sum 42}]")
+
+
+def test_redefined_bool(run):
+    assert run("""
+        (define bool (fun [x] :True))
+        (defun f [] (not 0))
+        (f)
+    """) is FALSE
+    assert run("""
+        (defun f [] (not 0))
+        (define bool (fun [x] :True))
+        (f)
+    """) is FALSE
@@ -0,0 +1,106 @@
+import io
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pylarklispy import bif, compile_code, image, run_ast
+from pylarklispy.entities import *
+
+
+PRELUDE = """
+(define ref (interop "pylarklispy.ref"))
+(import "$.functools" :all)
+(define var ((ref :make) 41))
+(define lst (+> 1 (+> 2 emp)))
+(defun adder [a] (fun [b] (+ a b)))
+(define add2 (adder 2))
+(define m {:a 1 "b" 2})
+(defmacro unless [c x] (form &if c &:Nil x))
+(defun fib [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+"""
+
+CHECK = """
+((ref :set!) var 42)
+[(add2 40) ((ref :get!) var) (m :a) (m "b")
+ (lhead (lrest lst)) (emp? (lrest (lrest lst))) (unless 0 :ok) (fib 15)]
+"""
+
+EXPECTED = Vector(
+    Integer(42), Integer(42), Integer(1), Integer(2),
+    Integer(2), TRUE, Atom("ok"), Integer(610),
+)
+
+
+def save(runtime: Runtime) -> bytes:
+    file = io.BytesIO()
+    image.save(runtime, file)
+    return file.getvalue()
+
+
+def test_round_trip():
+    _, runtime = run_ast(compile_code(PRELUDE))
+    loaded = image.load(io.BytesIO(save(runtime)))
+    assert loaded is not runtime
+    assert run_ast(compile_code(CHECK), runtime=loaded)[0] == EXPECTED
+    # the built-ins are the same objects, so the special forms still apply
+    assert loaded.global_names["if"] is bif.index["if"]
+
+
+def test_image_is_independent():
+    _, runtime = run_ast(compile_code(PRELUDE))
+    data = save(runtime)
+    first = image.load(io.BytesIO(data))
+    second = image.load(io.BytesIO(data))
+    run_ast(compile_code("((ref :set!) var 0) (define m 0)"), runtime=first)
+    assert run_ast(compile_code("[((ref :get!) var) (m :a)]"), runtime=second)[0] == Vector(Integer(41), Integer(1))
+
+
+def test_load_in_another_process(tmp_path):
+    # the hashes of strings differ between processes
+    _, runtime = run_ast(compile_code('(define m {"a" 1 "b" 2 :c 3}) (defun f [x] (m x))'))
+    path = tmp_path / "test.image"
+    path.write_bytes(save(runtime))
+    code = (
+        "from pylarklispy import compile_code, image, run_ast\n"
+        f"runtime = image.load(open({str(path)!r}, 'rb'))\n"
+        "print(run_ast(compile_code('[(f \"a\") (f \"b\") (f :c)]'), runtime=runtime)[0])\n"
+    )
+    env = dict(os.environ, PYTHONHASHSEED="12345")
+    output = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "[1 2 3]"
+
+
+def test_not_an_image():
+    with pytest.raises(image.ImageError):
+        image.load(io.BytesIO(b"(define x 1)\n"))
+    with pytest.raises(image.ImageError):
+        image.load(io.BytesIO(image.MAGIC + b"999\n"))
+
+
+def test_save_between_statements_only():
+    runtime = Runtime(bif.index)
+    runtime.global_names["save!"] = Function("save!", lambda runtime: String(str(len(save(runtime)))))
+    with pytest.raises(image.ImageError):
+        run_ast(compile_code("(defun f [] (save!)) (f)"), runtime=runtime)
+
+
+def test_sigils():
+    _, runtime = run_ast(compile_code(
+        '(import "$.sigils") (define greet ~%"Hello %!") (define who ~f"%(name)?")'
+    ))
+    loaded = image.load(io.BytesIO(save(runtime)))
+    code = '[(greet "world") (who {:name "me"})]'
+    assert run_ast(compile_code(code), runtime=loaded)[0] == Vector(String("Hello world!"), String("me?"))
+
+
+def test_unpicklable_value():
+    runtime = Runtime(bif.index)
+    runtime.global_names["local"] = Function("local", lambda runtime: NIL)
+    with pytest.raises(image.ImageError, match="`local`"):
+        save(runtime)
+    with pytest.raises(image.ImageError, match="`local`"):
+        image.snapshot(runtime)
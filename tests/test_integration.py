@@ -115,4 +115,40 @@ def test_import():
         (import "$.functools" [:only :map])
         (map (fun [x] (+ x 1)) [1 2 3])
     """)
-    assert expr2 == result('[2 3 4]')
\ No newline at end of file
+    assert expr2 == result('[2 3 4]')
+
+def test_map_literal():
+    expr = result("""
+        (define config {:host "localhost", :port (+ 8000 80)})
+        [(config :port) (config :user) (config :user :host)]
+    """)
+    assert expr == result('[8080 :Nil "localhost"]')
+
+
+def test_map_add_remove_keys():
+    expr = result("(-= (+= {:hello 1, :world 2} {:world 41, :bbb 42}) [:hello])")
+    assert expr == result("{:world 41, :bbb 42}")
+    assert expr == result("{:bbb 42, :world 41}")
+
+
+def test_map_xpath():
+    expr = result("""
+        (define users {:alice {:name "Alice", :age 19}
+                       :bob   [:name "Bob", :age 50]})
+        [(/> users [:alice :age]) (/> users [:bob :age])]
+    """)
+    assert expr == result("[19 50]")
+
+
+def test_map_bool():
+    assert result("[(bool {}) (bool {:a 1})]") == result("[:False :True]")
+
+
+def test_append_concat():
+    expr = result("""
+        (defun range-to [n acc]
+            (if (= n 0) acc (range-to (- n 1) (slice= acc 0 0 [n]))))
+        (define v (append (range-to 3 []) 4 5))
+        [v (concat v [6] []) (slice v 1 3)]
+    """)
+    assert expr == result("[[1 2 3 4 5] [1 2 3 4 5 6] [2 3]]")
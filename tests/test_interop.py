@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pytest
+
+from pylarklispy import bif, compile_code, run_ast
+from pylarklispy.entities import *
+
+
+MODULE = """
+from pylarklispy import entities as e
+from pylarklispy.interop_utils import Index
+
+loads = []
+made = []
+
+def interop(runtime):
+    loads.append(runtime)
+    index = Index()
+
+    @index.add_function("version")
+    def _(r):
+        return e.Integer({version})
+
+    @index.add_lazy("cheap")
+    def _():
+        made.append("cheap")
+        return e.String("cheap")
+
+    @index.add_lazy("expensive")
+    def _():
+        made.append("expensive")
+        return e.String("expensive")
+
+    return index
+"""
+
+
+@pytest.fixture
+def module_file(tmp_path):
+    path = tmp_path / "my_module.py"
+    path.write_text(MODULE.format(version=1))
+    return str(path)
+
+
+def python_module(path: str):
+    return bif._python_modules["my_module", path][1]
+
+
+def test_interop_from_file(module_file):
+    value, _ = run_ast(compile_code(f'(((interop "my_module" "{module_file}") :version))'))
+    assert value == Integer(1)
+
+
+def test_module_is_loaded_once(module_file):
+    runtime = Runtime(bif.index)
+    first = bif.load_module(runtime, "my_module", module_file)
+    assert bif.load_module(runtime, "my_module", module_file) is first
+    assert python_module(module_file).loads == [runtime]
+    # another runtime gets its own members from the same Python module
+    other = Runtime(bif.index)
+    assert bif.load_module(other, "my_module", module_file) is not first
+    assert python_module(module_file).loads == [runtime, other]
+
+
+def test_module_is_loaded_again_when_changed(module_file):
+    runtime = Runtime(bif.index)
+    code = compile_code(f'(((interop "my_module" "{module_file}") :version))')
+    assert run_ast(code, runtime=runtime)[0] == Integer(1)
+    with open(module_file, "w") as file:
+        file.write(MODULE.format(version=2))
+    stat = os.stat(module_file)
+    os.utime(module_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert run_ast(code, runtime=runtime)[0] == Integer(2)
+
+
+def test_lazy_members(module_file):
+    runtime = Runtime(bif.index)
+    module = bif.load_module(runtime, "my_module", module_file)
+    made = python_module(module_file).made
+    assert made == []
+    assert module.member("cheap") == String("cheap")
+    assert module.member("cheap") is module.member("cheap")
+    assert made == ["cheap"]
+
+
+@pytest.mark.parametrize("param, imported", [
+    ("[:only :cheap]", ["cheap"]),
+    ("[:except :expensive]", ["version", "cheap"]),
+    (":all", ["version", "cheap", "expensive"]),
+])
+def test_import_makes_imported_members_only(tmp_path, monkeypatch, param, imported):
+    name = "lazy_" + tmp_path.name.replace("-", "_").replace("[", "_").replace("]", "_")
+    (tmp_path / f"{name}.py").write_text(MODULE.format(version=1))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    runtime = Runtime(bif.index)
+    value, _ = run_ast(compile_code(f'(import "{name}" {param})'), runtime=runtime)
+    assert [key.s for key, _ in value.pairs()] == imported
+    made = sys.modules[name].made
+    assert made == [member for member in imported if member != "version"]
+    # importing again doesn't load the module or make anything again
+    run_ast(compile_code(f'(import "{name}" {param})'), runtime=runtime)
+    assert sys.modules[name].loads == [runtime]
+    assert made == [member for member in imported if member != "version"]
@@ -0,0 +1,95 @@
+import pytest
+
+from pylarklispy import bif, compile_code, jit, prepare
+from pylarklispy.entities import *
+
+PROGRAMS = {
+    "(fib 20)": (
+        "(defun fib [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))",
+        Integer(6765)
+    ),
+    "(sum-to 100000 0)": (
+        "(defun sum-to [n acc] (if (= n 0) acc (sum-to (- n 1) (+ acc n))))",
+        Integer(5000050000)
+    ),
+    "(fact 25)": (
+        "(defun fact [n] (loop [1 n] (fun [acc x] "
+        "(if (<= x 1) [:return acc] [:next (* acc x) (- x 1)]))))",
+        Integer(15511210043330985984000000)
+    ),
+    "(even? 1001)": (
+        "(defun even? [n] (let [half (- n 1)] (if (and (> n 0) (not (= n 1))) "
+        "(even? (- half 1)) (= n 0))))",
+        FALSE
+    ),
+}
+
+
+@pytest.fixture(params=[True, False], ids=["jit", "no-jit"])
+def enabled(request, monkeypatch):
+    monkeypatch.setattr(jit, "enabled", request.param)
+    return request.param
+
+
+@pytest.mark.parametrize("call", PROGRAMS)
+def test_same_results(run, enabled, call):
+    definition, expected = PROGRAMS[call]
+    assert run(f"{definition} {call}") == expected
+
+
+def translate(definition, arity):
+    runtime = Runtime(bif.index)
+    [statement] = compile_code(definition)
+    prepare(statement, runtime).evaluate(runtime)
+    [name] = set(runtime.global_names) - set(bif.index)
+    function = runtime.global_names[name]
+    return jit.compile_function(function.fn, arity, function.body, runtime.global_names), runtime
+
+
+def test_translate():
+    entry, runtime = translate(PROGRAMS["(fib 20)"][0], 1)
+    assert entry is not None
+    assert entry(runtime, (Integer(20),)) == Integer(6765)
+    # not integers: left to the interpreter
+    assert entry(runtime, (String("20"),)) is None
+
+
+def test_unsupported():
+    entry, _ = translate('(defun greet [n] (do (print! "hi") n))', 1)
+    assert entry is None
+    entry, _ = translate("(defun first [v] (at v 0))", 1)
+    assert entry is None
+
+
+def test_redefined_builtin(run):
+    definition, _ = PROGRAMS["(fib 20)"]
+    # the JIT has taken over by the time `+` changes
+    assert run(f"{definition} (fib 15) (define + (fun [a b] 1)) (fib 15)") == Integer(1)
+
+
+def test_called_with_other_types(run):
+    code = (
+        "(defun same? [a b] (= a b))"
+        "(loop [0] (fun [i] (if (< i 100) (do (same? i i) [:next (+ i 1)]) [:return i])))"
+        '(same? "a" "a")'
+    )
+    assert run(code) is TRUE
+
+
+def test_disabled(run, monkeypatch):
+    def fail(*args):
+        raise AssertionError("the JIT is disabled")
+    monkeypatch.setattr(jit, "enabled", False)
+    monkeypatch.setattr(jit, "compile_function", fail)
+    definition, expected = PROGRAMS["(fib 20)"]
+    assert run(f"{definition} (fib 20)") == expected
+
+
+@pytest.mark.parametrize("call", PROGRAMS)
+def test_programs_are_translated(call):
+    definition, expected = PROGRAMS[call]
+    arity = call.count(" ")
+    entry, runtime = translate(definition, arity)
+    assert entry is not None
+    args = tuple(Integer(int(arg)) for arg in call.strip("()").split()[1:])
+    assert entry(runtime, args) == expected
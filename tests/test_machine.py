@@ -0,0 +1,95 @@
+import pytest
+
+from pylarklispy import bif, compile_code, machine, prepare, run_ast, run_machine
+from pylarklispy.entities import *
+
+PROGRAMS = [
+    "(+ 1 (* 2 3))",
+    "[(if 1 :one :not-one) (if 0 :zero :not-zero) (and 1 :True) (or 0 [])]",
+    "(defun fib [n] (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (fib 15)",
+    "(let [x 1] (let [x 10 y (+ x 1)] [x y]))",
+    "(define f (fun [x] (fun [y] (+ x y)))) ((f 1) 2)",
+    "(loop [0 1] (fun [i acc] (if (>= i 10) [:return acc] [:next (+ i 1) (* acc 2)])))",
+    '(do (define m {:a 1 "b" [2 3]}) [(m :a) (m "b") (at [4 5 6] 1) (not 0)])',
+    "(defmacro unless [cond x] (form &if cond &:Nil x)) (unless 0 :yes)",
+    "(call (fun [a b] (- a b)) [10 3])",
+    '(import "$.sigils" :all) (~%"% apples" (+ 1 2))',
+]
+
+
+@pytest.mark.parametrize("code", PROGRAMS)
+def test_same_results(code):
+    assert run_machine(compile_code(code))[0] == run_ast(compile_code(code))[0]
+
+
+def test_deep_recursion():
+    # not a tail call: every level waits for the next one
+    code = """
+        (defun count [n] (if (= n 0) 0 (+ 1 (count (- n 1)))))
+        (count 100000)
+    """
+    assert run_machine(compile_code(code))[0] == Integer(100000)
+
+
+def nesting(vector):
+    depth = 0
+    while isinstance(vector, Vector):
+        [vector] = vector.es
+        depth += 1
+    return depth, vector
+
+
+@pytest.mark.parametrize("run", [run_machine, run_ast])
+def test_deeply_nested_data(run):
+    # the passes run before the machine (see `prepare`) too
+    code = "[" * 100000 + "{:a 1}" + "]" * 100000
+    depth, innermost = nesting(run(compile_code(code))[0])
+    assert depth == 100000
+    assert dict(innermost.table.items()) == {Atom("a"): Integer(1)}
+
+
+def test_deeply_nested_expressions():
+    vector = SExpr(GlobalName("+"), Integer(0), Integer(1))
+    for _ in range(100000):
+        vector = Vector(vector)
+    result = machine.evaluate(vector, Runtime(bif.index))
+    assert nesting(result) == (100000, Integer(1))
+
+
+def test_tail_calls_run_in_constant_space():
+    runtime = Runtime(bif.index)
+    code = """
+        (defun count [n acc] (if (= n 0) acc (count (- n 1) (+ acc 1))))
+        (count 5000 0)
+    """
+    *definitions, call = compile_code(code)
+    run_machine(definitions, runtime=runtime)
+    m = machine.Machine(prepare(call, runtime), runtime)
+    sizes = set()
+    while not m.run(steps=50):
+        sizes.add(len(m.continuation))
+    assert m.result == Integer(5000)
+    assert max(sizes) < 10
+
+
+def test_suspend_and_resume():
+    runtime = Runtime(bif.index)
+    printed = []
+    runtime.global_names["print!"] = Function("print!", lambda runtime, x: printed.append(x) or NIL)
+    [statement] = compile_code("(do (print! 1) (print! 2) (print! 3))")
+    m = machine.Machine(prepare(statement, runtime), runtime)
+    steps = 0
+    while not m.run(steps=1):
+        steps += 1
+        # nothing is left on the stack of the runtime between steps
+        assert runtime.stack == [runtime.global_frame]
+    assert printed == [Integer(1), Integer(2), Integer(3)]
+    assert steps > 3
+    assert m.result is NIL
+
+
+def test_errors():
+    with pytest.raises(ValueError):
+        run_machine(compile_code("(defun f [x] x) (f 1 2)"))
+    with pytest.raises(KeyError):
+        run_machine(compile_code("(+ 1 undefined)"))
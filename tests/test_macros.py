@@ -0,0 +1,79 @@
+import pytest
+from pylarklispy import bif, compile_code, macros
+from pylarklispy import entities
+from pylarklispy.entities import *
+
+
+def expand(code):
+    [statement] = compile_code(code)
+    return macros.expand(statement, Runtime(bif.index))
+
+
+def test_builtin_expansions():
+    assert expand("(not x)") == SExpr(bif.index["if"], Name("x"), FALSE, TRUE)
+    assert expand("(>= x 1)") == SExpr(
+        bif.index["or"],
+        SExpr(bif.index[">"], Name("x"), Integer(1)),
+        SExpr(bif.index["="], Name("x"), Integer(1)),
+    )
+    assert expand("(defun f [x] (not x))") == SExpr(
+        bif.index["define"],
+        Name("f"),
+        SExpr(bif.index["fun"], Vector(Name("x")), SExpr(bif.index["if"], Name("x"), FALSE, TRUE)),
+    )
+
+
+def test_comparisons(run):
+    assert run("[(>= 2 1) (>= 1 1) (>= 0 1) (<= 2 1) (<= 1 1) (<= 0 1)]") == Vector(
+        TRUE, TRUE, FALSE, FALSE, TRUE, TRUE
+    )
+    assert run("[(not 0) (not :x)]") == Vector(TRUE, FALSE)
+
+
+def test_arguments_are_evaluated_once(run, capsys):
+    assert run('(>= (do (print! "a") 2) (do (print! "b") 2))') == TRUE
+    assert capsys.readouterr().out == "a\nb\n"
+
+
+def test_defun_names_the_function(run):
+    fun = run("(defun f [x] x) f")
+    assert isinstance(fun, Function) and fun.name == "f"
+
+
+def test_shadowed_macro_is_not_expanded(run):
+    assert run("(defun apply-not [not x] (not x)) (apply-not (fun [x] 42) 1)") == Integer(42)
+    assert run("(let [not (fun [x] 43)] (not 1))") == Integer(43)
+    assert run("(define not (fun [x] 44)) (not 1)") == Integer(44)
+
+
+def test_shadowed_names_inside_expansion(run):
+    # the expansion of >= refers to the built-in `or`, not the local one
+    assert run("(let [or (fun [a b] :local)] (>= 1 1))") == TRUE
+
+
+def test_builtins_still_work_as_values(run):
+    assert run("[(call not [0]) (call >= [3 2])]") == Vector(TRUE, TRUE)
+
+
+def test_defmacro(run):
+    assert run("""
+        (defmacro unless [cond x] (form &if cond &:Nil x))
+        [(unless (= 1 2) :yes) (unless (= 1 1) :yes)]
+    """) == Vector(Atom("yes"), NIL)
+
+
+def test_defmacro_arguments_are_not_evaluated(run, capsys):
+    run("""
+        (defmacro ignore [x] &:ignored)
+        (ignore (print! "side effect"))
+    """)
+    assert capsys.readouterr().out == ""
+
+
+def test_let_does_not_create_functions(run, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("a function was created")
+    monkeypatch.setattr(entities, "create_function", fail)
+    assert run("(let [a 1, b 2] (let [c (+ a b)] [a b c]))") == Vector(
+        Integer(1), Integer(2), Integer(3)
+    )
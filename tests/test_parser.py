@@ -1,3 +1,5 @@
+import os
+import lark
 import pylarklispy.parser as parser
 from pylarklispy.entities import *
 
@@ -14,21 +16,19 @@ FULL_EXAMPLE = \
 (strings "work fine")
 (sigils ~r"are cool")
 ((higher order) stuff)
+(maps {:are "hashed"})
 """
 
 
 def test_smoke():
     # check that all the language constructs work
-    lark_parser = parser.parser
+    lark_parser = parser.get_parser()
     tree = lark_parser.parse(FULL_EXAMPLE)
 
 
 def test_ast():
     # check that the generated AST is correct
-    lark_parser = parser.parser
-    lark_transformer = parser.Transformer()
-    tree = lark_parser.parse(FULL_EXAMPLE)
-    ast = lark_transformer.transform(tree)
+    ast = parser.get_parser().parse(FULL_EXAMPLE)
     expected = (
         SExpr( Name("hello"), Name("world") ),
         SExpr( Name("lorem"), Atom("ipsum"), Vector(Name("dolor-sit"), Name("amet")) ),
@@ -39,6 +39,29 @@ def test_ast():
         SExpr( Name("strings"), String("work fine") ),
         SExpr( Name("sigils"), SigilString("r", "are cool") ),
         SExpr( SExpr(Name("higher"), Name("order")), Name("stuff") ),
+        SExpr( Name("maps"), Map(Atom("are"), String("hashed")) ),
     )
     assert len(ast) == len(expected)
     assert ast == expected
+
+
+def test_transformer_on_tree():
+    # the transformer also works as a separate pass over a parse tree
+    tree_parser = lark.Lark(parser.grammar, parser="lalr")
+    tree = tree_parser.parse(FULL_EXAMPLE)
+    assert parser.Transformer().transform(tree) == parser.get_parser().parse(FULL_EXAMPLE)
+
+
+def test_import_does_not_build_parser():
+    import subprocess, sys
+    code = "import sys, pylarklispy; assert 'lark' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_cached_tables(tmp_path, monkeypatch):
+    monkeypatch.setenv("PYLARKLISPY_CACHE_DIR", str(tmp_path))
+    built = parser._build_parser()
+    assert os.path.exists(parser.tables_filename())
+    loaded = parser._build_parser()
+    assert loaded.source == "<deserialized>"
+    assert loaded.parse(FULL_EXAMPLE) == built.parse(FULL_EXAMPLE)
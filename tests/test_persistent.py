@@ -0,0 +1,110 @@
+import random
+from pylarklispy.persistent import PersistentMap, PersistentVector
+
+
+class BadHash:
+    """A key with lots of hash collisions"""
+    def __init__(self, n):
+        self.n = n
+
+    def __hash__(self):
+        return self.n % 3
+
+    def __eq__(self, other):
+        return isinstance(other, BadHash) and self.n == other.n
+
+
+def test_map_against_dict():
+    rng = random.Random(42)
+    for make_key in (int, BadHash, lambda n: n * 2**40):
+        reference = {}
+        pmap = PersistentMap()
+        history = []
+        for _ in range(1000):
+            key = make_key(rng.randrange(300))
+            if rng.random() < 0.6:
+                value = rng.random()
+                reference[key] = value
+                pmap = pmap.assoc(key, value)
+            else:
+                reference.pop(key, None)
+                pmap = pmap.dissoc(key)
+            history.append((dict(reference), pmap))
+        # older versions are not affected by the updates
+        for expected, version in history[::50]:
+            assert len(version) == len(expected)
+            assert dict(version.items()) == expected
+
+
+def test_map_from_items():
+    items = [(n, str(n)) for n in range(1000)] + [(5, "five")]
+    pmap = PersistentMap(items)
+    assert len(pmap) == 1000
+    assert pmap[5] == "five"
+    assert pmap.get(1000) is None
+    assert pmap == PersistentMap(reversed(items[:-1])).assoc(5, "five")
+
+
+def test_vector_against_list():
+    rng = random.Random(7)
+    reference = list(range(2000))
+    pvec = PersistentVector(reference)
+    history = []
+    for _ in range(500):
+        op = rng.random()
+        if op < 0.4:
+            x = rng.random()
+            reference = reference + [x]
+            pvec = pvec.append(x)
+        elif op < 0.6 and reference:
+            i = rng.randrange(len(reference))
+            reference = reference[:]
+            reference[i] = -i
+            pvec = pvec.set(i, -i)
+        elif op < 0.8:
+            a, b = sorted(rng.randrange(len(reference) + 1) for _ in range(2))
+            reference = reference[a:b]
+            pvec = pvec[a:b]
+        else:
+            a, b = sorted(rng.randrange(len(reference) + 1) for _ in range(2))
+            source = [rng.random() for _ in range(rng.randrange(50))]
+            reference = reference[:a] + source + reference[b:]
+            pvec = pvec.splice(a, b, source)
+        history.append((reference, pvec))
+    for expected, version in history:
+        assert len(version) == len(expected)
+        assert list(version) == expected
+        assert list(version[::3]) == expected[::3]
+
+
+def test_vector_extend_against_list():
+    rng = random.Random(11)
+    for size in [0, 1, 31, 32, 33, 1024, 1025, 33000]:
+        for extra in [33, 64, 100, 1057, 40000]:
+            values = [-n for n in range(extra)]
+            assert list(PersistentVector(range(size)).extend(values)) == [*range(size), *values]
+            a = rng.randrange(size + 1)
+            assert list(PersistentVector(range(size))[a:].extend(values)) == [*range(a, size), *values]
+            assert list(PersistentVector(range(size))[:a].extend(values)) == [*range(a), *values]
+            pvec = PersistentVector(range(size))[1:]
+            assert list(pvec.extend(pvec)) == [*range(1, size), *range(1, size)]
+            b = rng.randrange(a, size + 1)
+            assert list(PersistentVector(range(size)).splice(a, b, values)) == [*range(a), *values, *range(b, size)]
+
+
+def test_small_slices_are_copied():
+    pvec = PersistentVector(range(100000))
+    assert pvec[:10]._root is not pvec._root
+    assert list(pvec[10:20]) == list(range(10, 20))
+
+
+def test_vector_appends_share_structure():
+    pvec = PersistentVector()
+    for n in range(100000):
+        pvec = pvec.append(n)
+    assert pvec == PersistentVector(range(100000))
+    head = pvec[:50000]
+    assert head._root is pvec._root
+    assert pvec[99999] == 99999 and head[-1] == 49999
+    assert head.append(-1)[50000] == -1
+    assert pvec[50000] == 50000
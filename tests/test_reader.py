@@ -0,0 +1,90 @@
+import io
+import mmap
+import random
+import lark
+import pytest
+from pylarklispy import bif, compile_code, run_stream, reader
+from pylarklispy.entities import *
+from tests.test_parser import FULL_EXAMPLE
+
+SOURCE = FULL_EXAMPLE + ' &x & (y) ~r "z" -5 :a : b :,c 1-a:\nb :a:\t-x 007:,,+:ab1 "s;(" ; trailing comment'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 4096])
+def test_same_as_compile_code(chunk_size):
+    expected = list(compile_code(SOURCE))
+    assert list(reader.read_forms(io.StringIO(SOURCE), chunk_size)) == expected
+    binary = io.BytesIO(SOURCE.encode())
+    assert list(reader.read_forms(binary, chunk_size)) == expected
+
+
+def test_utf8_split_across_chunks():
+    source = '(print! "привет")'
+    assert list(reader.read_forms(io.BytesIO(source.encode()), 1)) == list(compile_code(source))
+
+
+def test_mmap(tmp_path):
+    path = tmp_path / "program.lisp"
+    path.write_text(SOURCE)
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        assert list(reader.read_forms(source)) == list(compile_code(SOURCE))
+
+
+def test_one_form_at_a_time():
+    sources = reader.read_form_sources(io.StringIO("(a [b c]) d (e\n; )\n)"), 3)
+    assert list(sources) == ["(a [b c])", "d", "(e\n; )\n)"]
+
+
+def test_atom_with_space():
+    source = "[: foo] :\n  bar"
+    assert list(reader.read_form_sources(io.StringIO(source))) == ["[: foo]", ":\n  bar"]
+    assert list(reader.read_forms(io.StringIO(source))) == list(compile_code(source))
+
+
+_SEPARATORS = ["", " ", "\n", ",", "\t", " ; comment\n", ",,"]
+
+
+def soup(rng: random.Random, depth: int = 0) -> str:
+    """A random piece of source code, glued with random separators"""
+    sep = lambda: rng.choice(_SEPARATORS)
+    word = lambda: "".join(rng.choice("-+*/%=<>_!?ab1") for _ in range(rng.randint(1, 4)))
+    kind = rng.randrange(9 if depth < 3 else 6)
+    if kind == 0:
+        return word()
+    if kind == 1:
+        return rng.choice(["", "-", "+"]) + rng.choice(["0", "007", "12", "3"])
+    if kind == 2:
+        return ":" + rng.choice(["", " ", "\n  ", ",", "\t"]) + word()
+    if kind == 3:
+        return rng.choice(['"s"', '"a;(b"', '"q\\"x"', '""'])
+    if kind == 4:
+        return "&" + sep() + soup(rng, depth + 1)
+    if kind == 5:
+        return "~" + rng.choice("rf") + sep() + '"z%"'
+    opening, closing = rng.choice(["()", "[]", "{}"])
+    count = rng.randrange(0, 4)
+    if opening == "{":
+        count *= 2
+    return opening + sep().join(soup(rng, depth + 1) for _ in range(count)) + closing
+
+
+def test_random_token_soup():
+    rng = random.Random(10)
+    for _ in range(300):
+        source = "".join(rng.choice(_SEPARATORS) + soup(rng) for _ in range(rng.randint(1, 6)))
+        try:
+            expected = list(compile_code(source))
+        except (lark.LarkError, ValueError):
+            # e.g. a map with an odd number of elements
+            with pytest.raises((lark.LarkError, ValueError)):
+                list(reader.read_forms(io.StringIO(source)))
+            continue
+        for chunk_size in [1, 3, 4096]:
+            assert list(reader.read_forms(io.StringIO(source), chunk_size)) == expected, source
+
+
+def test_run_stream_is_lazy():
+    runtime = Runtime(bif.index)
+    with pytest.raises(lark.LarkError):
+        run_stream(io.StringIO("(define x 1) (define y 2) (oops"), runtime=runtime)
+    assert runtime["y"] == Integer(2)
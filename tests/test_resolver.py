@@ -0,0 +1,84 @@
+from pylarklispy import compile_code
+from pylarklispy.entities import *
+from pylarklispy.resolver import resolve
+from tests.utils import result
+
+
+def resolved(code: str):
+    [statement] = compile_code(code)
+    return resolve(statement)
+
+
+def test_coordinates():
+    expr = resolved("(fun [a b] (fun [c] (+ a b c)))")
+    inner = expr.es[2].es[2]
+    plus, a, b, c = inner.es
+    assert isinstance(plus, GlobalName)
+    assert (a.depth, a.slot) == (1, 0)
+    assert (b.depth, b.slot) == (1, 1)
+    assert (c.depth, c.slot) == (0, 0)
+    # a and b, as seen where the inner function is created
+    captures = expr.es[2].es[3]
+    assert [(x.identifier, x.depth, x.slot) for x in captures.es] == [("a", 0, 0), ("b", 0, 1)]
+
+
+def test_captures():
+    expr = resolved("(fun [a b] (let [c 1] (fun [x] (fun [] [b c x b]))))")
+    middle = expr.es[2].es[2]
+    # b is captured by the middle function from two frames up
+    assert [(x.identifier, x.depth, x.slot) for x in middle.es[3].es] == [("b", 1, 1), ("c", 0, 0)]
+    inner = middle.es[2]
+    assert [(x.identifier, x.depth, x.slot) for x in inner.es[3].es] == [("b", 1, 0), ("c", 1, 1), ("x", 0, 0)]
+    b, c, x, b_again = inner.es[2].es
+    assert (b.depth, b.slot) == (b_again.depth, b_again.slot) == (1, 0)
+    assert (c.depth, c.slot) == (1, 1)
+    assert (x.depth, x.slot) == (1, 2)
+
+
+def test_top_level_functions_capture_nothing():
+    expr = resolved("(fun [a] a)")
+    assert len(expr.es) == 3
+
+
+def test_let_values_are_outside():
+    expr = resolved("(fun [x] (let [x (+ x 1), y x] [x y]))")
+    bindings, body = expr.es[2].es[1:]
+    _, outer_x, _, outer_y = bindings.es
+    assert (outer_x.es[1].depth, outer_x.es[1].slot) == (0, 0)
+    assert (outer_y.depth, outer_y.slot) == (0, 0)
+    inner_x, inner_y = body.es
+    assert (inner_x.depth, inner_x.slot) == (0, 0)
+    assert (inner_y.depth, inner_y.slot) == (0, 1)
+
+
+def test_shadowed_binding_form():
+    # `fun` is a parameter here, so it doesn't bind anything
+    expr = resolved("(fun [fun x] (fun [x] x))")
+    head, params, body = expr.es[2].es
+    assert isinstance(head, LocalName)
+    assert (params.es[0].depth, params.es[0].slot) == (0, 1)
+    assert (body.depth, body.slot) == (0, 1)
+
+
+def test_quoted_is_left_alone():
+    expr = resolved("(fun [x] &x)")
+    assert type(expr.es[2].e) is Name
+
+
+def test_slot_frames():
+    expr = result("""
+        (defun make-counter [start step]
+            (fun [n] (+ start (* n step))))
+        (define c (make-counter 10 3))
+        [(c 0) (c 1) (c 5)]
+    """)
+    assert expr == result("[10 13 25]")
+
+
+def test_define_inside_function_is_global():
+    expr = result("""
+        (defun set-it [x] (define it x))
+        (set-it 42)
+        it
+    """)
+    assert expr == Integer(42)
@@ -1,5 +1,10 @@
+import gc
+
 import pytest
+from pylarklispy import bif
 from pylarklispy.entities import *
+from pylarklispy.functools import EmptyList, LinkedList
+from pylarklispy.ref import Reference
 
 def test_name():
     runtime = Runtime({"pi": Integer(31415926)})
@@ -126,3 +131,118 @@ def test_sigil_strings_can_be_strings():
     result = SigilString("!", "attention").evaluate(runtime)
 
     assert result == String("!!!attention!!!")
+
+
+def test_atoms_are_interned():
+    assert Atom("True") is TRUE
+    assert Atom("something") is Atom("something")
+    assert boolean(False) is FALSE
+
+
+def test_unused_atoms_are_dropped():
+    for n in range(1000):
+        Atom(f"unused-{n}")
+    gc.collect()
+    assert not any(s.startswith("unused-") for s in Atom._interned)
+    atom = Atom("kept")
+    gc.collect()
+    assert Atom._interned["kept"] is atom
+
+
+def test_entities_are_hashable():
+    table = {
+        Integer(1): "int",
+        String("1"): "str",
+        Atom("one"): "atom",
+        Vector(Integer(1)): "vector",
+    }
+    assert table[Integer(1)] == "int"
+    assert table[String("1")] == "str"
+    assert table[Atom("one")] == "atom"
+    assert table[Vector(Integer(1))] == "vector"
+
+
+def test_entities_have_no_instance_dict():
+    for entity in [Integer(1), String(""), Atom("x"), Vector(), SExpr()]:
+        assert not hasattr(entity, "__dict__")
+    # and the ones of the bundled modules
+    for entity in [Reference(NIL), LinkedList(NIL, EmptyList)]:
+        assert not hasattr(entity, "__dict__")
+
+
+def test_call_frames():
+    runtime = Runtime({})
+    frames = []
+    runtime.global_names["frame!"] = Function("frame!", lambda r: frames.append(r.current_frame) or NIL)
+    f = create_function(runtime, "f", ["x"], SExpr(Name("frame!")))
+    runtime.global_names["f"] = f
+    SExpr(Name("f"), Integer(1)).evaluate(runtime)
+    [frame] = frames
+    assert not hasattr(frame, "__dict__")
+    assert not hasattr(runtime.global_frame, "__dict__")
+    # the caller is kept as is, and only formatted on demand
+    assert frame.caller is f
+    assert frame.describe() == repr(f)
+    assert runtime.global_frame.describe() == "<global>"
+
+
+def test_wrong_number_of_arguments():
+    runtime = Runtime({})
+    runtime.global_names["f"] = create_function(runtime, "f", ["x"], Name("x"))
+    with pytest.raises(ValueError):
+        SExpr(Name("f"), Integer(1), Integer(2)).evaluate(runtime)
+
+
+def test_global_name_cache_is_invalidated():
+    runtime = Runtime({"x": Integer(1)})
+    name = GlobalName("x")
+    assert name.evaluate(runtime) == Integer(1)
+    runtime.global_frame.insert("x", Integer(2))  # like `define`
+    assert name.evaluate(runtime) == Integer(2)
+    runtime.global_names["x"] = Integer(3)
+    assert name.evaluate(runtime) == Integer(3)
+    runtime.global_names.update(x=Integer(4))
+    assert name.evaluate(runtime) == Integer(4)
+    # the same node in another runtime
+    assert name.evaluate(Runtime({"x": Integer(5)})) == Integer(5)
+    assert name.evaluate(runtime) == Integer(4)
+
+
+def test_global_name_cache_checks_the_runtime():
+    a = Runtime({"x": Integer(1)})
+    b = Runtime({"x": Integer(2)})
+    b.global_names.version = a.global_names.version
+    for name in [GlobalName("x"), Name("x")]:
+        assert name.evaluate(a) == Integer(1)
+        assert name.evaluate(b) == Integer(2)
+    # like `join` and `if` do with the shared nodes of `bif`
+    a.global_names.update(bif.index)
+    b.global_names.update(bif.index)
+    b.global_names["format"] = Function("format", lambda r, x: String("b"))
+    b.global_names["bool"] = Function("bool", lambda r, x: FALSE)
+    b.global_names.version = a.global_names.version
+    join = SExpr(GlobalName("join"), Integer(1))
+    if_ = SExpr(GlobalName("if"), TRUE, Integer(1), Integer(2))
+    assert join.evaluate(a) == String("1")
+    assert if_.evaluate(a) == Integer(1)
+    assert join.evaluate(b) == String("b")
+    assert if_.evaluate(b) == Integer(2)
+
+
+def test_global_names_versions_are_unique():
+    a = Runtime({})
+    b = Runtime({})
+    assert a.global_names.version != b.global_names.version
+    version = a.global_names.version
+    a.global_names["x"] = NIL
+    assert a.global_names.version not in (version, b.global_names.version)
+
+
+def test_name_cache_respects_local_frames():
+    runtime = Runtime({"x": Integer(1)})
+    name = Name("x")
+    assert name.evaluate(runtime) == Integer(1)
+    runtime.push(SlotFrame(runtime.global_frame, 1, "<test>", {"x": 0}, [Integer(2)]))
+    assert name.evaluate(runtime) == Integer(2)
+    runtime.pop()
+    assert name.evaluate(runtime) == Integer(1)
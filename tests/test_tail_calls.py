@@ -0,0 +1,58 @@
+import pytest
+from pylarklispy import bif
+from pylarklispy.entities import *
+
+
+@pytest.fixture
+def run(run):
+    # the shared fixture, with `depth!` for the size of the stack
+    def _(code):
+        runtime = Runtime(bif.index)
+        depths = []
+        def depth(r):
+            depths.append(len(r.stack))
+            return Atom("Nil")
+        runtime.global_names["depth!"] = Function("depth!", depth)
+        return run(code, runtime), depths
+    return _
+
+
+def test_self_recursion(run):
+    expr, depths = run("""
+        (defun count [n acc]
+            (if (= n 0)
+                acc
+                (do (depth!)
+                    (count (- n 1) (+ acc 1)))))
+        (count 5000 0)
+    """)
+    assert expr == Integer(5000)
+    assert len(set(depths)) == 1
+
+
+def test_mutual_recursion_through_let(run):
+    expr, depths = run("""
+        (defun even? [n]
+            (if (= n 0) :True (let [m (- n 1)] (odd? m))))
+        (defun odd? [n]
+            (if (= n 0) :False (do (depth!) (even? (- n 1)))))
+        [(even? 3000) (odd? 3001)]
+    """)
+    assert expr == Vector(Atom("True"), Atom("True"))
+    assert len(set(depths)) == 1
+
+
+def test_non_tail_calls_still_work(run):
+    expr, _ = run("""
+        (defun sum [n] (if (= n 0) 0 (+ n (sum (- n 1)))))
+        (sum 50)
+    """)
+    assert expr == Integer(50 * 51 // 2)
+
+
+def test_tail_call_of_a_builtin(run):
+    expr, _ = run("""
+        (defun f [x] (if x (+ x 1) (* x 2)))
+        [(f 1) (f 0)]
+    """)
+    assert expr == Vector(Integer(2), Integer(0))
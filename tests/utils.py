@@ -1,4 +1,4 @@
-from pylarklispy import compile_and_run
+from pylarklispy import compile_and_run, compile_code, compile_closures, run_ast, run_compiled
 
 
 def result(code: str):
@@ -8,3 +8,17 @@ def result(code: str):
 
 
 run = compile_and_run
+
+
+def compiled_result(code: str):
+    """Like `result`, but run the code through the closure compiler"""
+    expr, _ = run_compiled(compile_closures(compile_code(code)))
+    return expr
+
+
+def run_interpreted(code: str, runtime=None):
+    return run_ast(compile_code(code), runtime=runtime)[0]
+
+
+def run_closures(code: str, runtime=None):
+    return run_compiled(compile_closures(compile_code(code)), runtime=runtime)[0]